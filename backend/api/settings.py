@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from corsheaders.defaults import default_headers
 
@@ -61,6 +62,14 @@ DATABASES = {
     }
 }
 
+# Almacenamiento de VIT/VUL: "json" (core/data/CSIRT/*.json) o "sqlite"
+# (tablas de core.models; cargar con `manage.py import_json_data`).
+VMT_STORAGE_BACKEND = os.environ.get("VMT_STORAGE_BACKEND", "json")
+
+# Formato de escritura de los ficheros JSON: "compact" (minificado) o "pretty"
+# (indentado, como antes). Se leen los dos indistintamente.
+VMT_DATA_FORMAT = os.environ.get("VMT_DATA_FORMAT", "compact")
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
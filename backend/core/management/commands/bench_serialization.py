@@ -0,0 +1,106 @@
+# core/management/commands/bench_serialization.py
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse as DjangoJsonResponse
+from core.views.common import serialization
+from core.views.common.serialization import JsonResponse
+from core.views.common.store import DATASETS, _resolve_data_file
+
+
+def _sample(n: int):
+    return [
+        {
+            "id": i,
+            "numero": f"VIT{i:07d}",
+            "idExterno": f"EXT-{i}",
+            "estado": ("Abierto", "En curso", "Cerrado")[i % 3],
+            "prioridad": ("Crítico", "Alto", "Medio", "Bajo")[i % 4],
+            "resumen": f"Vulnerabilidad de ejemplo número {i} en el activo srv-{i % 97}",
+            "grupoAsignacion": f"Grupo {i % 11}",
+            "asignadoA": f"usuario{i % 23}",
+            "creado": "2024-03-%02d 10:15:00" % (i % 28 + 1),
+            "dueDate": "2024-04-%02d" % (i % 28 + 1),
+            "vul": f"VUL{i % 500:07d}" if i % 3 == 0 else "",
+            "hasLink": i % 3 == 0,
+        }
+        for i in range(n)
+    ]
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara tiempos de codificación/decodificación y tamaño en disco del "
+        "formato histórico (JSON indentado) frente a la capa de serialización."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--records",
+            type=int,
+            default=0,
+            help="Usar N registros sintéticos en lugar de los datasets actuales.",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        repeat = max(1, options["repeat"])
+        if options["records"]:
+            datasets = {"sintético": _sample(options["records"])}
+        else:
+            datasets = {}
+            for filename in DATASETS:
+                path = _resolve_data_file(filename)
+                if path.exists():
+                    datasets[filename] = serialization.read_file(path)
+            if not datasets:
+                datasets = {"sintético": _sample(20000)}
+
+        backend = "orjson" if serialization.orjson is not None else "json"
+        self.stdout.write(f"Codificador: {backend}; mejor de {repeat} ejecuciones\n")
+
+        for name, data in datasets.items():
+            legacy = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+            compact = serialization.dumps(data)
+            rows = [
+                (
+                    "json indent=2 (antes)",
+                    legacy,
+                    lambda: json.dumps(data, ensure_ascii=False, indent=2),
+                    lambda: json.loads(legacy),
+                ),
+                (
+                    "compact (ahora)",
+                    compact,
+                    lambda: serialization.dumps(data),
+                    lambda: serialization.loads(compact),
+                ),
+            ]
+            count = len(data) if isinstance(data, list) else 1
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name}: {count} registros"))
+            self.stdout.write(
+                f"  {'formato':<24}{'tamaño KB':>12}{'encode ms':>12}{'decode ms':>12}"
+            )
+            for label, raw, enc, dec in rows:
+                self.stdout.write(
+                    f"  {label:<24}{len(raw) / 1024:>12.1f}"
+                    f"{_best(enc, repeat):>12.1f}{_best(dec, repeat):>12.1f}"
+                )
+            saved = 100 * (1 - len(compact) / len(legacy)) if legacy else 0
+            self.stdout.write(f"  ahorro en disco: {saved:.0f}%")
+
+            old = _best(lambda: DjangoJsonResponse(data, safe=False), repeat)
+            new = _best(lambda: JsonResponse(data, safe=False), repeat)
+            self.stdout.write(
+                f"  respuesta HTTP: JsonResponse de Django {old:.1f} ms, "
+                f"serialization.JsonResponse {new:.1f} ms\n"
+            )
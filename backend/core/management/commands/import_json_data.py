@@ -0,0 +1,62 @@
+# core/management/commands/import_json_data.py
+from django.core.management.base import BaseCommand, CommandError
+from core.views.common import db_store, journal, relations
+from core.views.common.serialization import read_file
+from core.views.common.store import (
+    DATA_DIR,
+    DATASETS,
+    _resolve_data_file,
+    file_version,
+    is_tombstone,
+)
+
+
+def _read_json(path, default):
+    if not path.exists():
+        return default
+    return read_file(path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa una sola vez vit_Data.json, vul_Data.json, sus relaciones y "
+        "los comentarios a las tablas SQLite usadas con "
+        "VMT_STORAGE_BACKEND=sqlite."
+    )
+
+    def handle(self, *args, **options):
+        datasets = {}
+        for filename, kind in DATASETS.items():
+            path = _resolve_data_file(filename)
+            try:
+                rows = _read_json(path, [])
+            except ValueError as e:
+                raise CommandError(f"{path}: JSON inválido ({e})")
+            if not isinstance(rows, list):
+                rows = [rows]
+            elif path.exists():
+                # Cambios y borrados (lápidas) aún sin compactar.
+                rows = journal.replay(path, file_version(path), rows)
+                rows = [r for r in rows if not is_tombstone(r)]
+            datasets[kind] = (path, rows)
+
+        # relations.json si existe; si no, los campos `vul`/`vits` de los
+        # registros, que ya no se guardan en ellos.
+        edges = relations.read_json(datasets["vit"][1], datasets["vul"][1])
+        for kind, (path, rows) in datasets.items():
+            relations.take_links(kind, rows)
+            db_store.replace_records(kind, rows)
+            self.stdout.write(f"{kind}: {len(rows)} registros desde {path}")
+        db_store.replace_edges(edges.edges())
+        self.stdout.write(f"relaciones: {len(edges.edges())} enlaces")
+
+        for kind in ("vit", "vul"):
+            path = DATA_DIR / "comments" / f"{kind}_comments.json"
+            data = _read_json(path, {})
+            if not isinstance(data, dict):
+                data = {}
+            db_store.replace_comments(kind, data)
+            total = sum(len(v) for v in data.values() if isinstance(v, list))
+            self.stdout.write(f"{kind}: {total} comentarios desde {path}")
+
+        self.stdout.write(self.style.SUCCESS("Importación completada."))
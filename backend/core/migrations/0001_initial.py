@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=16, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VitRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField(db_index=True)),
+                ('record_id', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('numero', models.CharField(blank=True, db_index=True, max_length=128)),
+                ('id_externo', models.CharField(blank=True, db_index=True, max_length=128)),
+                ('data', models.JSONField(default=dict)),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VulRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField(db_index=True)),
+                ('record_id', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('numero', models.CharField(blank=True, db_index=True, max_length=128)),
+                ('data', models.JSONField(default=dict)),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Comment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=8)),
+                ('numero', models.CharField(max_length=128)),
+                ('comment_id', models.IntegerField()),
+                ('author', models.CharField(default='system', max_length=255)),
+                ('text', models.TextField()),
+                ('created_at', models.CharField(max_length=64)),
+            ],
+            options={
+                'ordering': ['comment_id'],
+                'indexes': [models.Index(fields=['kind', 'numero'], name='core_commen_kind_020e96_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VitVulRelation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vit_numero', models.CharField(db_index=True, max_length=128)),
+                ('vul_numero', models.CharField(db_index=True, max_length=128)),
+                ('origin', models.CharField(max_length=8)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('vit_numero', 'vul_numero', 'origin'), name='uniq_vit_vul_origin')],
+            },
+        ),
+    ]
@@ -1,3 +1,59 @@
 from django.db import models
 
-# Create your models here.
+
+class DatasetState(models.Model):
+    """Contador de versión por dataset; se incrementa en cada escritura."""
+
+    name = models.CharField(max_length=16, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class VitRecord(models.Model):
+    position = models.IntegerField(db_index=True)
+    record_id = models.CharField(max_length=64, blank=True, db_index=True)
+    numero = models.CharField(max_length=128, blank=True, db_index=True)
+    id_externo = models.CharField(max_length=128, blank=True, db_index=True)
+    data = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ["position"]
+
+
+class VulRecord(models.Model):
+    position = models.IntegerField(db_index=True)
+    record_id = models.CharField(max_length=64, blank=True, db_index=True)
+    numero = models.CharField(max_length=128, blank=True, db_index=True)
+    data = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ["position"]
+
+
+class VitVulRelation(models.Model):
+    """Enlace VIT↔VUL. `origin` indica qué lado lo declara (campo vul o vits)."""
+
+    vit_numero = models.CharField(max_length=128, db_index=True)
+    vul_numero = models.CharField(max_length=128, db_index=True)
+    origin = models.CharField(max_length=8)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["vit_numero", "vul_numero", "origin"],
+                name="uniq_vit_vul_origin",
+            )
+        ]
+
+
+class Comment(models.Model):
+    kind = models.CharField(max_length=8)
+    numero = models.CharField(max_length=128)
+    comment_id = models.IntegerField()
+    author = models.CharField(max_length=255, default="system")
+    text = models.TextField()
+    created_at = models.CharField(max_length=64)
+
+    class Meta:
+        ordering = ["comment_id"]
+        indexes = [models.Index(fields=["kind", "numero"])]
@@ -1,3 +1,1396 @@
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.apps import apps
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from core.views.common import (
+    dates,
+    dup_index,
+    frames,
+    ingest,
+    jobs,
+    journal,
+    keys,
+    links,
+    locks,
+    query,
+    relations,
+    serialization,
+    staging,
+    store,
+    txlog,
+    upload_cache,
+    utils,
+)
+import core.views.common.comments as comments
+import core.views.VIT.risk_logic as vit_risk
+import core.views.VUL.risk_logic as vul_risk
+import core.views.VIT.delete_selection as vit_delete
+import core.views.VIT.upload as vit_upload
+import core.views.VUL.delete_selection as vul_delete
+import core.views.VUL.upload as vul_upload
+import core.management.commands.import_json_data as import_json_data
+
+VIT_FILE = "CSIRT/vit_Data.json"
+VUL_FILE = "CSIRT/vul_Data.json"
+
+
+def vit(numero, **extra):
+    return {"numero": numero, "estado": "Nuevo", "prioridad": "Alta", **extra}
+
+
+def vul(numero, **extra):
+    return {"numero": numero, "estado": "Nuevo", "prioridad": "Alta", **extra}
+
+
+class DataDirTestCase(TestCase):
+    """Cada test trabaja sobre un DATA_DIR temporal y con las caches vacías,
+    con el backend STORAGE_BACKEND aunque VMT_STORAGE_BACKEND diga otro."""
+
+    STORAGE_BACKEND = "json"
+
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp())
+        (self.data_dir / "CSIRT").mkdir()
+        (self.data_dir / "comments").mkdir()
+        self.addCleanup(shutil.rmtree, self.data_dir, True)
+        for module in (store, comments, vit_delete, vul_delete):
+            patcher = mock.patch.object(module, "DATA_DIR", self.data_dir)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for module in (store, comments):
+            patcher = mock.patch.object(module, "STORAGE_BACKEND", self.STORAGE_BACKEND)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for module, name, sub in (
+            (upload_cache, "CACHE_DIR", "upload_cache"),
+            (staging, "STAGING_DIR", "staging"),
+            (jobs, "JOBS_DIR", "jobs"),
+        ):
+            patcher = mock.patch.object(module, name, self.data_dir / sub)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self._reset_caches()
+        self.addCleanup(self._reset_caches)
+
+    def _reset_caches(self):
+        for timer in list(store._IDLE_TIMERS.values()):
+            timer.cancel()
+        store._IDLE_TIMERS.clear()
+        store._RECOVERED_PID = None
+        store._GARBAGE.clear()
+        store._CACHE.clear()
+        dup_index._INDEXES.clear()
+        links._VIEW = None
+        relations._EDGES = None
+        upload_cache._MEM.clear()
+        upload_cache._MEM_ROWS = 0
+
+    def path(self, filename):
+        return self.data_dir / filename
+
+    def numeros(self, filename=VIT_FILE):
+        return [r["numero"] for r in store.load_json_data(filename)]
+
+    def age(self, filename, seconds=100):
+        # Retrasa el mtime para no depender de la resolución en segundos.
+        stamp = time.time() - seconds
+        os.utime(self.path(filename), (stamp, stamp))
+
+
+def close(item):
+    item["estado"] = "Cerrado"
+
+
+class JournalTests(DataDirTestCase):
+    def test_update_goes_to_journal_and_replays(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1"), vit("VIT-2")])
+        snapshot = self.path(VIT_FILE).read_bytes()
+
+        updated = store.update_record(VIT_FILE, "VIT-2", close)
+        self.assertEqual(updated["estado"], "Cerrado")
+        self.assertEqual(self.path(VIT_FILE).read_bytes(), snapshot)
+        self.assertTrue(journal.journal_path(self.path(VIT_FILE)).exists())
+
+        store._CACHE.clear()
+        estados = [r["estado"] for r in store.load_json_data(VIT_FILE)]
+        self.assertEqual(estados, ["Nuevo", "Cerrado"])
+
+    def test_bulk_update_is_one_journal_line(self):
+        store.save_json_data(VIT_FILE, [vit(f"VIT-{i}") for i in range(1, 6)])
+        snapshot = self.path(VIT_FILE).read_bytes()
+
+        response = self.client.post(
+            "/vit/update-status/bulk/",
+            {"items": [{"numero": n, "estado": "Cerrado"} for n in ("VIT-2", "VIT-4")]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.path(VIT_FILE).read_bytes(), snapshot)
+        lines = journal.journal_path(self.path(VIT_FILE)).read_bytes().splitlines()
+        self.assertEqual(len(lines), 1)
+
+        store._CACHE.clear()
+        estados = [r["estado"] for r in store.load_json_data(VIT_FILE)]
+        self.assertEqual(estados, ["Nuevo", "Cerrado", "Nuevo", "Cerrado", "Nuevo"])
+
+    def test_cache_follows_snapshot_identity(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        self.assertEqual(self.numeros(), ["VIT-1"])
+        # Otro proceso publica un snapshot nuevo.
+        store.write_json_atomic(self.path(VIT_FILE), [vit("VIT-9")])
+        self.assertEqual(self.numeros(), ["VIT-9"])
+
+    def test_cache_follows_journal_identity(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        version = store.dataset_version(VIT_FILE)
+        self.assertEqual(self.numeros(), ["VIT-1"])
+        # Otro proceso añade una línea al diario.
+        base = store.file_version(self.path(VIT_FILE))
+        entry = journal.records_entry(base, [(0, vit("VIT-1", estado="Cerrado"))])
+        journal.append_entry(self.path(VIT_FILE), entry)
+
+        self.assertNotEqual(store.dataset_version(VIT_FILE), version)
+        self.assertEqual(store.load_json_data(VIT_FILE)[0]["estado"], "Cerrado")
+
+    def test_lines_of_a_replaced_snapshot_are_ignored(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.update_record(VIT_FILE, "VIT-1", close)
+        stale = journal.journal_path(self.path(VIT_FILE)).read_bytes()
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        # Un diario que sobrevive al snapshot nuevo apunta a otra base.
+        journal.journal_path(self.path(VIT_FILE)).write_bytes(stale)
+
+        store._CACHE.clear()
+        self.assertEqual(store.load_json_data(VIT_FILE)[0]["estado"], "Nuevo")
+
+
+class CacheTests(DataDirTestCase):
+    def parses(self):
+        return mock.patch.object(
+            serialization, "read_file", wraps=serialization.read_file
+        )
+
+    def test_writes_go_through_the_cache(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1"), vit("VIT-2")])
+        with self.parses() as read_file:
+            self.assertEqual(self.numeros(), ["VIT-1", "VIT-2"])
+            store.update_record(VIT_FILE, "VIT-1", close)
+            self.assertEqual(store.load_json_data(VIT_FILE)[0]["estado"], "Cerrado")
+            store.save_json_data(VIT_FILE, [vit("VIT-3")])
+            self.assertEqual(self.numeros(), ["VIT-3"])
+        parsed = [c.args[0] for c in read_file.call_args_list]
+        self.assertNotIn(self.path(VIT_FILE), parsed)
+
+    def test_readers_get_copies(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.load_json_data(VIT_FILE)[0]["estado"] = "Cerrado"
+        self.assertEqual(store.load_json_data(VIT_FILE)[0]["estado"], "Nuevo")
+
+    def listed_estados(self):
+        return [r["estado"] for r in self.client.get("/vit/risk-data/").json()]
+
+    def test_list_view_sees_each_write(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        self.assertEqual(self.listed_estados(), ["Nuevo"])
+        self.client.post(
+            "/vit/update-status/",
+            {"numero": "VIT-1", "estado": "Cerrado"},
+            content_type="application/json",
+        )
+        self.assertEqual(self.listed_estados(), ["Cerrado"])
+
+
+class QueryTests(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        store.save_json_data(
+            VIT_FILE,
+            [
+                vit("VIT-1", id=1, dueDate="2024-01-10"),
+                vit("VIT-2", id=2, prioridad="Baja", estado="Cerrado"),
+                vit("VIT-3", id=3, estado="En curso", dueDate="2024-03-01"),
+                vit("VIT-4", id=4, prioridad="baja", dueDate="2024-02-01"),
+            ],
+        )
+        store.save_json_data(VUL_FILE, [vul("VUL-1", id=1)])
+        relations.commit(vit={"VIT-3": "VUL-1"}, vul={"VUL-1": ["VIT-3"]})
+
+    def get(self, **params):
+        return self.client.get("/vit/risk-data/", params)
+
+    def listed(self, **params):
+        response = self.get(**params)
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        rows = body["results"] if isinstance(body, dict) else body
+        return [r["numero"] for r in rows]
+
+    def test_without_params_the_full_list_is_returned(self):
+        self.assertIsInstance(self.get().json(), list)
+        self.assertEqual(self.listed(), ["VIT-1", "VIT-2", "VIT-3", "VIT-4"])
+
+    def test_filters(self):
+        self.assertEqual(self.listed(prioridad="BAJA"), ["VIT-2", "VIT-4"])
+        self.assertEqual(
+            self.listed(estado="nuevo, en curso"), ["VIT-1", "VIT-3", "VIT-4"]
+        )
+        self.assertEqual(
+            self.listed(dueFrom="2024-01-15", dueTo="2024-02-28"), ["VIT-4"]
+        )
+        self.assertEqual(self.listed(hasLink="true"), ["VIT-3"])
+        self.assertEqual(self.listed(hasLink="0", prioridad="alta"), ["VIT-1"])
+
+    def test_sort_keeps_empty_values_last(self):
+        self.assertEqual(
+            self.listed(sort="-dueDate"), ["VIT-3", "VIT-4", "VIT-1", "VIT-2"]
+        )
+        self.assertEqual(
+            self.listed(sort="prioridad,-id"), ["VIT-3", "VIT-1", "VIT-4", "VIT-2"]
+        )
+
+    def test_pagination(self):
+        body = self.get(sort="-id", page="2", limit="3").json()
+        self.assertEqual([r["numero"] for r in body["results"]], ["VIT-1"])
+        self.assertEqual((body["count"], body["page"], body["limit"]), (4, 2, 3))
+        self.assertEqual(self.listed(page="3", limit="3"), [])
+        body = self.get(limit=str(query.MAX_LIMIT + 1)).json()
+        self.assertEqual(body["limit"], query.MAX_LIMIT)
+
+    def test_invalid_params_are_rejected(self):
+        for params in (
+            {"page": "0"},
+            {"page": "x"},
+            {"limit": "0"},
+            {"limit": "-5"},
+            {"dueFrom": "2024-13-01"},
+            {"hasLink": "maybe"},
+        ):
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+
+
+class StreamTests(DataDirTestCase):
+    def streamed(self, url):
+        response = self.client.get(url, {"stream": "1"})
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        return chunks, serialization.loads(b"".join(chunks))
+
+    def test_empty_list(self):
+        for kind in ("vit", "vul"):
+            _, body = self.streamed(f"/{kind}/risk-data/")
+            self.assertEqual(body, [])
+
+    def test_streamed_output_equals_buffered(self):
+        store.save_json_data(
+            VIT_FILE, [vit(f"VIT-{i}", id=i, descripcion="x" * 50) for i in range(40)]
+        )
+        store.save_json_data(VUL_FILE, [vul("VUL-1", id=1), vul("VUL-2", id=2)])
+        relations.commit(vit={"VIT-1": "VUL-1"}, vul={"VUL-1": "VIT-1, VIT-2"})
+
+        with mock.patch.object(utils, "STREAM_CHUNK_SIZE", 512):
+            for kind in ("vit", "vul"):
+                url = f"/{kind}/risk-data/"
+                buffered = self.client.get(url).json()
+                chunks, streamed = self.streamed(url)
+                self.assertEqual(streamed, buffered)
+                if kind == "vit":
+                    self.assertGreater(len(chunks), 1)
+
+
+def bump(item):
+    item["veces"] = item.get("veces", 0) + 1
+
+
+class LockTests(DataDirTestCase):
+    def test_lock_is_reentrant(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        with store.dataset_lock(VIT_FILE):
+            with store.dataset_lock(VIT_FILE, VUL_FILE):
+                store.update_record(VIT_FILE, "VIT-1", bump)
+        self.assertEqual(store.load_json_data(VIT_FILE)[0]["veces"], 1)
+
+    def test_other_threads_wait_for_the_lock(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        writer = threading.Thread(
+            target=store.update_record, args=(VIT_FILE, "VIT-1", bump)
+        )
+        with store.dataset_lock(VIT_FILE):
+            writer.start()
+            writer.join(0.2)
+            self.assertTrue(writer.is_alive())
+            self.assertNotIn("veces", store.load_json_data(VIT_FILE)[0])
+        writer.join(5)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(store.load_json_data(VIT_FILE)[0]["veces"], 1)
+
+    def test_aliased_dataset_is_locked_where_it_is_written(self):
+        alias = self.path("CSIRT/tshirt_Data.json")
+        store.write_json_atomic(alias, [vit("VIT-1")])
+        with mock.patch.object(locks, "locked", wraps=locks.locked) as locked:
+            store.update_record(VIT_FILE, "VIT-1", bump)
+            store.save_json_data(VIT_FILE, [vit("VIT-1"), vit("VIT-2")])
+        self.assertEqual({c.args for c in locked.call_args_list}, {(alias,)})
+        self.assertFalse(self.path(VIT_FILE).exists())
+        self.assertEqual(self.numeros(), ["VIT-1", "VIT-2"])
+
+    def test_no_lost_updates_across_processes(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1"), vit("VIT-2")])
+        workers, rounds = 4, 25
+        pids = []
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    for _ in range(rounds):
+                        store.update_record(VIT_FILE, "VIT-2", bump)
+                except BaseException:
+                    code = 1
+                finally:
+                    os._exit(code)
+            pids.append(pid)
+        for pid in pids:
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+        store._CACHE.clear()
+        updated = store.load_json_data(VIT_FILE)[1]
+        self.assertEqual(updated["veces"], workers * rounds)
+
+
+class RecoverTests(DataDirTestCase):
+    def crash(self, step):
+        # Simula una caída en `step` del commit: nada de lo que viene después
+        # se ejecuta y los ficheros quedan como estén.
+        return mock.patch.object(txlog, step, side_effect=OSError("crash"))
+
+    def restart(self):
+        # Un proceso nuevo recupera con su primer acceso a los datos.
+        self._reset_caches()
+
+    def test_published_commit_is_installed(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        relations.commit(vit={"VIT-1": "VUL-1"})
+        with self.crash("install"), self.assertRaises(OSError):
+            with store.commit_group(VIT_FILE, relations.RELATIONS_FILE):
+                store.save_json_data(VIT_FILE, [vit("VIT-1"), vit("VIT-2")])
+                relations.commit(vit={"VIT-2": "VUL-1"})
+        self.assertEqual(len(list(self.data_dir.glob("**/*.tmp"))), 1)
+        self.assertTrue(txlog.manifest_path(self.data_dir).exists())
+
+        self.restart()
+        self.assertEqual(self.numeros(), ["VIT-1", "VIT-2"])
+        self.assertEqual(relations.get_edges().vul_of("VIT-2"), "VUL-1")
+        self.assertEqual(list(self.data_dir.glob("**/*.tmp")), [])
+
+    def test_unpublished_commit_is_discarded(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+        relations.commit(vit={"VIT-1": "VUL-1"})
+        with self.crash("publish"), self.assertRaises(OSError):
+            with store.commit_group(VIT_FILE, VUL_FILE, relations.RELATIONS_FILE):
+                store.update_record(VIT_FILE, "VIT-1", close)
+                store.save_json_data(VUL_FILE, [vul("VUL-1"), vul("VUL-2")])
+                relations.commit(vit={"VIT-1": ""})
+        self.assertEqual(len(list(self.data_dir.glob("**/*.tmp"))), 1)
+
+        self.restart()
+        self.assertEqual(store.load_json_data(VIT_FILE)[0]["estado"], "Nuevo")
+        self.assertEqual(self.numeros(VUL_FILE), ["VUL-1"])
+        self.assertEqual(relations.get_edges().vul_of("VIT-1"), "VUL-1")
+        self.assertEqual(list(self.data_dir.glob("**/*.tmp")), [])
+
+    def test_published_lines_lost_in_a_crash_are_redone(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+        with store.commit_group(VIT_FILE, VUL_FILE):
+            store.update_record(VIT_FILE, "VIT-1", close)
+            store.update_record(VUL_FILE, "VUL-1", close)
+        # Las líneas van sin fsync: la caída se lleva la del VUL.
+        journal.discard(self.path(VUL_FILE))
+
+        self.restart()
+        self.assertEqual(store.load_json_data(VIT_FILE)[0]["estado"], "Cerrado")
+        self.assertEqual(store.load_json_data(VUL_FILE)[0]["estado"], "Cerrado")
+
+    def test_recovers_once_per_process_on_first_access(self):
+        with mock.patch.object(store, "recover") as recover:
+            apps.get_app_config("core").ready()
+            recover.assert_not_called()
+            store.dataset_version(VIT_FILE)
+            store.load_json_data(VIT_FILE)
+            with store.dataset_lock(VIT_FILE):
+                pass
+        recover.assert_called_once_with()
+
+    def test_links_publish_with_the_commit(self):
+        relations.commit(vit={"VIT-1": "VUL-1"})
+        published = relations.get_edges()
+        with self.assertRaises(ValueError):
+            with store.commit_group(relations.RELATIONS_FILE):
+                relations.commit(vit={"VIT-2": "VUL-1"})
+                relations.commit(vit={"VIT-3": "VUL-1"})
+                # Este hilo ve sus cambios; el conjunto publicado no cambia.
+                pending = relations.get_edges()
+                self.assertEqual(
+                    pending.referrers_of("VUL-1"), ["VIT-1", "VIT-2", "VIT-3"]
+                )
+                self.assertEqual(published.referrers_of("VUL-1"), ["VIT-1"])
+                raise ValueError("boom")
+        self.assertEqual(relations.get_edges().referrers_of("VUL-1"), ["VIT-1"])
+
+        with store.commit_group(relations.RELATIONS_FILE):
+            relations.commit(vit={"VIT-2": "VUL-1"})
+        self.assertEqual(published.referrers_of("VUL-1"), ["VIT-1"])
+        self.assertEqual(
+            relations.get_edges().referrers_of("VUL-1"), ["VIT-1", "VIT-2"]
+        )
+
+    def test_failed_block_rolls_back(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        with self.assertRaises(ValueError):
+            with store.commit_group(VIT_FILE):
+                store.update_record(VIT_FILE, "VIT-1", close)
+                raise ValueError("boom")
+        self.assertFalse(journal.journal_path(self.path(VIT_FILE)).exists())
+        self.assertEqual(store.load_json_data(VIT_FILE)[0]["estado"], "Nuevo")
+
+
+class DeleteTests(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        store.save_json_data(
+            VIT_FILE,
+            [vit("VIT-1", id=1), vit("VIT-2", id=2), vit("VIT-3", id=3)],
+        )
+        store.save_json_data(VUL_FILE, [vul("VUL-1", id=1)])
+        relations.commit(
+            vit={"VIT-1": "VUL-1", "VIT-2": "VUL-1"},
+            vul={"VUL-1": ["VIT-1", "VIT-2"]},
+        )
+        comments.append_comment("vit", "VIT-1", "revisar")
+        comments.append_comment("vit", "VIT-3", "pendiente")
+
+    def delete(self, kind, ids):
+        return self.client.delete(
+            f"/{kind}/delete-selection/",
+            {"ids": ids},
+            content_type="application/json",
+        )
+
+    def test_resolve_by_id_and_numero(self):
+        index = dup_index.get_index(VIT_FILE)
+        self.assertEqual(index.resolve(["3", " vit-1 ", "VIT-9", ""]), [0, 2])
+
+    def test_resolve_skips_tombstones(self):
+        index = dup_index.get_index(VIT_FILE)
+        store.delete_records(VIT_FILE, index.version, [0])
+        index = dup_index.get_index(VIT_FILE)
+        self.assertEqual(index.resolve(["1", "VIT-1", "2"]), [1])
+
+    def test_delete_cascades_to_links_and_comments(self):
+        response = self.delete("vit", ["1", "VIT-9"])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["deleted"], 1)
+        self.assertEqual(body["removed"][0]["vul"], "VUL-1")
+
+        self.assertEqual(self.numeros(), ["VIT-2", "VIT-3"])
+        edges = relations.get_edges()
+        self.assertEqual(edges.vul_of("VIT-1"), "")
+        self.assertEqual(edges.vits_of("VUL-1"), ["VIT-2"])
+        self.assertEqual(comments.get_comments_for("vit", "VIT-1"), [])
+        self.assertEqual(len(comments.get_comments_for("vit", "VIT-3")), 1)
+
+    def test_deleting_a_vul_unlinks_its_vits(self):
+        response = self.delete("vul", ["VUL-1"])
+        self.assertEqual(response.json()["deleted"], 1)
+        self.assertEqual(self.numeros(VUL_FILE), [])
+        edges = relations.get_edges()
+        self.assertEqual(edges.vul_of("VIT-1"), "")
+        self.assertEqual(edges.vul_of("VIT-2"), "")
+        self.assertEqual(edges.vits_of("VUL-1"), [])
+
+
+class TombstoneTests(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        store.save_json_data(VIT_FILE, [vit(f"VIT-{i}") for i in range(1, 5)])
+
+    def delete(self, *positions):
+        version = store.dataset_version(VIT_FILE)
+        return store.delete_records(VIT_FILE, version, positions)
+
+    def compacted(self, timeout=5.0):
+        # La compactación corre en otro hilo.
+        jpath = journal.journal_path(self.path(VIT_FILE))
+        deadline = time.monotonic() + timeout
+        while (jpath.exists() or store._COMPACTING) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not jpath.exists()
+
+    def test_deleted_rows_read_through_as_tombstones(self):
+        snapshot = self.path(VIT_FILE).read_bytes()
+        gone = self.delete(1)
+        self.assertEqual([r["numero"] for r in gone], ["VIT-2"])
+        self.assertEqual(self.path(VIT_FILE).read_bytes(), snapshot)
+
+        _, shared = store.load_shared(VIT_FILE)
+        self.assertTrue(store.is_tombstone(shared[1]))
+        self.assertEqual(shared[2]["numero"], "VIT-3")
+        self.assertEqual(self.numeros(), ["VIT-1", "VIT-3", "VIT-4"])
+
+        store._CACHE.clear()
+        self.assertEqual(self.numeros(), ["VIT-1", "VIT-3", "VIT-4"])
+
+    def test_below_threshold_waits_for_idle(self):
+        self.delete(0)
+        self.assertFalse(self.compacted(timeout=0.2))
+        self.assertIn(self.path(VIT_FILE), store._IDLE_TIMERS)
+
+    def test_compacts_past_the_row_threshold(self):
+        with mock.patch.object(store, "TOMBSTONE_COMPACT_ROWS", 1):
+            self.delete(0, 2)
+        self.assertTrue(self.compacted())
+        rows = serialization.read_file(self.path(VIT_FILE))
+        self.assertEqual([r["numero"] for r in rows], ["VIT-2", "VIT-4"])
+        self.assertEqual(self.numeros(), ["VIT-2", "VIT-4"])
+
+    def test_compacts_when_idle(self):
+        with mock.patch.object(store, "IDLE_COMPACT_SECONDS", 0.05):
+            self.delete(3)
+            self.assertTrue(self.compacted())
+        rows = serialization.read_file(self.path(VIT_FILE))
+        self.assertFalse(any(store.is_tombstone(r) for r in rows))
+        self.assertNotIn(self.path(VIT_FILE), store._IDLE_TIMERS)
+
+    def test_full_rewrite_drops_tombstones(self):
+        self.delete(0)
+        _, shared = store.load_shared(VIT_FILE)
+        store.save_json_data(VIT_FILE, list(shared))
+        self.assertEqual(len(store.load_shared(VIT_FILE)[1]), 3)
+
+
+class StagingTests(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        store.save_json_data(VIT_FILE, [vit("VIT-1", id=1)])
+        store.save_json_data(VUL_FILE, [vul("VUL-1", id=1)])
+
+    def upload(self, *rows):
+        lines = ["numero,prioridad,estado,vul", *(",".join(r) for r in rows)]
+        content = "\n".join(lines).encode("utf-8")
+        return vit_upload.run_upload(SimpleUploadedFile("vit.csv", content))
+
+    def post(self, url, body):
+        return self.client.post(url, body, content_type="application/json")
+
+    def staged_file(self, token):
+        return staging.STAGING_DIR / f"{token}.json"
+
+    def test_round_trip(self):
+        token = staging.stage("vit", [vit("VIT-2")], [], [{"vulNumero": "VUL-1"}])
+        staged = staging.load_staged("vit", token)
+        self.assertEqual(staged["new"], [vit("VIT-2")])
+        self.assertEqual(staged["relations"], [{"vulNumero": "VUL-1"}])
+        for kind, bad in (("vul", token), ("vit", "../" + token), ("vit", "0" * 32)):
+            with self.assertRaises(ValueError):
+                staging.load_staged(kind, bad)
+
+    def test_expired_tokens_are_rejected_and_purged(self):
+        token = staging.stage("vit", [], [], [])
+        old = time.time() - staging.STAGING_TTL_SECONDS - 10
+        os.utime(self.staged_file(token), (old, old))
+        with self.assertRaises(ValueError):
+            staging.load_staged("vit", token)
+
+        staging.stage("vit", [], [], [])
+        self.assertFalse(self.staged_file(token).exists())
+
+    def test_save_selection_resolves_duplicates_by_token(self):
+        payload, _ = self.upload(
+            ("VIT-1", "Baja", "Abierto", ""), ("VIT-2", "Alta", "Nuevo", "")
+        )
+        token = payload["token"]
+        self.assertEqual(payload["newCount"], 1)
+
+        response = self.post("/vit/save-selection/", {"token": token, "choices": ["x"]})
+        self.assertEqual(response.status_code, 400)
+        response = self.post(
+            "/vit/save-selection/", {"token": token, "choices": ["incoming"] * 2}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(self.staged_file(token).exists())
+
+        response = self.post(
+            "/vit/save-selection/", {"token": token, "choices": ["incoming"]}
+        )
+        self.assertEqual(response.status_code, 200)
+        rows = store.load_json_data(VIT_FILE)
+        self.assertEqual(
+            [(r["id"], r["numero"]) for r in rows], [(1, "VIT-1"), (2, "VIT-2")]
+        )
+        self.assertEqual(rows[0]["estado"], "Abierto")
+        # Resuelto: el token deja de valer.
+        self.assertFalse(self.staged_file(token).exists())
+        response = self.post("/vit/save-selection/", {"token": token, "choices": []})
+        self.assertEqual(response.status_code, 400)
+
+    def test_apply_relations_by_token(self):
+        payload, _ = self.upload(
+            ("VIT-2", "Alta", "Nuevo", "VUL-1"), ("VIT-3", "Alta", "Nuevo", "VUL-1")
+        )
+        token = payload["token"]
+        self.assertEqual(len(payload["relations"]), 2)
+
+        response = self.post("/vit/save-selection/", {"token": token, "choices": []})
+        self.assertEqual(response.status_code, 200)
+        # Quedan relaciones: save-selection conserva el token.
+        self.assertTrue(self.staged_file(token).exists())
+
+        for apply in ([2], [-1], ["x"], "0"):
+            response = self.post(
+                "/vit/apply-relations/", {"token": token, "apply": apply}
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(relations.get_edges().vits_of("VUL-1"), [])
+
+        response = self.post("/vit/apply-relations/", {"token": token, "apply": [1]})
+        self.assertEqual(response.status_code, 200)
+        edges = relations.get_edges()
+        self.assertEqual(edges.vits_of("VUL-1"), ["VIT-3"])
+        self.assertEqual(edges.vul_of("VIT-3"), "VUL-1")
+        self.assertFalse(self.staged_file(token).exists())
+
+
+class LinkViewTests(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        store.save_json_data(VIT_FILE, [vit("VIT-1", id=1), vit("VIT-2", id=2)])
+        store.save_json_data(VUL_FILE, [vul("VUL-1", id=1), vul("VUL-2", id=2)])
+        relations.commit(
+            vit={"VIT-1": "VUL-1", "VIT-2": "VUL-1"}, vul={"VUL-1": "VIT-1, VIT-9"}
+        )
+
+    def listings(self):
+        return [
+            self.client.get(f"/{kind}/risk-data/").json() for kind in ("vit", "vul")
+        ]
+
+    def assertMatchesRebuild(self):
+        patched = self.listings()
+        links._VIEW = None
+        self.assertEqual(patched, self.listings())
+
+    def test_vits_text_and_has_link(self):
+        vits, vuls = self.listings()
+        vul_data = vits[0]["vulData"]
+        # Texto guardado tal cual y, detrás, los VITs que apuntan al VUL.
+        self.assertEqual(vul_data["vits"], "VIT-1, VIT-9,VIT-2")
+        self.assertTrue(vul_data["hasLink"])
+        self.assertEqual(vuls[0]["vits"], "VIT-1, VIT-9")
+        self.assertTrue(vuls[0]["hasLink"])
+        self.assertFalse(vuls[1]["hasLink"])
+
+    def test_patched_view_matches_a_rebuild(self):
+        self.listings()
+        post = self.client.post
+        post(
+            "/vit/update-status/",
+            {"numero": "VIT-2", "estado": "Cerrado"},
+            content_type="application/json",
+        )
+        self.assertMatchesRebuild()
+
+        content = b"numero,prioridad,estado,vul\nVIT-3,Alta,Nuevo,VUL-2"
+        vit_upload.run_upload(SimpleUploadedFile("vit.csv", content))
+        self.assertMatchesRebuild()
+
+        post(
+            "/vul/apply-relations/",
+            {"relations": [{"vulNumero": "VUL-2", "vitNumero": "VIT-3"}]},
+            content_type="application/json",
+        )
+        self.assertMatchesRebuild()
+
+        self.client.delete(
+            "/vit/delete-selection/", {"ids": ["1"]}, content_type="application/json"
+        )
+        self.assertMatchesRebuild()
+        _, vuls = self.listings()
+        self.assertEqual([v["vits"] for v in vuls], ["VIT-9", "VIT-3"])
+
+
+class ETagTests(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+
+    def revalidate(self, url, etag, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_matching_etag_is_not_modified(self):
+        for url in ("/vit/risk-data/", "/vul/risk-data/"):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn("no-cache", first["Cache-Control"])
+            second = self.revalidate(url, first["ETag"])
+            self.assertEqual(second.status_code, 304)
+            self.assertEqual(second.content, b"")
+            # Otra página u otro filtro es otra representación.
+            other = self.revalidate(url, first["ETag"], page="1")
+            self.assertEqual(other.status_code, 200)
+
+    def test_writes_change_the_etag(self):
+        url = "/vul/risk-data/"
+        etag = self.client.get(url)["ETag"]
+        store.update_record(VIT_FILE, "VIT-1", close)
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response["ETag"]
+        relations.commit(vit={"VIT-1": "VUL-1"})
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_comments(self):
+        url = "/vit/comments/VIT-1/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+        self.client.post(url, {"text": "revisar"}, content_type="application/json")
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c["text"] for c in response.json()], ["revisar"])
+
+
+class SerializationTests(DataDirTestCase):
+    NAN_FILE = b'[{"numero": "VIT-1", "cvss": NaN, "dias": Infinity}]'
+
+    def test_loads_falls_back_on_nan_and_infinity(self):
+        for orjson in (serialization.orjson, None):
+            with mock.patch.object(serialization, "orjson", orjson):
+                row = serialization.loads(self.NAN_FILE)[0]
+                self.assertTrue(math.isnan(row["cvss"]))
+                self.assertEqual(row["dias"], math.inf)
+                with self.assertRaises(ValueError):
+                    serialization.loads(b'[{"numero": ')
+
+    def test_datasets_written_by_pandas_still_load(self):
+        self.path(VIT_FILE).write_bytes(self.NAN_FILE)
+        self.assertEqual(self.numeros(), ["VIT-1"])
+        store.update_record(VIT_FILE, "VIT-1", close)
+        store._CACHE.clear()
+        self.assertEqual(store.load_json_data(VIT_FILE)[0]["estado"], "Cerrado")
+
+    def test_dumps_matches_the_django_encoder(self):
+        data = {"importe": Decimal("1.50"), "fecha": date(2024, 1, 2), "n": "ñ"}
+        expected = {"importe": "1.50", "fecha": "2024-01-02", "n": "ñ"}
+        for orjson in (serialization.orjson, None):
+            with mock.patch.object(serialization, "orjson", orjson):
+                for pretty in (False, True):
+                    raw = serialization.dumps(data, pretty=pretty)
+                    self.assertEqual(json.loads(raw), expected)
+                    self.assertEqual(b"\n" in raw, pretty)
+
+
+class IngestTests(DataDirTestCase):
+    def frames(self, content, name="datos.csv"):
+        upload = SimpleUploadedFile(name, content)
+        return list(ingest.iter_upload_frames(upload))
+
+    def test_delimiter_is_sniffed_and_leading_zeros_kept(self):
+        for sep in (",", ";", "\t", "|"):
+            content = f'numero{sep}idExterno{sep}resumen\n007{sep}0012{sep}"a, b"\n'
+            (df,) = self.frames(("\ufeff" + content).encode("utf-8"))
+            self.assertEqual(list(df.columns), ["numero", "idExterno", "resumen"])
+            self.assertEqual(df.iloc[0].tolist(), ["007", "0012", "a, b"])
+
+    def test_csv_upload_keeps_leading_zeros(self):
+        content = b"numero;prioridad;estado\n007;Alta;Nuevo\n"
+        payload, status = vit_upload.run_upload(SimpleUploadedFile("v.csv", content))
+        self.assertEqual(status, 200, payload)
+        self.assertEqual(self.numeros(), ["007"])
+
+    def test_parquet_matches_csv(self):
+        csv_df = self.frames(b"numero,estado\n007,Nuevo\nVIT-2,\n")[0]
+        buffer = BytesIO()
+        csv_df.to_parquet(buffer)
+        # Sin extensión conocida se reconoce por la firma "PAR1".
+        (parquet_df,) = self.frames(buffer.getvalue(), name="subida.bin")
+        self.assertTrue(parquet_df.equals(csv_df))
+
+    def test_missing_pyarrow_is_reported(self):
+        upload = SimpleUploadedFile("vul.parquet", b"PAR1")
+        with mock.patch.dict("sys.modules", {"pyarrow": None, "pyarrow.parquet": None}):
+            payload, status = vul_upload.run_upload(upload)
+        self.assertEqual(status, 400)
+        self.assertRegex(payload["error"], r"^pyarrow\S* is required on server")
+
+
+class FrameTests(TestCase):
+    def test_clean_frame_matches_sanitize_any(self):
+        df = pd.DataFrame(
+            {
+                "texto": ["  a ", None, "nan", " NULL ", "None", float("nan")],
+                "mixto": [1, 2.5, True, {"k": 1}, date(2024, 1, 2), "x"],
+                "num": [1.0, float("nan"), 3.0, 4.0, 5.0, 6.0],
+                "entero": [1, 2, 3, 4, 5, 6],
+                "flag": [True, False, True, False, True, False],
+                "fecha": pd.to_datetime(["2024-01-02 03:04:05"] * 6),
+                "vacia": [None] * 6,
+            }
+        )
+        rows = df.to_dict(orient="records")
+        expected = [vit_risk._sanitize_any(dict(r)) for r in rows]
+        self.assertEqual(frames.clean_frame(df).to_dict(orient="records"), expected)
+        self.assertEqual([vul_risk._sanitize_any(dict(r)) for r in rows], expected)
+
+    def test_due_dates_match_calculate_due_date(self):
+        creado = [
+            "2024-01-15",
+            "15/01/2024",
+            "2024-01-15 10:00:00",
+            "",
+            "no es fecha",
+            None,
+            "2024-02-29",
+        ]
+        prioridad = ["Alta", " CRÍTICO ", "media", "Baja", "Alta", "critical", None]
+        df = pd.DataFrame({"creado": creado, "prioridad": prioridad})
+        base = dates.parse_date_series(df["creado"])
+        days = frames.horizon_days(df["prioridad"], normalize_accents=True)
+        expected = [
+            vit_risk.calculate_due_date(c, p) or "" for c, p in zip(creado, prioridad)
+        ]
+        self.assertEqual(frames.due_dates(base, days).tolist(), expected)
+        self.assertEqual(expected[:3], ["2024-04-14", "2024-02-14", "2025-01-14"])
+
+    def test_vul_due_date_falls_back_to_actualizado(self):
+        df = pd.DataFrame(
+            {
+                "numero": ["VUL-1", "VUL-2", "VUL-3"],
+                "prioridad": ["Alta", "crítico", "Baja"],
+                "estado": ["Nuevo"] * 3,
+                "creado": ["2024-01-01", "", ""],
+                "actualizado": ["2024-06-01", "2024-01-31", ""],
+                "dueDate": ["", "", "2030-01-01"],
+            }
+        )
+        df = vul_upload.normalize_headers_vul(df)
+        due = vul_upload._prepare_frame(df)["dueDate"].tolist()
+        self.assertEqual(due, ["2024-03-31", "2024-03-01", "2030-01-01"])
+
+
+class DateTests(TestCase):
+    CASES = {
+        "2024-03-05": datetime(2024, 3, 5),
+        "2024/03/05": datetime(2024, 3, 5),
+        "05/03/2024": datetime(2024, 3, 5),
+        "5-3-2024": datetime(2024, 3, 5),
+        "2024-03-05 10:20:30": datetime(2024, 3, 5, 10, 20, 30),
+        "2024/03/05 10:20:30": datetime(2024, 3, 5, 10, 20, 30),
+        "2024-03-05T10:20:30": datetime(2024, 3, 5, 10, 20, 30),
+        "2024-03-05T10:20:30.123": datetime(2024, 3, 5, 10, 20, 30, 123000),
+        " 2024-03-05 ": datetime(2024, 3, 5),
+        # Forma correcta pero fecha imposible.
+        "2024-13-05": None,
+        "31/02/2024": None,
+        "": None,
+        "NaN": None,
+        "null": None,
+        "ayer": None,
+    }
+
+    def test_parse_date_every_format(self):
+        for text, expected in self.CASES.items():
+            self.assertEqual(dates.parse_date(text), expected, text)
+        self.assertIsNone(dates.parse_date(None))
+        self.assertEqual(
+            dates.parse_date("2024-03-05T10:20:30+02:00"),
+            datetime(2024, 3, 5, 10, 20, 30, tzinfo=dt_timezone(timedelta(hours=2))),
+        )
+
+    def test_series_matches_parse_date(self):
+        texts = list(self.CASES) + ["2024-03-05T10:20:30+02:00", None]
+        # Un formato dominante y, en la misma columna, el resto de formas.
+        column = pd.Series([f"2024-01-0{d}" for d in range(1, 10)] + texts)
+        parsed = dates.parse_date_series(column)
+        for text, value in zip(column, parsed):
+            expected = dates.parse_date(text)
+            if expected is None:
+                self.assertTrue(pd.isna(value), text)
+            else:
+                # La zona horaria se descarta conservando la hora escrita.
+                self.assertEqual(value.to_pydatetime(), expected.replace(tzinfo=None))
+
+    def test_empty_series(self):
+        parsed = dates.parse_date_series(pd.Series([None, "", "nan"]))
+        self.assertTrue(parsed.isna().all())
+        self.assertEqual(str(parsed.dtype), "datetime64[ns]")
+
+
+class MatchKeyTests(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        store.save_json_data(VIT_FILE, [vit(" Vít-1 ", id=1, idExterno="EXT")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1", id=1)])
+
+    def test_key_is_stored_normalized(self):
+        row = store.load_json_data(VIT_FILE)[0]
+        self.assertEqual(row[keys.MATCH_KEY_FIELD], ["vit-1", "ext"])
+        self.assertEqual(keys.match_key(row), ("vit-1", "ext"))
+
+    def test_key_never_leaves_the_api(self):
+        for kind in ("vit", "vul"):
+            rows = self.client.get(f"/{kind}/risk-data/").json()
+            self.assertNotIn(keys.MATCH_KEY_FIELD, rows[0])
+
+        content = b"numero,prioridad,estado,vul\nVIT-1,Baja,Abierto,\n"
+        payload, _ = vit_upload.run_upload(SimpleUploadedFile("vit.csv", content))
+        duplicate = payload["duplicates"][0]
+        self.assertNotIn(keys.MATCH_KEY_FIELD, duplicate["existing"])
+        self.assertNotIn(keys.MATCH_KEY_FIELD, duplicate["incoming"])
+
+        response = self.client.delete(
+            "/vit/delete-selection/", {"ids": ["1"]}, content_type="application/json"
+        )
+        self.assertNotIn(keys.MATCH_KEY_FIELD, response.json()["removed"][0])
+
+
+class ReferrerTests(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        store.save_json_data(VIT_FILE, [vit("VIT-1"), vit("VIT-2"), vit("VIT-3")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+
+    def post(self, url, body):
+        return self.client.post(url, body, content_type="application/json")
+
+    def test_referrers_follow_vit_declarations(self):
+        relations.commit(vit={"VIT-1": "VUL-1", "VIT-2": "VUL-1"})
+        edges = relations.get_edges()
+        self.assertEqual(sorted(edges.referrers_of(" vul-1 ")), ["VIT-1", "VIT-2"])
+        # Declarar solo en el VIT no lista el VIT en el VUL.
+        self.assertEqual(edges.vits_of("VUL-1"), [])
+
+        relations.commit(vit={"VIT-1": "VUL-2", "VIT-2": ""})
+        edges = relations.get_edges()
+        self.assertEqual(edges.referrers_of("VUL-1"), [])
+        self.assertEqual(edges.referrers_of("VUL-2"), ["VIT-1"])
+
+    def test_vul_upload_proposes_referrers_and_applies_them(self):
+        relations.commit(vit={"VIT-1": "VUL-2", "VIT-2": "VUL-2"})
+        content = b"numero,prioridad,estado,actualizado,vits\nVUL-2,Alta,Nuevo,,VIT-1\n"
+        payload, status = vul_upload.run_upload(SimpleUploadedFile("vul.csv", content))
+        self.assertEqual(status, 200, payload)
+        self.assertEqual(
+            payload["relations"],
+            [
+                {
+                    "vulNumero": "VUL-2",
+                    "vitNumero": "VIT-2",
+                    "before": "VIT-1",
+                    "after": relations.join_vits(["VIT-1", "VIT-2"]),
+                }
+            ],
+        )
+
+        token = payload["token"]
+        response = self.post("/vul/save-selection/", {"token": token, "choices": []})
+        self.assertEqual(response.status_code, 200)
+        response = self.post("/vul/apply-relations/", {"token": token, "apply": [0]})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        edges = relations.get_edges()
+        self.assertEqual(edges.vits_of("VUL-2"), ["VIT-1", "VIT-2"])
+        self.assertEqual(sorted(edges.referrers_of("VUL-2")), ["VIT-1", "VIT-2"])
+        self.assertEqual(edges.referrers_of("VUL-1"), [])
+
+
+class JobTests(DataDirTestCase):
+    def setUp(self):
+        super().setUp()
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+
+    def submit(self, content, name="vit.csv"):
+        upload = SimpleUploadedFile(name, content, content_type="text/csv")
+        return self.client.post("/vit/upload/?async=1", {"file": upload})
+
+    def wait(self, url, timeout=5.0):
+        # El trabajo corre en el pool de hilos.
+        deadline = time.monotonic() + timeout
+        while True:
+            state = self.client.get(url).json()
+            if state["status"] in ("done", "failed") or time.monotonic() > deadline:
+                return state
+            time.sleep(0.01)
+
+    def test_job_runs_to_done(self):
+        stages = []
+        run = vit_upload.run_upload
+
+        def recording(f, progress):
+            def record(stage, rows=None):
+                stages.append(stage)
+                progress(stage, rows)
+
+            return run(f, record)
+
+        with mock.patch.object(vit_upload, "run_upload", recording):
+            response = self.submit(b"numero,prioridad,estado,vul\nVIT-2,Alta,Nuevo,\n")
+            self.assertEqual(response.status_code, 202)
+            job = response.json()
+            self.assertEqual((job["status"], job["stage"]), ("queued", "queued"))
+            url = job["statusUrl"]
+            self.assertEqual(url, f"/vit/upload/jobs/{job['jobId']}/")
+            state = self.wait(url)
+
+        self.assertEqual(state["status"], "done", state)
+        self.assertEqual((state["stage"], state["httpStatus"]), ("done", 200))
+        self.assertEqual(state["rowsProcessed"], 1)
+        self.assertEqual(stages, ["parsing", "comparing", "merging"])
+        self.assertEqual(self.numeros(), ["VIT-1", "VIT-2"])
+        self.assertEqual(list(jobs.JOBS_DIR.glob("*.upload*")), [])
+
+    def test_failed_job_keeps_the_error(self):
+        state = self.wait(self.submit(b"").json()["statusUrl"])
+        self.assertEqual((state["status"], state["httpStatus"]), ("failed", 400))
+        self.assertEqual(state["result"]["error"], "Normalized columns missing")
+        self.assertEqual(self.numeros(), ["VIT-1"])
+
+    def test_status_endpoint(self):
+        job_id = self.submit(b"numero,prioridad,estado,vul\n").json()["jobId"]
+        self.wait(f"/vit/upload/jobs/{job_id}/")
+        for url in (f"/vul/upload/jobs/{job_id}/", "/vit/upload/jobs/..%2Fx/"):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.post(f"/vit/upload/jobs/{job_id}/")
+        self.assertEqual(response.status_code, 405)
+
+    def test_expired_jobs_are_purged(self):
+        job_id = self.submit(b"numero,prioridad,estado,vul\n").json()["jobId"]
+        self.wait(f"/vit/upload/jobs/{job_id}/")
+        path = jobs.JOBS_DIR / f"{job_id}.json"
+        old = time.time() - jobs.JOB_TTL_SECONDS - 10
+        os.utime(path, (old, old))
+
+        self.wait(self.submit(b"numero,prioridad,estado,vul\n").json()["statusUrl"])
+        self.assertFalse(path.exists())
+        self.assertIsNone(jobs.get_job(job_id))
+
+
+class UploadCacheTests(DataDirTestCase):
+    def chunks(self, *numeros):
+        return [[vit(n) for n in numeros]]
+
+    def spilled(self):
+        return sorted(p.stem for p in upload_cache.CACHE_DIR.glob("*.json"))
+
+    def test_key_follows_kind_and_content(self):
+        upload = SimpleUploadedFile("vit.csv", b"numero\nVIT-1\n")
+        key = upload_cache.content_key("vit", upload)
+        self.assertEqual(upload.tell(), 0)
+        same = SimpleUploadedFile("otro.csv", b"numero\nVIT-1\n")
+        self.assertEqual(upload_cache.content_key("vit", same), key)
+        self.assertNotEqual(upload_cache.content_key("vul", upload), key)
+        other = SimpleUploadedFile("vit.csv", b"numero\nVIT-2\n")
+        self.assertNotEqual(upload_cache.content_key("vit", other), key)
+
+    def test_hit_skips_parsing(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+        content = b"numero,prioridad,estado,vul\nVIT-2,Alta,Nuevo,\n"
+
+        payload, _ = vit_upload.run_upload(SimpleUploadedFile("vit.csv", content))
+        self.assertEqual(self.numeros(), ["VIT-1", "VIT-2"])
+
+        with mock.patch.object(
+            vit_upload, "iter_upload_frames", side_effect=AssertionError
+        ):
+            again, status = vit_upload.run_upload(
+                SimpleUploadedFile("vit.csv", content)
+            )
+        self.assertEqual(status, 200, again)
+        self.assertEqual(again["duplicates"][0]["incoming"]["numero"], "VIT-2")
+
+    def test_readers_get_copies(self):
+        upload_cache.put("a", self.chunks("VIT-1"))
+        upload_cache.get("a")[0][0]["estado"] = "Cerrado"
+        self.assertEqual(upload_cache.get("a"), self.chunks("VIT-1"))
+
+    def test_evicted_entries_spill_to_disk_and_come_back(self):
+        with mock.patch.object(upload_cache, "UPLOAD_CACHE_ENTRIES", 2):
+            for key in ("a", "b", "c"):
+                upload_cache.put(key, self.chunks(f"VIT-{key}"))
+            self.assertEqual(list(upload_cache._MEM), ["b", "c"])
+            self.assertEqual(self.spilled(), ["a"])
+
+            self.assertEqual(upload_cache.get("a"), self.chunks("VIT-a"))
+            self.assertEqual(list(upload_cache._MEM), ["c", "a"])
+            self.assertEqual(self.spilled(), ["a", "b"])
+        self.assertIsNone(upload_cache.get("z"))
+
+    def test_row_and_disk_limits(self):
+        with mock.patch.multiple(
+            upload_cache, UPLOAD_CACHE_ROWS=3, UPLOAD_CACHE_DISK_ENTRIES=1
+        ):
+            upload_cache.put("a", self.chunks("VIT-1", "VIT-2"))
+            upload_cache.put("b", self.chunks("VIT-3", "VIT-4"))
+            self.assertEqual(list(upload_cache._MEM), ["b"])
+            self.assertEqual(upload_cache._MEM_ROWS, 2)
+            self.assertEqual(self.spilled(), ["a"])
+
+            upload_cache.put("c", self.chunks("VIT-5"))
+            upload_cache.put("d", self.chunks("VIT-6", "VIT-7", "VIT-8"))
+            self.assertEqual(list(upload_cache._MEM), ["d"])
+            self.assertEqual(len(self.spilled()), 1)
+            # Más filas que el límite: no se guarda.
+            upload_cache.put("e", self.chunks(*(f"VIT-{i}" for i in range(4))))
+            self.assertIsNone(upload_cache.get("e"))
+
+
+class PlanTests(DataDirTestCase):
+    def plan(self, planner, filename, entries):
+        index = dup_index.get_index(filename)
+        return [(pos, rec["id"], rec["numero"]) for pos, rec in planner(index, entries)]
+
+    def test_vit_plan_keeps_position_and_id(self):
+        store.save_json_data(
+            VIT_FILE,
+            [
+                vit("VIT-1", id=7, idExterno="EXT-1"),
+                vit("VIT-2", id=3),
+                vit("VIT-3"),
+            ],
+        )
+        entries = [
+            vit("VIT-2", estado="Cerrado"),
+            vit("VIT-1b", idExterno=" ext-1 "),
+            vit("VIT-9"),
+            vit("VIT-3"),
+            vit("VIT-10"),
+        ]
+        plan = self.plan(vit_risk.plan_selected_entries, VIT_FILE, entries)
+        self.assertEqual(
+            plan,
+            [
+                (1, 3, "VIT-2"),
+                (0, 7, "VIT-1b"),
+                (None, 8, "VIT-9"),
+                (2, 9, "VIT-3"),
+                (None, 10, "VIT-10"),
+            ],
+        )
+
+        index = dup_index.get_index(VIT_FILE)
+        [(_, record)] = vit_risk.plan_selected_entries(index, entries[:1])
+        self.assertEqual(record["estado"], "Cerrado")
+        self.assertEqual(record[keys.MATCH_KEY_FIELD], ["vit-2", ""])
+
+    def test_vul_plan_keeps_position_and_id(self):
+        store.save_json_data(VUL_FILE, [vul("VUL-1", id=5), vul("VUL-2")])
+        entries = [vul(" vul-1 "), vul("VUL-9"), vul("VUL-2")]
+        plan = self.plan(vul_risk.plan_selected_entries_vul, VUL_FILE, entries)
+        # Como antes, los ids nuevos de VUL parten del número de ids distintos
+        # en uso (el registro sin id cuenta como uno).
+        self.assertEqual(plan, [(0, 5, " vul-1 "), (None, 3, "VUL-9"), (1, 4, "VUL-2")])
+
+
+class LastModifiedTests(DataDirTestCase):
+    def test_update_status_changes_last_modified(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1"), vit("VIT-2")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+        self.age(VIT_FILE)
+        self.age(VUL_FILE)
+
+        first = self.client.get("/vit/risk-data/")
+        self.assertEqual(first.status_code, 200)
+
+        response = self.client.post(
+            "/vit/update-status/",
+            {"numero": "VIT-1", "estado": "Cerrado"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        # El cambio va al diario; el snapshot conserva su mtime antiguo.
+        self.assertTrue(self.path(VIT_FILE + ".journal").exists())
+
+        second = self.client.get(
+            "/vit/risk-data/", HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+        )
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["Last-Modified"], first["Last-Modified"])
+
+    def test_relations_change_last_modified(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+        self.age(VIT_FILE)
+        self.age(VUL_FILE)
+
+        first = self.client.get("/vul/risk-data/")
+        relations.commit(vit={"VIT-1": "VUL-1"})
+
+        second = self.client.get(
+            "/vul/risk-data/", HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+        )
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["Last-Modified"], first["Last-Modified"])
+
+
+class UploadMergeTests(DataDirTestCase):
+    def csv(self, *rows):
+        lines = ["numero,prioridad,estado,vul", *(",".join(r) for r in rows)]
+        content = "\n".join(lines).encode("utf-8")
+        return SimpleUploadedFile("vit.csv", content, content_type="text/csv")
+
+    def test_records_and_links_publish_together(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+
+        upload = self.csv(("VIT-2", "Alta", "Nuevo", "VUL-9"))
+        payload, status = vit_upload.run_upload(upload)
+        self.assertEqual(status, 200, payload)
+        numeros = [r["numero"] for r in store.load_json_data(VIT_FILE)]
+        self.assertEqual(numeros, ["VIT-1", "VIT-2"])
+        self.assertEqual(relations.get_edges().vul_of("VIT-2"), "VUL-9")
+
+    def test_merge_appends_one_journal_line(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1", id=7), vit("VIT-2", id=3)])
+        snapshot = self.path(VIT_FILE).read_bytes()
+
+        upload = self.csv(
+            ("VIT-3", "Alta", "Nuevo", ""), ("VIT-4", "Baja", "Nuevo", "")
+        )
+        payload, status = vit_upload.run_upload(upload)
+        self.assertEqual(status, 200, payload)
+        self.assertEqual(self.path(VIT_FILE).read_bytes(), snapshot)
+        lines = journal.journal_path(self.path(VIT_FILE)).read_bytes().splitlines()
+        self.assertEqual(len(lines), 1)
+
+        store._CACHE.clear()
+        ids = [r["id"] for r in store.load_json_data(VIT_FILE)]
+        self.assertEqual(ids, [7, 3, 8, 9])
+
+    def test_merge_into_an_empty_dataset(self):
+        upload = self.csv(("VIT-1", "Alta", "Nuevo", ""))
+        payload, status = vit_upload.run_upload(upload)
+        self.assertEqual(status, 200, payload)
+        self.assertEqual(self.numeros(), ["VIT-1"])
+
+    def test_failed_link_commit_rolls_back_records(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+
+        with mock.patch.object(vit_upload, "commit", side_effect=OSError("disk")):
+            with self.assertRaises(OSError):
+                vit_upload.run_upload(self.csv(("VIT-2", "Alta", "Nuevo", "VUL-9")))
+        store._CACHE.clear()
+        numeros = [r["numero"] for r in store.load_json_data(VIT_FILE)]
+        self.assertEqual(numeros, ["VIT-1"])
+        self.assertEqual(list(self.data_dir.glob("**/*.tmp")), [])
+
+    def test_upload_cache_is_capped(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1")])
+        store.save_json_data(VUL_FILE, [vul("VUL-1")])
+        rows = [("VIT-2", "Alta", "Nuevo", ""), ("VIT-3", "Alta", "Nuevo", "")]
+
+        with mock.patch.object(upload_cache, "UPLOAD_CACHE_ROWS", 1):
+            upload = self.csv(*rows)
+            payload, status = vit_upload.run_upload(upload)
+            self.assertEqual(status, 200, payload)
+            self.assertIsNone(upload_cache.get(upload_cache.content_key("vit", upload)))
+
+        upload = self.csv(*rows)
+        payload, status = vit_upload.run_upload(upload)
+        self.assertEqual(status, 200, payload)
+        cached = upload_cache.get(upload_cache.content_key("vit", upload))
+        self.assertEqual([r["numero"] for r in cached[0]], ["VIT-2", "VIT-3"])
+
+
+class SqliteStoreTests(DataDirTestCase):
+    STORAGE_BACKEND = "sqlite"
+
+    def test_store_api(self):
+        store.save_json_data(VIT_FILE, [vit("VIT-1", id=1), vit("VIT-2", id=2)])
+        version = store.dataset_version(VIT_FILE)
+
+        self.assertIsNone(store.update_record(VIT_FILE, "VIT-9", close))
+        store.update_record(VIT_FILE, "VIT-1", close)
+        store.update_records(VIT_FILE, [("VIT-2", close), ("VIT-9", close)])
+        self.assertEqual(store.dataset_version(VIT_FILE), version + 2)
+
+        index = dup_index.get_index(VIT_FILE)
+        store.upsert_records(
+            VIT_FILE, index.version, [(1, vit("VIT-2", id=2)), (None, vit("VIT-3"))]
+        )
+        index = dup_index.get_index(VIT_FILE)
+        store.delete_records(VIT_FILE, index.version, [0])
+
+        store._CACHE.clear()
+        rows = store.load_json_data(VIT_FILE)
+        self.assertEqual(
+            [(r["numero"], r["estado"]) for r in rows],
+            [("VIT-2", "Nuevo"), ("VIT-3", "Nuevo")],
+        )
+
+    def test_links_and_comments(self):
+        relations.commit(vit={"VIT-1": "VUL-1"}, vul={"VUL-1": "VIT-1, VIT-2"})
+        comments.append_comment("vit", "VIT-1", "revisar")
+
+        relations._EDGES = None
+        edges = relations.get_edges()
+        self.assertEqual(edges.vul_of("VIT-1"), "VUL-1")
+        # La tabla solo guarda aristas: el texto vuelve unido con ",".
+        self.assertEqual(edges.vits_text("VUL-1"), "VIT-1,VIT-2")
+        thread = comments.get_comments_for("vit", "VIT-1")
+        self.assertEqual([c["text"] for c in thread], ["revisar"])
+
+    def test_import_json_data(self):
+        patchers = [
+            mock.patch.object(module, "STORAGE_BACKEND", "json")
+            for module in (store, comments)
+        ]
+        for patcher in patchers:
+            patcher.start()
+        try:
+            store.save_json_data(
+                VIT_FILE, [vit("VIT-1", id=1, vul="VUL-1"), vit("VIT-2", id=2)]
+            )
+            store.save_json_data(VUL_FILE, [vul("VUL-1", id=1, vits="VIT-1")])
+            store.delete_records(VIT_FILE, store.dataset_version(VIT_FILE), [1])
+            comments.append_comment("vit", "VIT-1", "revisar")
+        finally:
+            for patcher in patchers:
+                patcher.stop()
+        self._reset_caches()
+
+        with mock.patch.object(import_json_data, "DATA_DIR", self.data_dir):
+            call_command("import_json_data", stdout=StringIO())
+
+        rows = store.load_json_data(VIT_FILE)
+        # Las lápidas del diario no se importan y los enlaces van a su tabla.
+        self.assertEqual([(r["id"], r["numero"]) for r in rows], [(1, "VIT-1")])
+        self.assertNotIn("vul", rows[0])
+        edges = relations.get_edges()
+        self.assertEqual(edges.vul_of("VIT-1"), "VUL-1")
+        self.assertEqual(edges.vits_of("VUL-1"), ["VIT-1"])
+        thread = comments.get_comments_for("vit", "VIT-1")
+        self.assertEqual([c["text"] for c in thread], ["revisar"])
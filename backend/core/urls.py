@@ -1,22 +1,34 @@
 from django.urls import path
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from core.views.common.serialization import JsonResponse
 
 from core.views.VIT.list_view import get_vit_risk_data
-from core.views.VIT.upload import upload_data as vit_upload_data
+from core.views.VIT.upload import (
+    upload_data as vit_upload_data,
+    upload_job_status as vit_upload_job_status,
+)
 from core.views.VIT.save_selection import save_selection as vit_save_selection
 from core.views.VIT.apply_relations import apply_relations
 from core.views.VIT import delete_selection as vit_delete_selection
 from core.views.VIT.comments import vit_comments_view
-from core.views.VIT.update import update_status as vit_update_status
+from core.views.VIT.update import (
+    update_status as vit_update_status,
+    update_status_bulk as vit_update_status_bulk,
+)
 
 from core.views.VUL.list_view import get_vul_risk_data
-from core.views.VUL.upload import upload_data as vul_upload_data
+from core.views.VUL.upload import (
+    upload_data as vul_upload_data,
+    upload_job_status as vul_upload_job_status,
+)
 from core.views.VUL.save_selection import save_selection as vul_save_selection
 from core.views.VUL.apply_relations import apply_relations_vul
 from core.views.VUL import delete_selection as vul_delete_selection
 from core.views.VUL.comments import vul_comments_view
-from core.views.VUL.update import update_status as vul_update_status
+from core.views.VUL.update import (
+    update_status as vul_update_status,
+    update_status_bulk as vul_update_status_bulk,
+)
 
 
 @csrf_exempt
@@ -28,20 +40,24 @@ def home_view(_request):
                 "VIT": {
                     "list": "/vit/risk-data/",
                     "upload": "/vit/upload/",
+                    "upload-status": "/vit/upload/jobs/<jobId>/",
                     "save": "/vit/save-selection/",
                     "apply-relations": "/vit/apply-relations/",
                     "delete": "/vit/delete-selection/",
                     "comments": "/vit/comments/<numero>/",
                     "update-status": "/vit/update-status/",
+                    "update-status-bulk": "/vit/update-status/bulk/",
                 },
                 "VUL": {
                     "list": "/vul/risk-data/",
                     "upload": "/vul/upload/",
+                    "upload-status": "/vul/upload/jobs/<jobId>/",
                     "save": "/vul/save-selection/",
                     "apply-relations": "/vul/apply-relations/",
                     "delete": "/vul/delete-selection/",
                     "comments": "/vul/comments/<numero>/",
                     "update-status": "/vul/update-status/",
+                    "update-status-bulk": "/vul/update-status/bulk/",
                 },
             },
         }
@@ -53,17 +69,21 @@ urlpatterns = [
     # VIT
     path("vit/risk-data/", get_vit_risk_data),
     path("vit/upload/", vit_upload_data),
+    path("vit/upload/jobs/<str:job_id>/", vit_upload_job_status),
     path("vit/save-selection/", vit_save_selection),
     path("vit/apply-relations/", apply_relations),
     path("vit/delete-selection/", vit_delete_selection.delete_selection),
     path("vit/comments/<str:numero>/", vit_comments_view),
     path("vit/update-status/", vit_update_status),
+    path("vit/update-status/bulk/", vit_update_status_bulk),
     # VUL
     path("vul/risk-data/", get_vul_risk_data),
     path("vul/upload/", vul_upload_data),
+    path("vul/upload/jobs/<str:job_id>/", vul_upload_job_status),
     path("vul/save-selection/", vul_save_selection),
     path("vul/apply-relations/", apply_relations_vul),
     path("vul/delete-selection/", vul_delete_selection.delete_selection),
     path("vul/comments/<str:numero>/", vul_comments_view),
     path("vul/update-status/", vul_update_status),
+    path("vul/update-status/bulk/", vul_update_status_bulk),
 ]
@@ -1,11 +1,14 @@
 # core/views/VIT/delete_selection.py
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.conf import settings
-import json
-import os
+from core.views.common.comments import comments_filename, delete_comments
+from core.views.common.dup_index import get_index
+from core.views.common.keys import strip_match_key
+from core.views.common.relations import RELATIONS_FILE, commit, get_edges, render
+from core.views.common.serialization import JsonResponse, loads
+from core.views.common.store import commit_group, delete_records
+from core.views.common.utils import DATA_DIR
 
-DATA_FILE = os.path.join(settings.BASE_DIR, "core", "data", "CSIRT", "vit_Data.json")
+JSON_FILE = "CSIRT/vit_Data.json"
 
 
 @csrf_exempt
@@ -13,27 +16,27 @@ def delete_selection(request):
     if request.method != "DELETE":
         return JsonResponse({"error": "Método no permitido"}, status=405)
     try:
-        body = json.loads(request.body)
-        ids_to_delete = set(str(i) for i in body.get("ids", []))
-        if not os.path.exists(DATA_FILE):
+        body = loads(request.body)
+        ids_to_delete = [str(i) for i in body.get("ids", [])]
+        data_file = DATA_DIR / JSON_FILE
+        if not data_file.exists():
             return JsonResponse(
-                {"error": f"Archivo no encontrado: {DATA_FILE}"}, status=500
+                {"error": f"Archivo no encontrado: {data_file}"}, status=500
             )
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        new_data = []
-        for item in data:
-            id_variants = {
-                str(item.get("id")),
-                str(item.get("numero")),
-            }
-            if ids_to_delete.isdisjoint(id_variants):
-                new_data.append(item)
-
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(new_data, f, ensure_ascii=False, indent=2)
-
-        return JsonResponse({"status": "success", "deleted": len(ids_to_delete)})
+        with commit_group(JSON_FILE, RELATIONS_FILE, comments_filename("vit")):
+            # Ids y numeros se resuelven con el índice mantenido. El mismo
+            # commit quita los enlaces de los dos lados y los comentarios.
+            index = get_index(JSON_FILE)
+            removed = delete_records(
+                JSON_FILE, index.version, index.resolve(ids_to_delete)
+            )
+            edges = get_edges()
+            removed = [render("vit", strip_match_key(r), edges) for r in removed]
+            numeros = [r.get("numero") for r in removed]
+            commit(**edges.unlinked("vit", numeros))
+            delete_comments("vit", numeros)
+        return JsonResponse(
+            {"status": "success", "deleted": len(removed), "removed": removed}
+        )
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -1,21 +1,7 @@
 # backend/core/views/VIT/duplicates.py
 from typing import List, Dict, Tuple, Any
-import unicodedata
 import math
-
-
-def _norm(s: str) -> str:
-    if s is None:
-        return ""
-    s = str(s).strip().lower()
-    s = "".join(
-        c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn"
-    )
-    return s
-
-
-def _key(item: Dict) -> Tuple[str, str]:
-    return (_norm(item.get("numero", "")), _norm(item.get("idExterno", "")))
+from core.views.common.keys import compute_match_key, match_key, strip_match_key
 
 
 def _is_nan_value(v: Any) -> bool:
@@ -79,31 +65,48 @@ def _ensure_front_fields(entry: Dict) -> Dict:
     return entry
 
 
-def build_lookup(existing_data: List[Dict]) -> Dict[Tuple[str, str], Dict]:
-    idx: Dict[Tuple[str, str], Dict] = {}
-    for it in existing_data:
-        idx[_key(it)] = it
-    return idx
-
-
-def detect_duplicates(existing_data: List[Dict], new_entries: List[Dict]):
-    by_both = {_key(r): r for r in existing_data}
-    by_idext = {
-        _norm(r.get("idExterno", "")): r for r in existing_data if r.get("idExterno")
-    }
-    by_num = {_norm(r.get("numero", "")): r for r in existing_data if r.get("numero")}
+def build_indexes(existing_data: List[Dict]) -> Tuple[Dict, Dict, Dict]:
+    """Índices de detect_duplicates; se construyen una vez por subida.
+
+    Usan la clave guardada en cada registro, sin volver a normalizar.
+    """
+    by_both: Dict[Tuple[str, str], Dict] = {}
+    by_idext: Dict[str, Dict] = {}
+    by_num: Dict[str, Dict] = {}
+    for r in existing_data:
+        key = match_key(r)
+        by_both[key] = r
+        if r.get("idExterno"):
+            by_idext[key[1]] = r
+        if r.get("numero"):
+            by_num[key[0]] = r
+    return by_both, by_idext, by_num
+
+
+def detect_duplicates(
+    existing_data: List[Dict],
+    new_entries: List[Dict],
+    indexes: Tuple[Dict, Dict, Dict] | None = None,
+    clean: bool = True,
+):
+    """`clean=False` si las entradas ya vienen saneadas por columnas.
+
+    Con `indexes` (p. ej. los de core.views.common.dup_index) no se recorre
+    `existing_data`. Las filas existentes se devuelven como copias saneadas.
+    """
+    by_both, by_idext, by_num = indexes or build_indexes(existing_data)
 
     duplicates = []
     unique_new_entries = []
 
     for entry in new_entries:
-        entry = _sanitize_any(entry)
-        entry = _sanitize_link(entry)
-        entry = _ensure_front_fields(entry)
+        if clean:
+            entry = _sanitize_any(entry)
+            entry = _sanitize_link(entry)
+            entry = _ensure_front_fields(entry)
 
-        k_both = _key(entry)
-        k_id = _norm(entry.get("idExterno", ""))
-        k_num = _norm(entry.get("numero", ""))
+        k_both = compute_match_key(entry)
+        k_num, k_id = k_both
 
         existing_row = None
         if k_both in by_both:
@@ -114,6 +117,7 @@ def detect_duplicates(existing_data: List[Dict], new_entries: List[Dict]):
             existing_row = by_num[k_num]
 
         if existing_row:
+            existing_row = strip_match_key(dict(existing_row))
             existing_row = _sanitize_any(existing_row)
             existing_row = _sanitize_link(existing_row)
             existing_row = _ensure_front_fields(existing_row)
@@ -1,11 +1,30 @@
 # core/views/VIT/list_view.py
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from core.views.common.utils import add_cors_headers, load_json_data, add_has_link
-from core.views.VIT.risk_logic import enrich_vit
+from django.views.decorators.http import condition
+from core.views.common.serialization import JsonResponse
+from core.views.common.utils import (
+    add_cors_headers,
+    load_json_data,
+    stream_json_list,
+    wants_stream,
+)
+from core.views.common.conditional import (
+    revalidate,
+    risk_data_etag,
+    risk_data_last_modified,
+)
+from core.views.common.links import get_view
+from core.views.common.relations import render
+from core.views.common.query import (
+    apply_list_params,
+    paginated_payload,
+    parse_list_params,
+)
+from core.views.VIT.risk_logic import iter_enrich_vit_linked
 
 
 @csrf_exempt
+@condition(etag_func=risk_data_etag, last_modified_func=risk_data_last_modified)
 def get_vit_risk_data(request):
     if request.method == "OPTIONS":
         return add_cors_headers(JsonResponse({"message": "Preflight OK"}))
@@ -13,14 +32,33 @@ def get_vit_risk_data(request):
         return add_cors_headers(
             JsonResponse({"error": "Método no permitido"}, status=405)
         )
+    try:
+        query = parse_list_params(request.GET)
+    except ValueError as e:
+        return add_cors_headers(JsonResponse({"error": str(e)}, status=400))
     try:
         vit_data = load_json_data("CSIRT/vit_Data.json")
-        vul_data = load_json_data("CSIRT/vul_Data.json")
+        links = get_view()
 
-        vit_data, _ = add_has_link(vit_data, vul_data)
-        vit_data = enrich_vit(vit_data, vul_data)
+        # El campo `vul` se pinta desde el conjunto de aristas.
+        if query is None:
+            rows = (render("vit", vit, links.edges) for vit in vit_data)
+        else:
+            # Filtrar/ordenar/paginar antes de enriquecer: solo se enriquece
+            # (y se serializa) la página pedida.
+            for vit in vit_data:
+                render("vit", vit, links.edges)
+                vit["hasLink"] = links.vit_has_link(vit)
+            rows, total = apply_list_params(vit_data, query)
 
-        response = JsonResponse(vit_data, safe=False)
+        enriched = iter_enrich_vit_linked(rows, links.vul_data)
+        if query is not None and query["paginate"]:
+            response = JsonResponse(paginated_payload(list(enriched), total, query))
+        elif wants_stream(request):
+            response = stream_json_list(enriched)
+        else:
+            response = JsonResponse(list(enriched), safe=False)
+        revalidate(response)
     except Exception as e:
         response = JsonResponse({"error": str(e)}, status=500)
     return add_cors_headers(response)
@@ -1,23 +1,18 @@
 # core/views/VIT/risk_logic.py
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, Iterator, Callable
 from collections import OrderedDict
-import unicodedata
-from datetime import datetime, timedelta
+from datetime import timedelta
 import math
-
-
-def _norm(s: str) -> str:
-    if s is None:
-        return ""
-    s = str(s).strip().lower()
-    s = "".join(
-        c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn"
-    )
-    return s
-
-
-def _key(item: Dict) -> Tuple[str, str]:
-    return (_norm(item.get("numero", "")), _norm(item.get("idExterno", "")))
+from core.views.common.dates import parse_date
+from core.views.common.dup_index import DuplicateIndex
+from core.views.common.frames import HORIZON_BY_PRIORITY
+from core.views.common.keys import (
+    compute_match_key,
+    match_key,
+    norm,
+    stamp,
+    strip_match_key,
+)
 
 
 def _collect_used_ids(rows: List[Dict]) -> Tuple[set, int]:
@@ -31,52 +26,11 @@ def _collect_used_ids(rows: List[Dict]) -> Tuple[set, int]:
     return used, next_id
 
 
-_HORIZON_BY_PRIORITY = {
-    "critico": 30,
-    "crítico": 30,
-    "critical": 30,
-    "alto": 90,
-    "alta": 90,
-    "high": 90,
-    "medio": 365,
-    "media": 365,
-    "medium": 365,
-    "bajo": 365,
-    "baja": 365,
-    "low": 365,
-}
-
-
-def _parse_date_loose(s: str | None) -> datetime | None:
-    if not s:
-        return None
-    s = str(s).strip()
-    formats = [
-        "%Y-%m-%d",
-        "%Y/%m/%d",
-        "%d/%m/%Y",
-        "%d-%m-%Y",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y/%m/%d %H:%M:%S",
-        "%Y-%m-%dT%H:%M:%S",
-        "%Y-%m-%dT%H:%M:%S.%f",
-    ]
-    for fmt in formats:
-        try:
-            return datetime.strptime(s, fmt)
-        except Exception:
-            pass
-    try:
-        return datetime.fromisoformat(s)
-    except Exception:
-        return None
-
-
 def calculate_due_date(creado: str | None, prioridad: str | None) -> str | None:
-    base = _parse_date_loose(creado)
+    base = parse_date(creado)
     if not base:
         return None
-    horizon = _HORIZON_BY_PRIORITY.get(_norm(prioridad or ""), 365)
+    horizon = HORIZON_BY_PRIORITY.get(norm(prioridad or ""), 365)
     return (base + timedelta(days=horizon)).strftime("%Y-%m-%d")
 
 
@@ -162,126 +116,148 @@ def _sanitize_link(entry: Dict) -> Dict:
     return entry
 
 
+def _new_record(entry: Dict, new_id: int) -> Dict:
+    od = OrderedDict()
+    od["id"] = new_id
+    for k, v in entry.items():
+        if k != "id":
+            od[k] = v
+    od = _sanitize_any(od)
+    od = _ensure_closed_fields(od)
+    od = _sanitize_link(od)
+    stamp(od)
+    return od
+
+
+def _prepare_new(entry: Dict) -> Dict:
+    entry = _sanitize_any(entry)
+    entry = _ensure_due(entry)
+    entry = _ensure_closed_fields(entry)
+    return _sanitize_link(entry)
+
+
 def assign_ids_and_merge(
     existing_data: List[Dict], unique_new_entries: List[Dict]
 ) -> List[Dict]:
     merged = list(existing_data)
     used_ids, next_id = _collect_used_ids(existing_data)
     for entry in unique_new_entries:
-        entry = _sanitize_any(entry)
-        entry = _ensure_due(entry)
-        entry = _ensure_closed_fields(entry)
-        entry = _sanitize_link(entry)
+        entry = _prepare_new(entry)
         while next_id in used_ids:
             next_id += 1
-        od = OrderedDict()
-        od["id"] = next_id
         used_ids.add(next_id)
+        merged.append(_new_record(entry, next_id))
         next_id += 1
-        for k, v in entry.items():
-            if k != "id":
-                od[k] = v
-        od = _sanitize_any(od)
-        od = _ensure_closed_fields(od)
-        od = _sanitize_link(od)
-        merged.append(od)
     return merged
 
 
-def update_selected_entries(
-    existing_data: List[Dict],
-    selected_entries: List[Dict],
-    lookup: Dict[Tuple[str, str], Dict],
-) -> List[Dict]:
-    by_both = {_key(r): r for r in existing_data}
-    by_idext = {
-        _norm(r.get("idExterno", "")): r for r in existing_data if r.get("idExterno")
-    }
-    by_num = {_norm(r.get("numero", "")): r for r in existing_data if r.get("numero")}
-    used_ids, next_id = _collect_used_ids(existing_data)
-    updated_rows: List[Dict] = []
-    keys_to_remove = set()
+def new_records(index: DuplicateIndex, unique_new_entries: List[Dict]) -> List[Dict]:
+    """Las entradas de `unique_new_entries` como registros para añadir al
+    final, con ids nuevos tomados del índice mantenido (los mismos que daría
+    assign_ids_and_merge, sin recorrer el dataset)."""
+    used_ids, top_id = index.ids()
+    next_id = top_id + 1
+    out = []
+    for entry in unique_new_entries:
+        entry = _prepare_new(entry)
+        while str(next_id) in used_ids:
+            next_id += 1
+        out.append(_new_record(entry, next_id))
+        next_id += 1
+    return out
+
+
+def plan_selected_entries(
+    index: DuplicateIndex, selected_entries: List[Dict]
+) -> List[Tuple[int | None, Dict]]:
+    """Plan de upsert de save-selection: [(posición a sustituir o None, registro)].
+
+    Empareja como la detección de duplicados (numero+idExterno, idExterno,
+    numero) sobre el índice mantenido, así que no recorre el dataset. El
+    registro sustituido conserva su id y su posición.
+    """
+    rows = index.rows
+    used_ids, top_id = index.ids()
+    allocated = set()
+    next_id = top_id + 1
+    plan: List[Tuple[int | None, Dict]] = []
     for entry in selected_entries:
         entry = _sanitize_any(entry)
         entry = _ensure_due(entry)
         entry = _ensure_closed_fields(entry)
         entry = _sanitize_link(entry)
-        k_both = _key(entry)
-        k_id = _norm(entry.get("idExterno", ""))
-        k_num = _norm(entry.get("numero", ""))
-        chosen = None
-        if k_both in by_both:
-            chosen = by_both[k_both]
-        elif k_id and k_id in by_idext:
-            chosen = by_idext[k_id]
-        elif k_num and k_num in by_num:
-            chosen = by_num[k_num]
+        k_both = compute_match_key(entry)
+        k_num, k_id = k_both
+        pos = None
+        if k_both in index.both:
+            pos = index.both[k_both]
+        elif k_id and k_id in index.idext:
+            pos = index.idext[k_id]
+        elif k_num and k_num in index.num:
+            pos = index.num[k_num]
+        chosen = rows[pos] if pos is not None else None
         od = OrderedDict()
         if chosen and chosen.get("id") is not None:
             try:
                 od["id"] = int(chosen["id"])
             except Exception:
                 od["id"] = chosen["id"]
-            keys_to_remove.add(_key(chosen))
         else:
-            while next_id in used_ids:
+            while str(next_id) in used_ids or next_id in allocated:
                 next_id += 1
             od["id"] = next_id
-            used_ids.add(next_id)
+            allocated.add(next_id)
             next_id += 1
+            # Sin id solo se sustituye el registro con la misma clave completa.
+            if chosen is None or match_key(chosen) != k_both:
+                pos = None
         for field, val in entry.items():
             if field != "id":
                 od[field] = val
         od = _sanitize_any(od)
         od = _ensure_closed_fields(od)
         od = _sanitize_link(od)
-        updated_rows.append(od)
-        keys_to_remove.add(k_both)
-    final_data = [row for row in existing_data if _key(row) not in keys_to_remove]
-    final_data.extend(updated_rows)
-    return final_data
-
-
-def enrich_vit(vit_list: List[Dict], vul_list: List[Dict]) -> List[Dict]:
-    vul_map = {
-        str(v.get("numero", ""))
-        .strip()
-        .lower(): _ensure_closed_fields(_sanitize_any(dict(v)))
-        for v in vul_list
-    }
+        stamp(od)
+        plan.append((pos, od))
+    return plan
+
+
+def link_payload(vul: Dict) -> Dict:
+    """Copia saneada de un VUL tal y como se incrusta en `vulData`."""
+    return _ensure_closed_fields(_sanitize_any(strip_match_key(dict(vul))))
+
+
+def _enrich_one(vit: Dict, vul_lookup: Callable[[str], Dict | None]) -> Dict:
+    vit = strip_match_key(vit)
+    vit = _sanitize_any(vit)
+    vit = _ensure_closed_fields(vit)
+    vit = _sanitize_link(vit)
+    vul_obj = vul_lookup(str(vit.get("vul", "")).strip().lower())
+    if vul_obj is not None:
+        vit["vulData"] = vul_obj
+        vit["hasLink"] = True
+    else:
+        vit["vulData"] = None
+        vit["hasLink"] = False
+    return vit
+
+
+def iter_enrich_vit_linked(
+    vit_list: List[Dict], vul_lookup: Callable[[str], Dict | None]
+) -> Iterator[Dict]:
+    """Enriquece cada VIT con vulData resuelto por `vul_lookup(clave VUL)`
+    desde una vista ya materializada (ver core.views.common.links)."""
     for vit in vit_list:
-        vit = _sanitize_any(vit)
-        vit = _ensure_closed_fields(vit)
-        vit = _sanitize_link(vit)
-        vul_id = str(vit.get("vul", "")).strip().lower()
-        if vul_id in vul_map:
-            vit["vulData"] = vul_map[vul_id]
-            vit["hasLink"] = True
-            vul_obj = vul_map[vul_id]
-            current_vits = str(vul_obj.get("vits", "")).strip()
-            vit_num = str(vit.get("numero", "")).strip()
-            if vit_num and vit_num not in current_vits.split(","):
-                new_vits = (
-                    ((current_vits + "," + vit_num).strip(","))
-                    if current_vits
-                    else vit_num
-                )
-                vul_obj["vits"] = new_vits
-        else:
-            vit["vulData"] = None
-            vit["hasLink"] = False
-    return vit_list
+        yield _enrich_one(vit, vul_lookup)
 
 
 def sanitize_duplicate_pairs(pairs: List[Dict[str, Dict]]) -> List[Dict[str, Dict]]:
     sanitized: List[Dict[str, Dict]] = []
     for p in pairs:
-        existing = _ensure_closed_fields(
-            _sanitize_link(_sanitize_any(dict(p.get("existing", {}))))
-        )
-        incoming = _ensure_closed_fields(
-            _sanitize_link(_sanitize_any(dict(p.get("incoming", {}))))
-        )
+        existing = strip_match_key(dict(p.get("existing", {})))
+        existing = _ensure_closed_fields(_sanitize_link(_sanitize_any(existing)))
+        incoming = strip_match_key(dict(p.get("incoming", {})))
+        incoming = _ensure_closed_fields(_sanitize_link(_sanitize_any(incoming)))
         sanitized.append({"existing": existing, "incoming": incoming})
     return sanitized
 
@@ -297,7 +273,7 @@ def sanitize_upload_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
     if isinstance(news, list):
         cleaned_news: List[Dict[str, Any]] = []
         for e in news:
-            e = _sanitize_any(dict(e))
+            e = _sanitize_any(strip_match_key(dict(e)))
             e = _ensure_closed_fields(e)
             e = _sanitize_link(e)
             cleaned_news.append(e)
@@ -1,44 +1,195 @@
 # backend/core/views/VIT/upload.py
-import json
-import os
-from pathlib import Path
-from tempfile import NamedTemporaryFile
+from typing import Dict, Tuple
 import pandas as pd
-from django.apps import apps
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from core.views.common.dates import parse_date_series
+from core.views.common import jobs, staging, upload_cache
+from core.views.common.dup_index import get_index
+from core.views.common.frames import (
+    clean_frame,
+    due_dates,
+    horizon_days,
+)
+from core.views.common.ingest import iter_upload_frames
+from core.views.common.links import LinkView, get_view
+from core.views.common.relations import (
+    RELATIONS_FILE,
+    commit,
+    join_vits,
+    render,
+    take_links,
+)
+from core.views.common.serialization import JsonResponse
+from core.views.common.store import commit_group, upsert_records
 from core.views.common.utils import add_cors_headers
 from core.views.VIT.normalize import normalize_headers
 from core.views.VIT.duplicates import detect_duplicates
-from core.views.VIT.risk_logic import assign_ids_and_merge, calculate_due_date
+from core.views.VIT.risk_logic import new_records
 from datetime import datetime
 
-CORE_DIR = Path(apps.get_app_config("core").path)
-DATA_DIR = CORE_DIR / "data"
-DATA_DIR.mkdir(exist_ok=True)
-
-JSON_PATH = DATA_DIR / "CSIRT" / "vit_Data.json"
-VUL_JSON_PATH = DATA_DIR / "CSIRT" / "vul_Data.json"
+JSON_FILE = "CSIRT/vit_Data.json"
+VUL_JSON_FILE = "CSIRT/vul_Data.json"
 
 _REQUIRED_CANON_MIN = {"numero", "prioridad", "estado"}
 
 
-def _ensure_front_fields(e: dict) -> dict:
-    if "closedDate" not in e or e.get("closedDate") is None:
-        e["closedDate"] = ""
-    if "closedDelayDays" not in e or e.get("closedDelayDays") is None:
-        e["closedDelayDays"] = ""
-    if "overdue" not in e:
-        e["overdue"] = False
-    if not e.get("dueDate"):
-        e["dueDate"] = calculate_due_date(
-            e.get("creado"), e.get("prioridad")
-        ) or datetime.now().strftime("%Y-%m-%d")
-    return e
+def _prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Saneado y campos de front por columnas, antes de pasar a registros.
+
+    Deja cada fila como la dejaban _sanitize_any, _sanitize_link y
+    _ensure_front_fields, y calcula dueDate (creado + horizonte de la
+    prioridad, o hoy si creado no es una fecha) donde venga vacío.
+    """
+    out = clean_frame(df)
+    due = out["dueDate"].astype(str)
+    missing = due.eq("")
+    if missing.any():
+        base = parse_date_series(out.loc[missing, "creado"])
+        days = horizon_days(out.loc[missing, "prioridad"], normalize_accents=True)
+        computed = due_dates(base, days)
+        today = datetime.now().strftime("%Y-%m-%d")
+        due[missing] = computed.where(computed.ne(""), today)
+    out["dueDate"] = due
+    out["closedDate"] = out["closedDate"].astype(str)
+    out["closedDelayDays"] = out["closedDelayDays"].astype(str)
+    overdue = out["overdue"]
+    if not pd.api.types.is_bool_dtype(overdue):
+        out["overdue"] = overdue.where(overdue.map(type).eq(bool), False).astype(bool)
+    out["vul"] = out["vul"].astype(str)
+    if "hasLink" not in out.columns:
+        out["hasLink"] = False
+    return out
+
+
+def _detect_relations(entries: list, links: LinkView) -> list:
+    relations = []
+    for vit in entries:
+        vul_num = str(vit.get("vul", "")).strip()
+        vit_num = str(vit.get("numero", "")).strip()
+        if not vul_num or not vit_num:
+            continue
+        # VULs existentes que todavía no listan este VIT.
+        if not links.has_vul(vul_num) or links.edges.has_vit(vul_num, vit_num):
+            continue
+        before = links.edges.vits_text(vul_num)
+        relations.append(
+            {
+                "vulNumero": vul_num,
+                "vitNumero": vit_num,
+                "before": before,
+                "after": join_vits([before, vit_num]) if before else vit_num,
+            }
+        )
+    return relations
+
+
+def _no_progress(stage: str, rows: int | None = None) -> None:
+    pass
+
+
+def run_upload(upload, progress=_no_progress) -> Tuple[Dict, int]:
+    """Procesa un fichero subido; devuelve (payload, status HTTP).
+
+    `progress(stage, rows)` recibe la etapa ("parsing", "comparing",
+    "merging") y las filas procesadas hasta el momento; lo usan los trabajos
+    en segundo plano.
+    """
+    # Índice persistente: no se recorre el histórico en cada subida.
+    indexes = get_index(JSON_FILE).lookups()
+
+    links = get_view()
+
+    duplicates = []
+    unique_new_entries = []
+    relations = []
+
+    def compare(new_entries: list) -> None:
+        dups, uniques = detect_duplicates([], new_entries, indexes, clean=False)
+        for pair in dups:
+            render("vit", pair["existing"], links.edges)
+        duplicates.extend(dups)
+        unique_new_entries.extend(uniques)
+        relations.extend(_detect_relations(uniques, links))
+
+    # Mismo fichero ya procesado: se salta la lectura y la normalización.
+    cache_key = upload_cache.content_key("vit", upload)
+    cached = upload_cache.get(cache_key)
+    rows = 0
+    if cached is not None:
+        progress("comparing", rows)
+        for new_entries in cached:
+            compare(new_entries)
+            rows += len(new_entries)
+            progress("comparing", rows)
+    else:
+        # Cada bloque se compara en cuanto se lee y se descarta: de la subida
+        # solo sobreviven las entradas nuevas, nunca el DataFrame ni el bloque.
+        # La copia para la cache se abandona si pasa de UPLOAD_CACHE_ROWS.
+        keep = []
+        got = None
+        progress("parsing", rows)
+        for df in iter_upload_frames(upload):
+            df = normalize_headers(df)
+            if got is None:
+                got = set(map(str, df.columns))
+                if _REQUIRED_CANON_MIN - got:
+                    break
+            new_entries = _prepare_frame(df).to_dict(orient="records")
+            del df
+            rows += len(new_entries)
+            if keep is not None and rows <= upload_cache.UPLOAD_CACHE_ROWS:
+                keep.append([dict(r) for r in new_entries])
+            else:
+                keep = None
+            compare(new_entries)
+            progress("comparing", rows)
+
+        missing = sorted(list(_REQUIRED_CANON_MIN - (got or set())))
+        if missing:
+            return {
+                "error": "Normalized columns missing",
+                "missing": missing,
+                "got": sorted(list(got or set())),
+            }, 400
+        if keep is not None:
+            upload_cache.put(cache_key, keep)
+
+    if duplicates or relations:
+        # Las entradas nuevas se quedan en el servidor: el cliente resuelve
+        # con el token y solo recibe lo que tiene que mostrar.
+        token = staging.stage("vit", unique_new_entries, duplicates, relations)
+        return {
+            "message": "Pending resolution",
+            "token": token,
+            "newCount": len(unique_new_entries),
+            "duplicates": duplicates,
+            "relations": relations,
+        }, 200
+
+    progress("merging", rows)
+    # Bajo el cerrojo: otro worker puede haber guardado desde la detección de
+    # duplicados y los ids deben seguir siendo únicos. Los ids salen del
+    # índice mantenido y las altas van al final en una línea del diario, así
+    # que el coste no depende del histórico. Registros y enlaces se publican
+    # juntos en un único commit.
+    with commit_group(JSON_FILE, RELATIONS_FILE):
+        index = get_index(JSON_FILE)
+        added = new_records(index, unique_new_entries)
+        # Los enlaces van al conjunto de aristas, no a los registros.
+        vit_links = take_links("vit", added)
+        upsert_records(JSON_FILE, index.version, [(None, r) for r in added])
+        commit(vit=vit_links)
+    return {
+        "message": "Data added successfully",
+        "new": [],
+        "duplicates": [],
+        "relations": [],
+    }, 200
 
 
 @csrf_exempt
 def upload_data(request):
+    """Síncrono por defecto; con ?async=1 encola un trabajo y responde 202."""
     if request.method == "OPTIONS":
         return add_cors_headers(JsonResponse({"message": "Preflight OK"}))
     if request.method != "POST":
@@ -48,91 +199,19 @@ def upload_data(request):
     try:
         if "file" not in request.FILES:
             raise ValueError("No file was uploaded.")
-        excel_file = request.FILES["file"]
-        df = pd.read_excel(excel_file, engine="openpyxl")
-        df = normalize_headers(df)
-
-        got = set(map(str, df.columns))
-        missing = sorted(list(_REQUIRED_CANON_MIN - got))
-        if missing:
-            return add_cors_headers(
-                JsonResponse(
-                    {
-                        "error": "Normalized columns missing",
-                        "missing": missing,
-                        "got": sorted(list(got)),
-                    },
-                    status=400,
-                )
-            )
-
-        new_entries = df.to_dict(orient="records")
-        new_entries = [_ensure_front_fields(dict(e)) for e in new_entries]
-
-        if JSON_PATH.exists():
-            with JSON_PATH.open("r", encoding="utf-8") as f:
-                existing_data = json.load(f)
+        upload = request.FILES["file"]
+        if jobs.wants_async(request):
+            job = jobs.submit("vit", upload, run_upload)
+            job["statusUrl"] = f"/vit/upload/jobs/{job['jobId']}/"
+            response = JsonResponse(job, status=202)
         else:
-            existing_data = []
-        if not isinstance(existing_data, list):
-            existing_data = [existing_data]
-
-        duplicates, unique_new_entries = detect_duplicates(existing_data, new_entries)
-
-        if VUL_JSON_PATH.exists():
-            with VUL_JSON_PATH.open("r", encoding="utf-8") as f:
-                vul_data = json.load(f)
-        else:
-            vul_data = []
-        if not isinstance(vul_data, list):
-            vul_data = [vul_data]
-
-        relations = []
-        vul_map = {str(v.get("numero", "")).strip(): v for v in vul_data}
-        for vit in unique_new_entries:
-            vul_num = str(vit.get("vul", "")).strip()
-            vit_num = str(vit.get("numero", "")).strip()
-            if vul_num and vul_num in vul_map and vit_num:
-                vul_obj = vul_map[vul_num]
-                before_vits = str(vul_obj.get("vits", "")).strip()
-                after_vits = (
-                    (before_vits + "," + vit_num).strip(",") if before_vits else vit_num
-                )
-                before_list = [s.strip() for s in before_vits.split(",") if s.strip()]
-                if vit_num not in before_list:
-                    relations.append(
-                        {
-                            "vulNumero": vul_num,
-                            "vitNumero": vit_num,
-                            "before": before_vits,
-                            "after": after_vits,
-                        }
-                    )
-
-        if not duplicates and not relations:
-            updated_data = assign_ids_and_merge(existing_data, unique_new_entries)
-            JSON_PATH.parent.mkdir(parents=True, exist_ok=True)
-            with NamedTemporaryFile("w", delete=False, encoding="utf-8") as tmp:
-                json.dump(updated_data, tmp, ensure_ascii=False, indent=2)
-                tmp_name = tmp.name
-            os.replace(tmp_name, JSON_PATH)
-            response = JsonResponse(
-                {
-                    "message": "Data added successfully",
-                    "new": [],
-                    "duplicates": [],
-                    "relations": [],
-                }
-            )
-        else:
-            response = JsonResponse(
-                {
-                    "message": "Pending resolution",
-                    "new": unique_new_entries,
-                    "duplicates": duplicates,
-                    "relations": relations,
-                }
-            )
+            payload, status = run_upload(upload)
+            response = JsonResponse(payload, status=status)
     except Exception as e:
         response = JsonResponse({"error": str(e)}, status=400)
     return add_cors_headers(response)
+
+
+@csrf_exempt
+def upload_job_status(request, job_id):
+    return add_cors_headers(jobs.job_status_response(request, "vit", job_id))
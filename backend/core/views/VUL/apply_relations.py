@@ -1,20 +1,13 @@
 # core/views/VUL/apply_relations.py
-import json
-import os
-from pathlib import Path
-from tempfile import NamedTemporaryFile
-from django.apps import apps
-from django.http import JsonResponse
+from typing import Dict, List, Tuple
 from django.views.decorators.csrf import csrf_exempt
+from core.views.common import staging
+from core.views.common.links import get_view
+from core.views.common.relations import RELATIONS_FILE, commit, key
+from core.views.common.serialization import JsonResponse, loads
+from core.views.common.store import commit_group
 from core.views.common.utils import add_cors_headers
 
-CORE_DIR = Path(apps.get_app_config("core").path)
-DATA_DIR = CORE_DIR / "data"
-DATA_DIR.mkdir(exist_ok=True)
-
-VUL_JSON_PATH = DATA_DIR / "CSIRT" / "vul_Data.json"
-VIT_JSON_PATH = DATA_DIR / "CSIRT" / "vit_Data.json"
-
 
 @csrf_exempt
 def apply_relations_vul(request):
@@ -27,58 +20,46 @@ def apply_relations_vul(request):
         )
 
     try:
-        body = json.loads(request.body.decode("utf-8"))
-        relations = body.get("relations", [])
+        body = loads(request.body)
+        token = body.get("token")
+        if token:
+            staged = staging.load_staged("vul", token)
+            relations = staging.selected_relations(staged, body.get("apply"))
+        else:
+            relations = body.get("relations", [])
 
         if not isinstance(relations, list) or not relations:
             raise ValueError("No relations provided.")
 
-        vul_data = []
-        vit_data = []
-
-        if VUL_JSON_PATH.exists():
-            with VUL_JSON_PATH.open("r", encoding="utf-8") as f:
-                vul_data = json.load(f)
-        if VIT_JSON_PATH.exists():
-            with VIT_JSON_PATH.open("r", encoding="utf-8") as f:
-                vit_data = json.load(f)
-
-        if not isinstance(vul_data, list):
-            vul_data = [vul_data]
-        if not isinstance(vit_data, list):
-            vit_data = [vit_data]
-
-        vul_map = {str(v.get("numero", "")).strip(): v for v in vul_data}
-        vit_map = {str(v.get("numero", "")).strip(): v for v in vit_data}
-
-        for rel in relations:
-            vul_num = str(rel.get("vulNumero", "")).strip()
-            vit_num = str(rel.get("vitNumero", "")).strip()
-
-            if vul_num in vul_map:
-                vul_obj = vul_map[vul_num]
-                current_vits = str(vul_obj.get("vits", "")).strip()
-                current_list = [s.strip() for s in current_vits.split(",") if s.strip()]
-                if vit_num not in current_list:
-                    current_list.append(vit_num)
-                    vul_obj["vits"] = ",".join(current_list)
-
-            if vit_num in vit_map:
-                vit_obj = vit_map[vit_num]
-                current_vul = str(vit_obj.get("vul", "")).strip()
-                if vul_num and vul_num != current_vul:
-                    vit_obj["vul"] = vul_num
-
-        VUL_JSON_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with NamedTemporaryFile("w", delete=False, encoding="utf-8") as tmp_vul:
-            json.dump(list(vul_map.values()), tmp_vul, ensure_ascii=False, indent=2)
-            tmp_vul_name = tmp_vul.name
-        os.replace(tmp_vul_name, VUL_JSON_PATH)
-
-        with NamedTemporaryFile("w", delete=False, encoding="utf-8") as tmp_vit:
-            json.dump(list(vit_map.values()), tmp_vit, ensure_ascii=False, indent=2)
-            tmp_vit_name = tmp_vit.name
-        os.replace(tmp_vit_name, VIT_JSON_PATH)
+        with commit_group(RELATIONS_FILE):
+            # Cada comprobación es una búsqueda en el conjunto de aristas y
+            # solo se escriben las declaraciones que cambian, en un commit.
+            links = get_view()
+            edges = links.edges
+            vul_links: Dict[str, Tuple[str, List[str]]] = {}
+            vit_links: Dict[str, str] = {}
+
+            for rel in relations:
+                vul_num = str(rel.get("vulNumero", "")).strip()
+                vit_num = str(rel.get("vitNumero", "")).strip()
+
+                if (
+                    vit_num
+                    and links.has_vul(vul_num)
+                    and not edges.has_vit(vul_num, vit_num)
+                ):
+                    vul_links.setdefault(
+                        key(vul_num), (vul_num, edges.vits_of(vul_num))
+                    )[1].append(vit_num)
+
+                if vul_num and links.has_vit(vit_num):
+                    if vul_num != edges.vul_of(vit_num):
+                        vit_links[vit_num] = vul_num
+
+            commit(vit=vit_links, vul=dict(vul_links.values()))
+
+        if token:
+            staging.discard(token)
 
         response = JsonResponse({"message": "Relations applied successfully."})
 
@@ -1,21 +1,31 @@
-import json
 from json import JSONDecodeError
 
-from django.http import JsonResponse, HttpRequest
+from django.http import HttpRequest
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 
 from core.views.common.comments import get_comments_for, append_comment
+from core.views.common.serialization import JsonResponse, loads
+from core.views.common.conditional import (
+    comments_etag,
+    comments_last_modified_func,
+    revalidate,
+)
 
 
 @csrf_exempt
+@condition(
+    etag_func=comments_etag("vul"),
+    last_modified_func=comments_last_modified_func("vul"),
+)
 def vul_comments_view(request: HttpRequest, numero: str):
     if request.method == "GET":
         comments = get_comments_for("vul", numero)
-        return JsonResponse(comments, safe=False)
+        return revalidate(JsonResponse(comments, safe=False))
 
     if request.method == "POST":
         try:
-            payload = json.loads(request.body.decode("utf-8") or "{}")
+            payload = loads(request.body or b"{}")
         except JSONDecodeError:
             return JsonResponse({"error": "Invalid JSON body"}, status=400)
 
@@ -1,17 +1,7 @@
 # backend/core/views/VUL/duplicates.py
 from typing import List, Dict, Tuple, Any
-import unicodedata
 import math
-
-
-def _norm(s: str) -> str:
-    if s is None:
-        return ""
-    s = str(s).strip().lower()
-    s = "".join(
-        c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn"
-    )
-    return s
+from core.views.common.keys import match_key, norm, strip_match_key
 
 
 def _is_nan_value(v: Any) -> bool:
@@ -72,22 +62,41 @@ def _ensure_front_fields(entry: Dict) -> Dict:
     return entry
 
 
-def detect_duplicates(existing_data: List[Dict], new_entries: List[Dict]):
-    by_num = {_norm(r.get("numero", "")): r for r in existing_data if r.get("numero")}
+def build_index(existing_data: List[Dict]) -> Dict[str, Dict]:
+    """Índice de detect_duplicates; se construye una vez por subida con la
+    clave guardada en cada registro."""
+    return {match_key(r)[0]: r for r in existing_data if r.get("numero")}
+
+
+def detect_duplicates(
+    existing_data: List[Dict],
+    new_entries: List[Dict],
+    by_num: Dict[str, Dict] | None = None,
+    clean: bool = True,
+):
+    """`clean=False` si las entradas ya vienen saneadas por columnas.
+
+    Con `by_num` (p. ej. el de core.views.common.dup_index) no se recorre
+    `existing_data`. Las filas existentes se devuelven como copias saneadas.
+    """
+    if by_num is None:
+        by_num = build_index(existing_data)
 
     duplicates = []
     unique_new_entries = []
 
     for entry in new_entries:
-        entry = _sanitize_any(entry)
-        entry = _sanitize_link(entry)
-        entry = _ensure_front_fields(entry)
+        if clean:
+            entry = _sanitize_any(entry)
+            entry = _sanitize_link(entry)
+            entry = _ensure_front_fields(entry)
 
-        k_num = _norm(entry.get("numero", ""))
+        k_num = norm(entry.get("numero", ""))
 
         existing_row = by_num.get(k_num) if k_num else None
 
         if existing_row:
+            existing_row = strip_match_key(dict(existing_row))
             existing_row = _sanitize_any(existing_row)
             existing_row = _sanitize_link(existing_row)
             existing_row = _ensure_front_fields(existing_row)
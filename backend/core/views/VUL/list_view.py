@@ -1,11 +1,30 @@
 # core/views/VUL/list_view.py
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from core.views.common.utils import add_cors_headers, load_json_data
-from core.views.VUL.risk_logic import enrich_vul, sanitize_upload_payload
+from django.views.decorators.http import condition
+from core.views.common.serialization import JsonResponse
+from core.views.common.utils import (
+    add_cors_headers,
+    load_json_data,
+    stream_json_list,
+    wants_stream,
+)
+from core.views.common.conditional import (
+    revalidate,
+    risk_data_etag,
+    risk_data_last_modified,
+)
+from core.views.common.links import get_view
+from core.views.common.relations import render
+from core.views.common.query import (
+    apply_list_params,
+    paginated_payload,
+    parse_list_params,
+)
+from core.views.VUL.risk_logic import iter_enrich_vul_linked, sanitize_upload_payload
 
 
 @csrf_exempt
+@condition(etag_func=risk_data_etag, last_modified_func=risk_data_last_modified)
 def get_vul_risk_data(request):
     if request.method == "OPTIONS":
         return add_cors_headers(JsonResponse({"message": "Preflight OK"}))
@@ -14,13 +33,35 @@ def get_vul_risk_data(request):
             JsonResponse({"error": "Método no permitido"}, status=405)
         )
     try:
-        vit_data = load_json_data("CSIRT/vit_Data.json")
+        query = parse_list_params(request.GET)
+    except ValueError as e:
+        return add_cors_headers(JsonResponse({"error": str(e)}, status=400))
+    try:
         vul_data = load_json_data("CSIRT/vul_Data.json")
+        links = get_view()
 
-        vul_data = enrich_vul(vul_data, vit_data)
-        vul_data = [sanitize_upload_payload(e) for e in vul_data]
+        # El campo `vits` se pinta desde el conjunto de aristas.
+        if query is None:
+            rows = (render("vul", vul, links.edges) for vul in vul_data)
+        else:
+            # Filtrar/ordenar/paginar antes de enriquecer: solo se enriquece
+            # (y se serializa) la página pedida.
+            for vul in vul_data:
+                render("vul", vul, links.edges)
+                vul["hasLink"] = links.vul_has_link(vul)
+            rows, total = apply_list_params(vul_data, query)
 
-        response = JsonResponse(vul_data, safe=False)
+        enriched = (
+            sanitize_upload_payload(e)
+            for e in iter_enrich_vul_linked(rows, links.vits_data)
+        )
+        if query is not None and query["paginate"]:
+            response = JsonResponse(paginated_payload(list(enriched), total, query))
+        elif wants_stream(request):
+            response = stream_json_list(enriched)
+        else:
+            response = JsonResponse(list(enriched), safe=False)
+        revalidate(response)
     except Exception as e:
         response = JsonResponse({"error": str(e)}, status=500)
     return add_cors_headers(response)
@@ -1,8 +1,11 @@
 # core/views/VUL/risk_logic.py
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, Iterator, Callable
 from collections import OrderedDict
-from datetime import datetime, timedelta
+from datetime import timedelta
 import math
+from core.views.common.dates import parse_date
+from core.views.common.dup_index import DuplicateIndex
+from core.views.common.keys import norm, stamp, strip_match_key
 
 _HORIZON_BY_SEVERITY = {
     "critical": 30,
@@ -19,37 +22,9 @@ _HORIZON_BY_SEVERITY = {
     "baja": 365,
 }
 
-_DATE_INPUT_CANDIDATES = [
-    "%Y-%m-%d",
-    "%Y/%m/%d",
-    "%d/%m/%Y",
-    "%d-%m-%Y",
-    "%Y-%m-%d %H:%M:%S",
-    "%Y/%m/%d %H:%M:%S",
-    "%Y-%m-%dT%H:%M:%S",
-    "%Y-%m-%dT%H:%M:%S.%f",
-]
-
-
-def _parse_date_loose(s: Any) -> datetime | None:
-    if s is None:
-        return None
-    t = str(s).strip()
-    if not t or t.lower() in ("nan", "nat", "none", "null"):
-        return None
-    for fmt in _DATE_INPUT_CANDIDATES:
-        try:
-            return datetime.strptime(t, fmt)
-        except Exception:
-            pass
-    try:
-        return datetime.fromisoformat(t)
-    except Exception:
-        return None
-
 
 def calculate_due_date_vul(actualizado: Any, prioridad: Any) -> str | None:
-    base = _parse_date_loose(actualizado)
+    base = parse_date(actualizado)
     if not base:
         return None
     sev = str(prioridad).strip().lower() if prioridad is not None else ""
@@ -154,59 +129,83 @@ def _collect_used_ids(rows: List[Dict]) -> Tuple[set, int]:
     return used, next_id
 
 
-def assign_ids_and_merge_vul(
-    existing_data: List[Dict], unique_new_entries: List[Dict]
-) -> List[Dict]:
-    merged = list(existing_data)
-    used_ids, next_id = _collect_used_ids(existing_data)
-    for entry in unique_new_entries:
-        entry = _sanitize_any(entry)
-        entry = ensure_due_vul(entry)
-        entry = _ensure_closed_fields(entry)
-        entry = _sanitize_link(entry)
+def _new_record(entry: Dict, new_id: int) -> Dict:
+    od = OrderedDict()
+    od["id"] = new_id
+    for k, v in entry.items():
+        if k != "id":
+            od[k] = v
+    od = _sanitize_any(od)
+    od = _ensure_closed_fields(od)
+    od = _sanitize_link(od)
+    stamp(od)
+    return od
+
+
+def _prepare_new(entry: Dict) -> Dict:
+    entry = _sanitize_any(entry)
+    entry = ensure_due_vul(entry)
+    entry = _ensure_closed_fields(entry)
+    return _sanitize_link(entry)
+
+
+def _allocate(entries: List[Dict], used_ids: set, next_id: int) -> List[Dict]:
+    out = []
+    for entry in entries:
+        entry = _prepare_new(entry)
         while str(next_id) in used_ids:
             next_id += 1
-        od = OrderedDict()
-        od["id"] = next_id
         used_ids.add(str(next_id))
+        out.append(_new_record(entry, next_id))
         next_id += 1
-        for k, v in entry.items():
-            if k != "id":
-                od[k] = v
-        od = _sanitize_any(od)
-        od = _ensure_closed_fields(od)
-        od = _sanitize_link(od)
-        merged.append(od)
-    return merged
+    return out
 
 
-def update_selected_entries_vul(
-    existing_data: List[Dict], selected_entries: List[Dict]
+def assign_ids_and_merge_vul(
+    existing_data: List[Dict], unique_new_entries: List[Dict]
 ) -> List[Dict]:
-    by_num = {
-        str(r.get("numero", "")).strip().lower(): r
-        for r in existing_data
-        if r.get("numero")
-    }
     used_ids, next_id = _collect_used_ids(existing_data)
-    updated_rows: List[Dict] = []
-    keys_to_remove = set()
+    return list(existing_data) + _allocate(unique_new_entries, used_ids, next_id)
+
+
+def new_records_vul(
+    index: DuplicateIndex, unique_new_entries: List[Dict]
+) -> List[Dict]:
+    """Las entradas de `unique_new_entries` como registros para añadir al
+    final, con ids libres según el índice mantenido (mismo criterio que
+    assign_ids_and_merge_vul, sin recorrer el dataset)."""
+    used_ids, _ = index.ids()
+    return _allocate(unique_new_entries, set(used_ids), len(used_ids) + 1)
+
+
+def plan_selected_entries_vul(
+    index: DuplicateIndex, selected_entries: List[Dict]
+) -> List[Tuple[int | None, Dict]]:
+    """Plan de upsert de save-selection: [(posición a sustituir o None, registro)].
+
+    Empareja por numero normalizado sobre el índice mantenido, sin recorrer el
+    dataset. El registro sustituido conserva su posición y, si tiene, su id.
+    """
+    rows = index.rows
+    used_ids, _ = index.ids()
+    allocated = set()
+    next_id = len(used_ids) + 1
+    plan: List[Tuple[int | None, Dict]] = []
     for entry in selected_entries:
         entry = _sanitize_any(entry)
         entry = ensure_due_vul(entry)
         entry = _ensure_closed_fields(entry)
         entry = _sanitize_link(entry)
-        k_num = str(entry.get("numero", "")).strip().lower()
-        chosen = by_num.get(k_num)
+        pos = index.num.get(norm(entry.get("numero", "")))
+        chosen = rows[pos] if pos is not None else None
         od = OrderedDict()
         if chosen and chosen.get("id"):
             od["id"] = chosen["id"]
-            keys_to_remove.add(k_num)
         else:
-            while str(next_id) in used_ids:
+            while str(next_id) in used_ids or next_id in allocated:
                 next_id += 1
             od["id"] = next_id
-            used_ids.add(str(next_id))
+            allocated.add(next_id)
             next_id += 1
         for field, val in entry.items():
             if field != "id":
@@ -214,72 +213,43 @@ def update_selected_entries_vul(
         od = _sanitize_any(od)
         od = _ensure_closed_fields(od)
         od = _sanitize_link(od)
-        updated_rows.append(od)
-        keys_to_remove.add(k_num)
-    final_data = [
-        row
-        for row in existing_data
-        if str(row.get("numero", "")).strip().lower() not in keys_to_remove
-    ]
-    final_data.extend(updated_rows)
-    return final_data
-
-
-def enrich_vul(vul_list: List[Dict], vit_list: List[Dict]) -> List[Dict]:
-    vit_map = {
-        str(v.get("numero", ""))
-        .strip()
-        .lower(): _ensure_closed_fields(_sanitize_any(dict(v)))
-        for v in vit_list
-    }
+        stamp(od)
+        plan.append((pos, od))
+    return plan
+
+
+def link_payload(vit: Dict) -> Dict:
+    """Copia saneada de un VIT tal y como se incrusta en `vitsData`."""
+    return _ensure_closed_fields(_sanitize_any(strip_match_key(dict(vit))))
+
+
+def _enrich_one(vul: Dict, vits_data: Callable[[Dict], List[Dict]]) -> Dict:
+    vul = strip_match_key(vul)
+    vul = _sanitize_any(vul)
+    vul = _ensure_closed_fields(vul)
+    vul = _sanitize_link(vul)
+    associated_vits = vits_data(vul)
+    vul["vitsData"] = associated_vits
+    vul["hasLink"] = bool(associated_vits)
+    return vul
+
+
+def iter_enrich_vul_linked(
+    vul_list: List[Dict], vits_data: Callable[[Dict], List[Dict]]
+) -> Iterator[Dict]:
+    """Enriquece cada VUL con vitsData resuelto por `vits_data(vul)` desde una
+    vista ya materializada (ver core.views.common.links)."""
     for vul in vul_list:
-        vul = _sanitize_any(vul)
-        vul = _ensure_closed_fields(vul)
-        vul = _sanitize_link(vul)
-        vits_raw = vul.get("vits", "")
-        vits_numbers = [
-            v.strip().lower() for v in str(vits_raw).split(",") if v.strip()
-        ]
-        associated_vits = []
-        for vit_num in vits_numbers:
-            vit_obj = vit_map.get(vit_num)
-            if vit_obj:
-                associated_vits.append(vit_obj)
-        vul["vitsData"] = associated_vits
-        vul["hasLink"] = bool(associated_vits)
-    return vul_list
-
-
-def enrich_vit(vit_list: List[Dict], vul_list: List[Dict]) -> List[Dict]:
-    vul_map = {
-        str(v.get("numero", ""))
-        .strip()
-        .lower(): _ensure_closed_fields(_sanitize_any(dict(v)))
-        for v in vul_list
-    }
-    for vit in vit_list:
-        vit = _sanitize_any(vit)
-        vit = _ensure_closed_fields(vit)
-        vit = _sanitize_link(vit)
-        vul_num = str(vit.get("vul", "")).strip().lower()
-        if vul_num in vul_map:
-            vit["vulData"] = vul_map[vul_num]
-            vit["hasLink"] = True
-        else:
-            vit["vulData"] = None
-            vit["hasLink"] = False
-    return vit_list
+        yield _enrich_one(vul, vits_data)
 
 
 def sanitize_duplicate_pairs(pairs: List[Dict[str, Dict]]) -> List[Dict[str, Dict]]:
     sanitized: List[Dict[str, Dict]] = []
     for p in pairs:
-        existing = _ensure_closed_fields(
-            _sanitize_link(_sanitize_any(dict(p.get("existing", {}))))
-        )
-        incoming = _ensure_closed_fields(
-            _sanitize_link(_sanitize_any(dict(p.get("incoming", {}))))
-        )
+        existing = strip_match_key(dict(p.get("existing", {})))
+        existing = _ensure_closed_fields(_sanitize_link(_sanitize_any(existing)))
+        incoming = strip_match_key(dict(p.get("incoming", {})))
+        incoming = _ensure_closed_fields(_sanitize_link(_sanitize_any(incoming)))
         sanitized.append({"existing": existing, "incoming": incoming})
     return sanitized
 
@@ -295,7 +265,7 @@ def sanitize_upload_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
     if isinstance(news, list):
         cleaned_news: List[Dict[str, Any]] = []
         for e in news:
-            e = _sanitize_any(dict(e))
+            e = _sanitize_any(strip_match_key(dict(e)))
             e = _ensure_closed_fields(e)
             e = _sanitize_link(e)
             cleaned_news.append(e)
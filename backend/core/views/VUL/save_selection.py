@@ -1,20 +1,15 @@
 # core/views/VUL/save_selection.py
-import json
-import os
-from pathlib import Path
-from tempfile import NamedTemporaryFile
 from typing import List, Dict
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.apps import apps
+from core.views.common import staging
+from core.views.common.serialization import JsonResponse, loads
+from core.views.common.dup_index import get_index
+from core.views.common.relations import RELATIONS_FILE, commit, take_links
+from core.views.common.store import commit_group, upsert_records
 from core.views.common.utils import add_cors_headers
-from core.views.VUL.risk_logic import update_selected_entries_vul, ensure_due_vul
+from core.views.VUL.risk_logic import plan_selected_entries_vul, ensure_due_vul
 
-CORE_DIR = Path(apps.get_app_config("core").path)
-DATA_DIR = CORE_DIR / "data"
-DATA_DIR.mkdir(exist_ok=True)
-
-JSON_PATH = DATA_DIR / "CSIRT" / "vul_Data.json"
+JSON_FILE = "CSIRT/vul_Data.json"
 
 
 @csrf_exempt
@@ -28,8 +23,14 @@ def save_selection(request):
         )
 
     try:
-        body = json.loads(request.body.decode("utf-8"))
-        selected_entries = body.get("entries", [])
+        body = loads(request.body)
+        token = body.get("token")
+        if token:
+            # Resolución guardada en la subida: solo llegan las elecciones.
+            staged = staging.load_staged("vul", token)
+            selected_entries = staging.selected_entries(staged, body.get("choices"))
+        else:
+            selected_entries = body.get("entries", [])
 
         if not isinstance(selected_entries, list):
             raise ValueError("Invalid data format: 'entries' must be a list.")
@@ -38,21 +39,19 @@ def save_selection(request):
             if isinstance(e, dict):
                 e = ensure_due_vul(e)
 
-        if JSON_PATH.exists():
-            with JSON_PATH.open("r", encoding="utf-8") as f:
-                existing_data = json.load(f)
-        else:
-            existing_data = []
-
-        if not isinstance(existing_data, list):
-            existing_data = [existing_data]
-
-        final_data = update_selected_entries_vul(existing_data, selected_entries)
-
-        with NamedTemporaryFile("w", delete=False, encoding="utf-8") as tmp:
-            json.dump(final_data, tmp, ensure_ascii=False, indent=2)
-            tmp_name = tmp.name
-        os.replace(tmp_name, JSON_PATH)
+        with commit_group(JSON_FILE, RELATIONS_FILE):
+            # Solo se escriben los registros afectados: el índice mantenido
+            # dice qué posición sustituye cada entrada y qué ids están libres.
+            index = get_index(JSON_FILE)
+            plan = plan_selected_entries_vul(index, selected_entries)
+            # Los enlaces van al conjunto de aristas, no a los registros.
+            vul_links = take_links("vul", (record for _, record in plan))
+            upsert_records(JSON_FILE, index.version, plan)
+            commit(vul=vul_links)
+
+        # Si quedan relaciones por aplicar, apply-relations usa el mismo token.
+        if token and not staged.get("relations"):
+            staging.discard(token)
 
         response = JsonResponse({"message": "Selection saved successfully"})
 
@@ -1,12 +1,12 @@
 # src: core/views/VUL/update.py
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-import json
-import os
+from core.views.common.serialization import JsonResponse, loads
 from datetime import datetime
+from core.views.common.store import update_record, update_records
 
 CLOSED_STATES = {"Cerrado", "Closed"}
 DUE_DATE_FIELD = "dueDate"
+JSON_FILE = "CSIRT/vul_Data.json"
 
 
 def _parse_yyyy_mm_dd(date_str: str | None) -> datetime | None:
@@ -18,68 +18,119 @@ def _parse_yyyy_mm_dd(date_str: str | None) -> datetime | None:
         return None
 
 
+def _apply_status(item: dict, estado: str, now: datetime) -> None:
+    previous_state = str(item.get("estado", "")).strip()
+    item["estado"] = estado
+
+    if estado in CLOSED_STATES:
+        if not item.get("closedDate"):
+            item["closedDate"] = now.strftime("%Y-%m-%d")
+            due_raw = item.get(DUE_DATE_FIELD)
+            due_dt = _parse_yyyy_mm_dd(due_raw)
+            if due_dt is not None:
+                delta_days = (now.date() - due_dt.date()).days
+                item["closedDelayDays"] = delta_days
+                item["overdue"] = bool(delta_days > 0)
+            else:
+                item["closedDelayDays"] = None
+                item["overdue"] = None
+    else:
+        if previous_state in CLOSED_STATES:
+            item.pop("closedDate", None)
+            item.pop("closedDelayDays", None)
+            item.pop("overdue", None)
+
+
 @csrf_exempt
 def update_status(request):
     if request.method != "POST":
         return JsonResponse({"error": "Método no permitido"}, status=405)
     try:
-        data = json.loads(request.body.decode("utf-8"))
+        data = loads(request.body)
         numero = str(data.get("numero", "")).strip()
         estado = str(data.get("estado", "")).strip()
 
         if not numero or not estado:
             return JsonResponse({"error": "Datos inválidos"}, status=400)
 
-        file_path = os.path.join(
-            os.path.dirname(__file__),
-            "../../data/CSIRT/vul_Data.json",
+        now = datetime.now()
+        updated = update_record(
+            JSON_FILE, numero, lambda item: _apply_status(item, estado, now)
         )
-        file_path = os.path.abspath(file_path)
 
-        with open(file_path, "r", encoding="utf-8") as f:
-            vul_data = json.load(f)
+        if updated is None:
+            return JsonResponse({"error": "Número no encontrado"}, status=404)
 
-        updated = False
-        now = datetime.now()
-        today_str = now.strftime("%Y-%m-%d")
+        return JsonResponse(
+            {"success": True, "numero": numero, "estado": estado}, status=200
+        )
 
-        for item in vul_data:
-            current_num = str(item.get("numero") or "").strip()
-            if current_num != numero:
-                continue
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
 
-            previous_state = str(item.get("estado", "")).strip()
-            item["estado"] = estado
-
-            if estado in CLOSED_STATES:
-                if not item.get("closedDate"):
-                    item["closedDate"] = today_str
-                    due_raw = item.get(DUE_DATE_FIELD)
-                    due_dt = _parse_yyyy_mm_dd(due_raw)
-                    if due_dt is not None:
-                        delta_days = (now.date() - due_dt.date()).days
-                        item["closedDelayDays"] = delta_days
-                        item["overdue"] = bool(delta_days > 0)
-                    else:
-                        item["closedDelayDays"] = None
-                        item["overdue"] = None
-            else:
-                if previous_state in CLOSED_STATES:
-                    item.pop("closedDate", None)
-                    item.pop("closedDelayDays", None)
-                    item.pop("overdue", None)
 
-            updated = True
-            break
+@csrf_exempt
+def update_status_bulk(request):
+    """Varios {numero, estado} en una sola pasada y un único guardado.
 
-        if not updated:
-            return JsonResponse({"error": "Número no encontrado"}, status=404)
+    Acepta {"items": [...]} o directamente la lista; responde con el
+    resultado de cada elemento en el mismo orden.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Método no permitido"}, status=405)
+    try:
+        data = loads(request.body)
+        items = data.get("items") if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return JsonResponse({"error": "Datos inválidos"}, status=400)
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(vul_data, f, ensure_ascii=False, indent=2)
+        now = datetime.now()
+        pairs = []
+        for entry in items:
+            if not isinstance(entry, dict):
+                pairs.append(("", ""))
+                continue
+            pairs.append(
+                (
+                    str(entry.get("numero", "")).strip(),
+                    str(entry.get("estado", "")).strip(),
+                )
+            )
+
+        updated = update_records(
+            JSON_FILE,
+            [
+                (numero, lambda item, estado=estado: _apply_status(item, estado, now))
+                for numero, estado in pairs
+                if numero and estado
+            ],
+        )
+
+        results = []
+        for numero, estado in pairs:
+            if not numero or not estado:
+                results.append(
+                    {"numero": numero, "success": False, "error": "Datos inválidos"}
+                )
+            elif numero not in updated:
+                results.append(
+                    {
+                        "numero": numero,
+                        "success": False,
+                        "error": "Número no encontrado",
+                    }
+                )
+            else:
+                results.append({"numero": numero, "estado": estado, "success": True})
 
         return JsonResponse(
-            {"success": True, "numero": numero, "estado": estado}, status=200
+            {
+                "success": True,
+                "updated": len(updated),
+                "failed": sum(1 for r in results if not r["success"]),
+                "results": results,
+            },
+            status=200,
         )
 
     except Exception as e:
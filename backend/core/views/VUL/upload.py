@@ -1,26 +1,36 @@
 # backend/core/views/VUL/upload.py
-import json
-import os
-from pathlib import Path
-from tempfile import NamedTemporaryFile
-
+from typing import Dict, Tuple
 import pandas as pd
-from django.apps import apps
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from core.views.common.dates import parse_date_series
+from core.views.common import jobs, staging, upload_cache
+from core.views.common.dup_index import get_index
+from core.views.common.frames import (
+    clean_frame,
+    due_dates,
+    horizon_days,
+)
+from core.views.common.ingest import iter_upload_frames
+from core.views.common.links import LinkView, get_view
+from core.views.common.relations import (
+    RELATIONS_FILE,
+    commit,
+    join_vits,
+    render,
+    split_vits,
+    take_links,
+)
+from core.views.common.serialization import JsonResponse
+from core.views.common.store import commit_group, upsert_records
 
 from core.views.common.utils import add_cors_headers
 from core.views.VUL.normalize import normalize_headers_vul
 from core.views.VUL.duplicates import detect_duplicates
-from core.views.VUL.risk_logic import assign_ids_and_merge_vul
-from datetime import datetime, timedelta
-
-CORE_DIR = Path(apps.get_app_config("core").path)
-DATA_DIR = CORE_DIR / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+from core.views.VUL.risk_logic import new_records_vul
+from datetime import datetime
 
-VUL_JSON_PATH = DATA_DIR / "CSIRT" / "vul_Data.json"
-VIT_JSON_PATH = DATA_DIR / "CSIRT" / "vit_Data.json"
+VUL_JSON_FILE = "CSIRT/vul_Data.json"
+VIT_JSON_FILE = "CSIRT/vit_Data.json"
 
 _REQUIRED_CANON_MIN = {"numero", "prioridad", "estado", "actualizado"}
 
@@ -35,73 +45,182 @@ def _bad(msg: str, **extra):
     return add_cors_headers(JsonResponse(p, status=400))
 
 
-_DATE_INPUT_CANDIDATES = [
-    "%Y-%m-%d",
-    "%Y/%m/%d",
-    "%d/%m/%Y",
-    "%d-%m-%Y",
-    "%Y-%m-%d %H:%M:%S",
-    "%Y/%m/%d %H:%M:%S",
-    "%Y-%m-%dT%H:%M:%S",
-    "%Y-%m-%dT%H:%M:%S.%f",
-]
-
-_HORIZON_BY_PRIORITY = {
-    "critical": 30,
-    "critico": 30,
-    "crítico": 30,
-    "high": 90,
-    "alto": 90,
-    "alta": 90,
-    "medium": 365,
-    "medio": 365,
-    "media": 365,
-    "low": 365,
-    "bajo": 365,
-    "baja": 365,
-}
-
-
-def _parse_date_loose(s: object) -> datetime | None:
-    if not s:
-        return None
-    t = str(s).strip()
-    if not t or t.lower() in ("nan", "nat", "none", "null"):
-        return None
-    for fmt in _DATE_INPUT_CANDIDATES:
-        try:
-            return datetime.strptime(t, fmt)
-        except Exception:
-            pass
-    try:
-        return datetime.fromisoformat(t)
-    except Exception:
-        return None
+def _prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Saneado y campos de front por columnas, antes de pasar a registros.
+
+    Deja cada fila como la dejaban _sanitize_any, _sanitize_link y
+    _ensure_front_fields, y calcula dueDate (creado, si no actualizado, si no
+    hoy, más el horizonte de la prioridad) donde venga vacío.
+    """
+    out = clean_frame(df)
+    due = out["dueDate"].astype(str)
+    missing = due.eq("")
+    if missing.any():
+        sub = out.loc[missing]
+        base = pd.Series(pd.NaT, index=sub.index, dtype="datetime64[ns]")
+        for field in ("creado", "actualizado"):
+            if field in sub.columns:
+                base = base.fillna(parse_date_series(sub[field]))
+        base = base.fillna(pd.Timestamp(datetime.now()))
+        days = horizon_days(sub["prioridad"])
+        due[missing] = due_dates(base, days)
+    out["dueDate"] = due
+    out["closedDate"] = out["closedDate"].astype(str)
+    out["closedDelayDays"] = out["closedDelayDays"].astype(str)
+    out["vits"] = out["vits"].astype(str)
+    if "hasLink" not in out.columns:
+        out["hasLink"] = False
+    return out
+
+
+def _detect_relations(entries: list, links: LinkView) -> list:
+    relations = []
+    for vul in entries:
+        vul_num = str(vul.get("numero", "")).strip()
+        if not vul_num:
+            continue
+        before = split_vits(vul.get("vits"))
+        before_keys = {v.lower() for v in before}
+        # VITs que apuntan a este VUL y que la entrada no lista.
+        for vit_num in links.edges.referrers_of(vul_num):
+            if vit_num.lower() not in before_keys:
+                relations.append(
+                    {
+                        "vulNumero": vul_num,
+                        "vitNumero": vit_num,
+                        "before": join_vits(before),
+                        "after": join_vits(before + [vit_num]),
+                    }
+                )
+    return relations
 
 
-def _calc_due(creado: object, actualizado: object, prioridad: object) -> str:
-    base = _parse_date_loose(creado) or _parse_date_loose(actualizado) or datetime.now()
-    sev = str(prioridad or "").strip().lower()
-    horizon = _HORIZON_BY_PRIORITY.get(sev, 365)
-    return (base + timedelta(days=horizon)).strftime("%Y-%m-%d")
+def _no_progress(stage: str, rows: int | None = None) -> None:
+    pass
 
 
-def _ensure_front_fields(e: dict) -> dict:
-    if "closedDate" not in e or e.get("closedDate") is None:
-        e["closedDate"] = ""
-    if "closedDelayDays" not in e or e.get("closedDelayDays") is None:
-        e["closedDelayDays"] = ""
-    if "overdue" not in e:
-        e["overdue"] = False
-    if not e.get("dueDate"):
-        e["dueDate"] = _calc_due(
-            e.get("creado"), e.get("actualizado"), e.get("prioridad")
-        )
-    return e
+def _error(msg: str, **extra) -> Tuple[Dict, int]:
+    p = {"error": msg}
+    p.update(extra)
+    return p, 400
+
+
+def run_upload(upload, progress=_no_progress) -> Tuple[Dict, int]:
+    """Procesa un fichero subido; devuelve (payload, status HTTP).
+
+    `progress(stage, rows)` recibe la etapa ("parsing", "comparing",
+    "merging") y las filas procesadas hasta el momento; lo usan los trabajos
+    en segundo plano.
+    """
+    # Índice persistente: no se recorre el histórico en cada subida.
+    by_num = get_index(VUL_JSON_FILE).lookups()[2]
+
+    # VITs que ya apuntan a cada VUL, desde la vista de enlaces mantenida.
+    links = get_view()
+
+    duplicates = []
+    unique_new_entries = []
+    relations = []
+
+    def compare(new_entries: list) -> None:
+        dups, uniques = detect_duplicates([], new_entries, by_num, clean=False)
+        for pair in dups:
+            render("vul", pair["existing"], links.edges)
+        duplicates.extend(dups)
+        unique_new_entries.extend(uniques)
+        relations.extend(_detect_relations(uniques, links))
+
+    # Mismo fichero ya procesado: se salta la lectura y la normalización.
+    cache_key = upload_cache.content_key("vul", upload)
+    cached = upload_cache.get(cache_key)
+    rows = 0
+    if cached is not None:
+        progress("comparing", rows)
+        for new_entries in cached:
+            compare(new_entries)
+            rows += len(new_entries)
+            progress("comparing", rows)
+    else:
+        # Cada bloque se compara en cuanto se lee y se descarta: de la subida
+        # solo sobreviven las entradas nuevas, nunca el DataFrame ni el bloque.
+        # La copia para la cache se abandona si pasa de UPLOAD_CACHE_ROWS.
+        keep = []
+        got = None
+        progress("parsing", rows)
+        frames = iter_upload_frames(upload)
+        while True:
+            try:
+                df = next(frames, None)
+            except ImportError as e:
+                return _error(f"{e.name} is required on server to read this file.")
+            except Exception as e:
+                return _error("Failed to read uploaded file", details=str(e))
+            if df is None:
+                break
+            if got is None and df.empty:
+                break
+            try:
+                df = normalize_headers_vul(df)
+            except Exception as e:
+                return _error("Header normalization failed", details=str(e))
+            if got is None:
+                got = set(map(str, df.columns))
+                missing = sorted(list(_REQUIRED_CANON_MIN - got))
+                if missing:
+                    return _error(
+                        "Normalized columns missing",
+                        missing=missing,
+                        got=sorted(list(got)),
+                    )
+            new_entries = _prepare_frame(df).to_dict(orient="records")
+            del df
+            rows += len(new_entries)
+            if keep is not None and rows <= upload_cache.UPLOAD_CACHE_ROWS:
+                keep.append([dict(r) for r in new_entries])
+            else:
+                keep = None
+            compare(new_entries)
+            progress("comparing", rows)
+        if got is None:
+            return _error("File is empty or unreadable.")
+        if keep is not None:
+            upload_cache.put(cache_key, keep)
+
+    if duplicates or relations:
+        # Las entradas nuevas se quedan en el servidor: el cliente resuelve
+        # con el token y solo recibe lo que tiene que mostrar.
+        token = staging.stage("vul", unique_new_entries, duplicates, relations)
+        return {
+            "message": "Duplicates detected" if duplicates else "Relations detected",
+            "token": token,
+            "newCount": len(unique_new_entries),
+            "duplicates": duplicates,
+            "relations": relations,
+        }, 200
+    progress("merging", rows)
+    # Bajo el cerrojo: otro worker puede haber guardado desde la detección de
+    # duplicados y los ids deben seguir siendo únicos. Los ids salen del
+    # índice mantenido y las altas van al final en una línea del diario, así
+    # que el coste no depende del histórico. Registros y enlaces se publican
+    # juntos en un único commit.
+    with commit_group(VUL_JSON_FILE, RELATIONS_FILE):
+        index = get_index(VUL_JSON_FILE)
+        added = new_records_vul(index, unique_new_entries)
+        # Los enlaces van al conjunto de aristas, no a los registros.
+        vul_links = take_links("vul", added)
+        upsert_records(VUL_JSON_FILE, index.version, [(None, r) for r in added])
+        commit(vul=vul_links)
+    return {
+        "message": "Data added successfully",
+        "new": [],
+        "duplicates": [],
+        "relations": [],
+    }, 200
 
 
 @csrf_exempt
 def upload_data(request):
+    """Síncrono por defecto; con ?async=1 encola un trabajo y responde 202."""
     if request.method == "OPTIONS":
         return _ok({"message": "Preflight OK"})
     if request.method != "POST":
@@ -109,105 +228,17 @@ def upload_data(request):
     try:
         if "file" not in request.FILES:
             return _bad('No file was uploaded. Expected FormData field "file".')
-        excel_file = request.FILES["file"]
-        try:
-            df = pd.read_excel(excel_file, engine="openpyxl")
-        except ImportError:
-            return _bad("openpyxl is required on server to read .xlsx files.")
-        except Exception as e:
-            return _bad("Failed to read Excel file", details=str(e))
-        if df is None or df.empty:
-            return _bad("Excel is empty or unreadable.")
-        try:
-            df = normalize_headers_vul(df)
-        except Exception as e:
-            return _bad("Header normalization failed", details=str(e))
-        got = set(map(str, df.columns))
-        missing = sorted(list(_REQUIRED_CANON_MIN - got))
-        if missing:
-            return _bad(
-                "Normalized columns missing", missing=missing, got=sorted(list(got))
-            )
-        new_entries = df.to_dict(orient="records")
-        new_entries = [_ensure_front_fields(dict(e)) for e in new_entries]
-        if VUL_JSON_PATH.exists():
-            with VUL_JSON_PATH.open("r", encoding="utf-8") as f:
-                existing_data = json.load(f)
-        else:
-            existing_data = []
-        if not isinstance(existing_data, list):
-            existing_data = [existing_data]
-        res = detect_duplicates(existing_data, new_entries)
-        if not isinstance(res, tuple) or len(res) != 2:
-            duplicates, unique_new_entries = [], new_entries
-        else:
-            duplicates, unique_new_entries = res
-        if VIT_JSON_PATH.exists():
-            with VIT_JSON_PATH.open("r", encoding="utf-8") as f:
-                vit_data = json.load(f)
-        else:
-            vit_data = []
-        if not isinstance(vit_data, list):
-            vit_data = [vit_data]
-        relations = []
-        for vul in unique_new_entries:
-            vul_num = str(vul.get("numero", "")).strip()
-            if not vul_num:
-                continue
-            before_vits = str(vul.get("vits", "")).strip()
-            before_set = {s.strip() for s in before_vits.split(",") if s.strip()}
-            for vit in vit_data:
-                vit_num = str(vit.get("numero", "")).strip()
-                if not vit_num:
-                    continue
-                vit_vul_field = str(vit.get("vul", vit.get("VUL", ""))).strip()
-                if not vit_vul_field:
-                    continue
-                if vit_vul_field == vul_num and vit_num not in before_set:
-                    after_vits = (
-                        (before_vits + "," + vit_num).strip(",")
-                        if before_vits
-                        else vit_num
-                    )
-                    relations.append(
-                        {
-                            "vulNumero": vul_num,
-                            "vitNumero": vit_num,
-                            "before": before_vits,
-                            "after": after_vits,
-                        }
-                    )
-        if not duplicates:
-            if relations:
-                return _ok(
-                    {
-                        "message": "Relations detected",
-                        "new": unique_new_entries,
-                        "duplicates": [],
-                        "relations": relations,
-                    }
-                )
-            updated_data = assign_ids_and_merge_vul(existing_data, unique_new_entries)
-            VUL_JSON_PATH.parent.mkdir(parents=True, exist_ok=True)
-            with NamedTemporaryFile("w", delete=False, encoding="utf-8") as tmp:
-                json.dump(updated_data, tmp, ensure_ascii=False, indent=2)
-                tmp_name = tmp.name
-            os.replace(tmp_name, VUL_JSON_PATH)
-            return _ok(
-                {
-                    "message": "Data added successfully",
-                    "new": [],
-                    "duplicates": [],
-                    "relations": [],
-                }
-            )
-        return _ok(
-            {
-                "message": "Duplicates detected",
-                "new": unique_new_entries,
-                "duplicates": duplicates,
-                "relations": relations,
-            }
-        )
+        upload = request.FILES["file"]
+        if jobs.wants_async(request):
+            job = jobs.submit("vul", upload, run_upload)
+            job["statusUrl"] = f"/vul/upload/jobs/{job['jobId']}/"
+            return _ok(job, status=202)
+        payload, status = run_upload(upload)
+        return _ok(payload, status=status)
     except Exception as e:
         return _bad(str(e))
+
+
+@csrf_exempt
+def upload_job_status(request, job_id):
+    return add_cors_headers(jobs.job_status_response(request, "vul", job_id))
@@ -1,48 +1,92 @@
 from datetime import datetime, timezone
-import json
 from pathlib import Path
 
+from core.views.common import db_store, locks
+from core.views.common.store import (
+    STORAGE_BACKEND,
+    ensure_recovered,
+    file_last_modified,
+    file_version,
+    replace_file,
+)
+from core.views.common.serialization import read_file
 from core.views.common.utils import DATA_DIR
 
 COMMENTS_DIR = DATA_DIR / "comments"
 COMMENTS_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def comments_filename(view_kind):
+    """Ruta relativa a DATA_DIR, para incluirlo en store.commit_group."""
+    return f"comments/{str(view_kind).lower()}_comments.json"
+
+
 def _comments_file(view_kind):
-    view_kind = str(view_kind).lower()
-    return COMMENTS_DIR / f"{view_kind}_comments.json"
+    return DATA_DIR / comments_filename(view_kind)
+
+
+def comments_version(view_kind):
+    if STORAGE_BACKEND == "sqlite":
+        return db_store.dataset_version(f"{str(view_kind).lower()}_comments")
+    ensure_recovered()
+    return file_version(_comments_file(view_kind))
+
+
+def comments_last_modified(view_kind):
+    if STORAGE_BACKEND == "sqlite":
+        return db_store.dataset_updated_at(f"{str(view_kind).lower()}_comments")
+    return file_last_modified(_comments_file(view_kind))
 
 
 def load_comments(view_kind):
+    if STORAGE_BACKEND == "sqlite":
+        return db_store.load_comments(str(view_kind).lower())
+    ensure_recovered()
     path = _comments_file(view_kind)
     if not path.exists():
         return {}
     try:
-        with path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                return data
-            return {}
+        data = read_file(path)
+        if isinstance(data, dict):
+            return data
+        return {}
     except Exception:
         return {}
 
 
 def save_comments(view_kind, data):
+    if STORAGE_BACKEND == "sqlite":
+        db_store.replace_comments(str(view_kind).lower(), data)
+        return
+    ensure_recovered()
     path = _comments_file(view_kind)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with locks.locked(path):
+        replace_file(path, data)
 
 
 def get_comments_for(view_kind, numero):
+    if STORAGE_BACKEND == "sqlite":
+        return db_store.get_comments_for(str(view_kind).lower(), str(numero))
     all_comments = load_comments(view_kind)
     return list(all_comments.get(str(numero), []))
 
 
 def append_comment(view_kind, numero, text, author=None):
+    # Lectura y guardado bajo el mismo cerrojo para no perder comentarios ni
+    # repetir ids cuando otro worker comenta a la vez.
+    ensure_recovered()
+    with locks.locked(_comments_file(view_kind)):
+        return _append_comment(view_kind, numero, text, author)
+
+
+def _append_comment(view_kind, numero, text, author):
     numero = str(numero)
-    all_comments = load_comments(view_kind)
-    comments = list(all_comments.get(numero, []))
+    if STORAGE_BACKEND == "sqlite":
+        all_comments = None
+        comments = get_comments_for(view_kind, numero)
+    else:
+        all_comments = load_comments(view_kind)
+        comments = list(all_comments.get(numero, []))
 
     next_id = 1
     if comments:
@@ -59,6 +103,29 @@ def append_comment(view_kind, numero, text, author=None):
     }
 
     comments.append(comment)
+    if all_comments is None:
+        db_store.add_comment(str(view_kind).lower(), numero, comment)
+        return comments
     all_comments[numero] = comments
     save_comments(view_kind, all_comments)
     return comments
+
+
+def delete_comments(view_kind, numeros):
+    """Borra los hilos de esos numeros. Devuelve cuántos comentarios había.
+
+    Dentro de store.commit_group (con comments_filename entre sus ficheros)
+    va en ese commit.
+    """
+    numeros = {str(n) for n in numeros if n}
+    if not numeros:
+        return 0
+    if STORAGE_BACKEND == "sqlite":
+        return db_store.delete_comments(str(view_kind).lower(), sorted(numeros))
+    ensure_recovered()
+    with locks.locked(_comments_file(view_kind)):
+        all_comments = load_comments(view_kind)
+        gone = [all_comments.pop(n) for n in numeros if n in all_comments]
+        if gone:
+            save_comments(view_kind, all_comments)
+        return sum(len(c) for c in gone)
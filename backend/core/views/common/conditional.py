@@ -0,0 +1,50 @@
+# core/views/common/conditional.py
+import hashlib
+from django.utils.cache import patch_cache_control
+from core.views.common import relations
+from core.views.common.comments import comments_last_modified, comments_version
+from core.views.common.store import dataset_last_modified, dataset_version
+
+RISK_DATA_FILES = ("CSIRT/vit_Data.json", "CSIRT/vul_Data.json")
+
+
+def _etag(*parts) -> str:
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def risk_data_etag(request, *args, **kwargs) -> str:
+    # Ambos listados incrustan datos del otro dataset y pintan los enlaces,
+    # así que dependen de las dos versiones y de la del conjunto de aristas;
+    # la query string distingue páginas/filtros/streaming. get_edges crea
+    # relations.json si aún no existe, antes de leer su versión.
+    versions = tuple(dataset_version(f) for f in RISK_DATA_FILES)
+    versions += (relations.get_edges().version,)
+    return _etag(request.path, request.GET.urlencode(), versions)
+
+
+def risk_data_last_modified(request, *args, **kwargs):
+    # Los enlaces se pintan desde relations.json: cuenta como un dataset más.
+    stamps = [dataset_last_modified(f) for f in RISK_DATA_FILES]
+    stamps.append(relations.last_modified())
+    stamps = [s for s in stamps if s is not None]
+    return max(stamps) if stamps else None
+
+
+def comments_etag(kind: str):
+    def _func(request, numero, *args, **kwargs) -> str:
+        return _etag(kind, str(numero), comments_version(kind))
+
+    return _func
+
+
+def comments_last_modified_func(kind: str):
+    def _func(request, *args, **kwargs):
+        return comments_last_modified(kind)
+
+    return _func
+
+
+def revalidate(response):
+    """Obliga al navegador a revalidar siempre con If-None-Match."""
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,112 @@
+# core/views/common/dates.py
+import re
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, List
+import pandas as pd
+
+# Parser de fechas "flexible" compartido por VIT y VUL.
+#
+# Antes cada valor probaba hasta ocho strptime capturando una excepción por
+# cada formato fallido. Aquí el formato se reconoce por su forma con una
+# expresión regular (sin excepciones), los resultados se memorizan por texto
+# y, para columnas enteras, se detecta el formato dominante y se parsea de
+# una vez con pandas; solo lo que no encaje pasa por el camino valor a valor.
+
+DATE_INPUT_FORMATS = (
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+)
+
+_D = r"\d{1,2}"
+_Y = r"\d{4}"
+_HMS = rf"{_D}:{_D}:{_D}"
+_SHAPES = {
+    "%Y-%m-%d": rf"{_Y}-{_D}-{_D}",
+    "%Y/%m/%d": rf"{_Y}/{_D}/{_D}",
+    "%d/%m/%Y": rf"{_D}/{_D}/{_Y}",
+    "%d-%m-%Y": rf"{_D}-{_D}-{_Y}",
+    "%Y-%m-%d %H:%M:%S": rf"{_Y}-{_D}-{_D} {_HMS}",
+    "%Y/%m/%d %H:%M:%S": rf"{_Y}/{_D}/{_D} {_HMS}",
+    "%Y-%m-%dT%H:%M:%S": rf"{_Y}-{_D}-{_D}T{_HMS}",
+    "%Y-%m-%dT%H:%M:%S.%f": rf"{_Y}-{_D}-{_D}T{_HMS}\.\d{{1,6}}",
+}
+_PATTERNS = [(fmt, re.compile(_SHAPES[fmt])) for fmt in DATE_INPUT_FORMATS]
+
+_EMPTY_TOKENS = ("", "nan", "nat", "none", "null")
+
+# Valores distintos a mirar para decidir el formato dominante de una columna.
+SNIFF_SAMPLE = 200
+
+
+def sniff_format(text: str) -> str | None:
+    """Formato de DATE_INPUT_FORMATS con la forma de `text`, o None."""
+    for fmt, pattern in _PATTERNS:
+        if pattern.fullmatch(text):
+            return fmt
+    return None
+
+
+@lru_cache(maxsize=65536)
+def _parse_text(text: str) -> datetime | None:
+    fmt = sniff_format(text)
+    if fmt is not None:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            # Forma correcta pero fecha imposible (p. ej. mes 13).
+            return None
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def parse_date(value) -> datetime | None:
+    """Fecha en cualquiera de DATE_INPUT_FORMATS o ISO 8601; None si no lo es."""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if text.lower() in _EMPTY_TOKENS:
+        return None
+    return _parse_text(text)
+
+
+def parse_dates(values: Iterable) -> List[datetime | None]:
+    return [parse_date(v) for v in values]
+
+
+def dominant_format(texts: Iterable[str]) -> str | None:
+    counts = Counter(sniff_format(t) for t in texts)
+    counts.pop(None, None)
+    return counts.most_common(1)[0][0] if counts else None
+
+
+def _naive(d: datetime | None) -> datetime | None:
+    # Una columna datetime64 no admite mezclar zonas horarias; se conserva la
+    # hora local escrita, que es lo que usa el cálculo de fechas por fila.
+    return d.replace(tzinfo=None) if d is not None and d.tzinfo else d
+
+
+def parse_date_series(col: pd.Series) -> pd.Series:
+    """Versión por columnas de parse_date: datetime64 o NaT."""
+    text = col.astype(object).where(col.notna(), "").astype(str).str.strip()
+    result = pd.Series(pd.NaT, index=col.index, dtype="datetime64[ns]")
+    pending = ~text.str.lower().isin(_EMPTY_TOKENS)
+    if not pending.any():
+        return result
+    fmt = dominant_format(text[pending].drop_duplicates().head(SNIFF_SAMPLE))
+    if fmt is not None:
+        result[pending] = pd.to_datetime(text[pending], format=fmt, errors="coerce")
+        pending = pending & result.isna()
+    if pending.any():
+        parsed = {t: _naive(_parse_text(t)) for t in text[pending].unique()}
+        result[pending] = pd.to_datetime(text[pending].map(parsed), errors="coerce")
+    return result
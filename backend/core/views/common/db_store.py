@@ -0,0 +1,287 @@
+# core/views/common/db_store.py
+from typing import Callable, Dict, Iterable, List, Tuple
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from core.models import Comment, DatasetState, VitRecord, VitVulRelation, VulRecord
+
+MODELS = {"vit": VitRecord, "vul": VulRecord}
+
+# Máximo de parámetros por consulta `__in` (SQLite admite 999 en versiones
+# antiguas).
+_IN_BATCH = 500
+
+
+def atomic():
+    """Transacción que agrupa varias escrituras (ver store.commit_group)."""
+    return transaction.atomic()
+
+
+def _s(v) -> str:
+    return "" if v is None else str(v).strip()
+
+
+def dataset_version(kind: str) -> int:
+    row = DatasetState.objects.filter(name=kind).values_list("version", flat=True)
+    return row[0] if row else 0
+
+
+def dataset_updated_at(kind: str):
+    row = DatasetState.objects.filter(name=kind).values_list("updated_at", flat=True)
+    return row[0] if row else None
+
+
+def _bump(kind: str) -> int:
+    # La fila se crea o se bloquea en la misma transacción que el incremento:
+    # dos primeras escrituras a la vez no chocan en el create.
+    with transaction.atomic():
+        DatasetState.objects.select_for_update().get_or_create(
+            name=kind, defaults={"version": 0}
+        )
+        DatasetState.objects.filter(name=kind).update(
+            version=F("version") + 1, updated_at=timezone.now()
+        )
+        return dataset_version(kind)
+
+
+def _row_fields(kind: str, position: int, data: Dict) -> Dict:
+    fields = {
+        "position": position,
+        "record_id": _s(data.get("id")),
+        "numero": _s(data.get("numero")),
+        "data": data,
+    }
+    if kind == "vit":
+        fields["id_externo"] = _s(data.get("idExterno"))
+    return fields
+
+
+def load_records(kind: str) -> List[Dict]:
+    return list(
+        MODELS[kind].objects.order_by("position").values_list("data", flat=True)
+    )
+
+
+def replace_records(kind: str, rows: List[Dict]) -> int:
+    model = MODELS[kind]
+    rows = [r for r in rows if isinstance(r, dict)]
+    with transaction.atomic():
+        model.objects.all().delete()
+        model.objects.bulk_create(
+            [model(**_row_fields(kind, i, r)) for i, r in enumerate(rows)],
+            batch_size=1000,
+        )
+        return _bump(kind)
+
+
+def update_record(
+    kind: str, numero: str, mutate: Callable[[Dict], None]
+) -> Tuple[Dict, int] | None:
+    model = MODELS[kind]
+    with transaction.atomic():
+        obj = model.objects.select_for_update().filter(numero=numero).first()
+        if obj is None:
+            return None
+        data = dict(obj.data)
+        mutate(data)
+        fields = _row_fields(kind, obj.position, data)
+        for name, value in fields.items():
+            setattr(obj, name, value)
+        obj.save(update_fields=list(fields))
+        version = _bump(kind)
+    return data, version
+
+
+def update_records(
+    kind: str, updates: List[Tuple[str, Callable[[Dict], None]]]
+) -> Tuple[Dict[str, Dict], int] | None:
+    """Como update_record para varios numeros, en una transacción y un bump."""
+    model = MODELS[kind]
+    numeros = {numero for numero, _ in updates}
+    with transaction.atomic():
+        objs = {
+            o.numero: o
+            for o in model.objects.select_for_update().filter(numero__in=numeros)
+        }
+        if not objs:
+            return None
+        items: Dict[str, Dict] = {}
+        for numero, mutate in updates:
+            obj = objs.get(numero)
+            if obj is None:
+                continue
+            if numero not in items:
+                items[numero] = dict(obj.data)
+            mutate(items[numero])
+        fields = []
+        for numero, data in items.items():
+            obj = objs[numero]
+            fields = _row_fields(kind, obj.position, data)
+            for name, value in fields.items():
+                setattr(obj, name, value)
+        model.objects.bulk_update(
+            [objs[n] for n in items], list(fields), batch_size=1000
+        )
+        version = _bump(kind)
+    return items, version
+
+
+def upsert_records(
+    kind: str, replaced: List[Tuple[str, Dict]], inserted: List[Dict]
+) -> int:
+    """Sustituye los registros por numero y añade los nuevos al final."""
+    model = MODELS[kind]
+    with transaction.atomic():
+        objs = {
+            o.numero: o
+            for o in model.objects.select_for_update().filter(
+                numero__in={numero for numero, _ in replaced}
+            )
+        }
+        fields: Dict = {}
+        touched = []
+        for numero, data in replaced:
+            obj = objs.get(numero)
+            if obj is None:
+                continue
+            fields = _row_fields(kind, obj.position, data)
+            for name, value in fields.items():
+                setattr(obj, name, value)
+            touched.append((numero, data))
+        if touched:
+            model.objects.bulk_update(
+                [objs[n] for n, _ in touched], list(fields), batch_size=1000
+            )
+        last = model.objects.order_by("-position").values_list("position", flat=True)
+        start = (last[0] + 1) if last else 0
+        model.objects.bulk_create(
+            [model(**_row_fields(kind, start + i, r)) for i, r in enumerate(inserted)],
+            batch_size=1000,
+        )
+        return _bump(kind)
+
+
+def delete_records(kind: str, records: List[Dict]) -> int:
+    """Borra las filas de esos registros (por id y numero)."""
+    model = MODELS[kind]
+    with transaction.atomic():
+        for i in range(0, len(records), _IN_BATCH):
+            match = Q()
+            for data in records[i : i + _IN_BATCH]:
+                match |= Q(record_id=_s(data.get("id")), numero=_s(data.get("numero")))
+            model.objects.filter(match).delete()
+        return _bump(kind)
+
+
+def load_edges() -> List[Tuple[str, str, str]]:
+    """(vit_numero, vul_numero, origin) en orden de alta."""
+    return list(
+        VitVulRelation.objects.order_by("id").values_list(
+            "vit_numero", "vul_numero", "origin"
+        )
+    )
+
+
+def _relation_rows(edges: Iterable[Tuple[str, str, str]]) -> List[VitVulRelation]:
+    return [
+        VitVulRelation(vit_numero=vit, vul_numero=vul, origin=origin)
+        for vit, vul, origin in edges
+    ]
+
+
+def replace_edges(edges: Iterable[Tuple[str, str, str]]) -> int:
+    with transaction.atomic():
+        VitVulRelation.objects.all().delete()
+        VitVulRelation.objects.bulk_create(
+            _relation_rows(edges), batch_size=1000, ignore_conflicts=True
+        )
+        return _bump("relations")
+
+
+def set_links(
+    declarers: Iterable[Tuple[str, str]], edges: Iterable[Tuple[str, str, str]]
+) -> int:
+    """Borra las aristas que declara cada `(origin, numero)` y añade `edges`."""
+    by_origin: Dict[str, List[str]] = {"vit": [], "vul": []}
+    for origin, numero in declarers:
+        by_origin[origin].append(numero)
+    with transaction.atomic():
+        for origin, numeros in by_origin.items():
+            field = "vit_numero" if origin == "vit" else "vul_numero"
+            for i in range(0, len(numeros), _IN_BATCH):
+                VitVulRelation.objects.filter(
+                    origin=origin, **{f"{field}__in": numeros[i : i + _IN_BATCH]}
+                ).delete()
+        VitVulRelation.objects.bulk_create(
+            _relation_rows(edges), batch_size=1000, ignore_conflicts=True
+        )
+        return _bump("relations")
+
+
+def load_comments(kind: str) -> Dict[str, List[Dict]]:
+    out: Dict[str, List[Dict]] = {}
+    for c in Comment.objects.filter(kind=kind).order_by("numero", "comment_id"):
+        out.setdefault(c.numero, []).append(_comment_dict(c))
+    return out
+
+
+def get_comments_for(kind: str, numero: str) -> List[Dict]:
+    qs = Comment.objects.filter(kind=kind, numero=numero).order_by("comment_id")
+    return [_comment_dict(c) for c in qs]
+
+
+def add_comment(kind: str, numero: str, comment: Dict) -> None:
+    with transaction.atomic():
+        Comment.objects.create(
+            kind=kind,
+            numero=numero,
+            comment_id=int(comment.get("id") or 0),
+            author=comment.get("author") or "system",
+            text=comment.get("text") or "",
+            created_at=comment.get("created_at") or "",
+        )
+        _bump(f"{kind}_comments")
+
+
+def replace_comments(kind: str, data: Dict[str, List[Dict]]) -> None:
+    with transaction.atomic():
+        Comment.objects.filter(kind=kind).delete()
+        Comment.objects.bulk_create(
+            [
+                Comment(
+                    kind=kind,
+                    numero=str(numero),
+                    comment_id=int(c.get("id") or 0),
+                    author=c.get("author") or "system",
+                    text=c.get("text") or "",
+                    created_at=c.get("created_at") or "",
+                )
+                for numero, comments in data.items()
+                for c in comments
+                if isinstance(c, dict)
+            ],
+            batch_size=1000,
+        )
+        _bump(f"{kind}_comments")
+
+
+def delete_comments(kind: str, numeros: List[str]) -> int:
+    """Borra los hilos de esos numeros; devuelve cuántos comentarios había."""
+    with transaction.atomic():
+        deleted = 0
+        for i in range(0, len(numeros), _IN_BATCH):
+            deleted += Comment.objects.filter(
+                kind=kind, numero__in=numeros[i : i + _IN_BATCH]
+            ).delete()[0]
+        if deleted:
+            _bump(f"{kind}_comments")
+        return deleted
+
+
+def _comment_dict(c: Comment) -> Dict:
+    return {
+        "id": c.comment_id,
+        "author": c.author,
+        "text": c.text,
+        "created_at": c.created_at,
+    }
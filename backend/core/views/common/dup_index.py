@@ -0,0 +1,368 @@
+# core/views/common/dup_index.py
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+from core.views.common import serialization, store
+from core.views.common.keys import match_key, norm
+
+# Índice de detección de duplicados (numero+idExterno, idExterno, numero ->
+# posición en el dataset) que se mantiene entre subidas en lugar de
+# reconstruirse sobre todo el histórico en cada una.
+#
+# - En memoria se guarda con la versión del dataset para la que vale y los
+#   escritores lo parchean (ver `_on_write`): altas al final de la lista y
+#   cambios que no tocan numero/idExterno no requieren reconstruirlo.
+# - En disco (`<fichero>.idx`) se guarda con la identidad del snapshot JSON
+#   (o el contador de BD) para no reconstruirlo al arrancar otro proceso. Los
+#   cambios que solo van al diario no mueven posiciones: las altas del diario
+#   se añaden al leerlo y, si alguno cambia una clave, el fichero se descarta.
+# - Se carga en diferido, en la primera subida que lo necesita.
+# - También lleva los ids en uso (ver `ids`), para asignar ids nuevos al
+#   guardar selecciones sin recorrer el dataset, y su posición (ver
+#   `resolve`), para los borrados.
+# - Las lápidas de los borrados (ver store.is_tombstone) no se indexan; un
+#   borrado quita las claves del registro sin reconstruir el índice, salvo
+#   que alguna tapara a otra fila con la misma clave.
+
+INDEX_SUFFIX = ".idx"
+
+
+class DuplicateIndex:
+    def __init__(self, version, rows: List, both=None, idext=None, num=None, ids=None):
+        self.version = version
+        self.rows = rows
+        self.count = len(rows)
+        self.both: Dict[Tuple[str, str], int] = both if both is not None else {}
+        self.idext: Dict[str, int] = idext if idext is not None else {}
+        self.num: Dict[str, int] = num if num is not None else {}
+        # (ids como texto, mayor id entero); se calcula al primer uso.
+        self._ids: Tuple[set, List[int]] | None = ids
+        # id como texto -> posición; también al primer uso. Puede quedar alguna
+        # entrada antigua: `resolve` comprueba el registro.
+        self._by_id: Dict[str, int] | None = None
+        # (tabla, clave) que en algún momento sustituyeron a otra posición;
+        # None si no se sabe (índice leído de disco).
+        self._shadowed: set | None = None
+
+    def ids(self) -> Tuple[set, int]:
+        """Ids en uso (como texto) y el mayor id entero (0 si no hay)."""
+        if self._ids is None:
+            self._ids = (set(), [0])
+            for rec in self.rows:
+                self._note_id(rec)
+        return self._ids[0], self._ids[1][0]
+
+    def _note_id(self, rec) -> None:
+        if self._ids is None or not isinstance(rec, dict):
+            return
+        used, top = self._ids
+        used.add(str(rec.get("id")))
+        try:
+            top[0] = max(top[0], int(rec.get("id")))
+        except (TypeError, ValueError):
+            pass
+
+    def resolve(self, idents: Iterable) -> List[int]:
+        """Posiciones (ordenadas) de los registros cuyo id o numero está en
+        `idents`; los que no existen se ignoran."""
+        if self._by_id is None:
+            self._by_id = {}
+            for pos, rec in enumerate(self.rows):
+                if isinstance(rec, dict) and not store.is_tombstone(rec):
+                    self._by_id[str(rec.get("id"))] = pos
+        found = set()
+        for ident in idents:
+            text = str(ident).strip()
+            pos = self._by_id.get(text)
+            if pos is not None and str(self.rows[pos].get("id")) == text:
+                found.add(pos)
+            pos = self.num.get(norm(text)) if text else None
+            if pos is not None and match_key(self.rows[pos])[0] == norm(text):
+                found.add(pos)
+        return sorted(found)
+
+    def _note_pos(self, pos: int, rec) -> None:
+        if self._by_id is not None and isinstance(rec, dict):
+            self._by_id[str(rec.get("id"))] = pos
+
+    def _copy_ids(self):
+        if self._ids is None:
+            return None
+        return set(self._ids[0]), list(self._ids[1])
+
+    def _tables(self, rec: Dict):
+        # (nombre, tabla, clave) en las que entra el registro.
+        key = match_key(rec)
+        out = [("both", self.both, key)]
+        if rec.get("idExterno"):
+            out.append(("idext", self.idext, key[1]))
+        if rec.get("numero"):
+            out.append(("num", self.num, key[0]))
+        return out
+
+    def add(self, pos: int, rec) -> None:
+        # Mismo criterio que build_indexes: gana la última fila con la clave.
+        if not isinstance(rec, dict) or store.is_tombstone(rec):
+            return
+        self._note_id(rec)
+        self._note_pos(pos, rec)
+        for name, table, key in self._tables(rec):
+            if self._shadowed is not None and table.get(key, pos) != pos:
+                self._shadowed.add((name, key))
+            table[key] = pos
+
+    def drop(self, pos: int, rec: Dict) -> bool:
+        """Quita las claves de `rec`, que ocupaba `pos`. False si no se puede
+        saber qué fila queda con alguna de ellas (hay que reconstruir)."""
+        if self._shadowed is None:
+            return False
+        tables = self._tables(rec)
+        if any((name, key) in self._shadowed for name, _, key in tables):
+            return False
+        for _, table, key in tables:
+            if table.get(key) == pos:
+                del table[key]
+        return True
+
+    def holds(self, pos: int, rec: Dict) -> bool:
+        """True si `rec` ocupa `pos` con la misma clave que ya tenía indexada."""
+        key = match_key(rec)
+        if self.both.get(key) != pos:
+            return False
+        if rec.get("idExterno") and self.idext.get(key[1]) != pos:
+            return False
+        if rec.get("numero") and self.num.get(key[0]) != pos:
+            return False
+        return True
+
+    def lookups(self) -> Tuple["RowLookup", "RowLookup", "RowLookup"]:
+        """(by_both, by_idext, by_num) con la forma que espera detect_duplicates."""
+        return (
+            RowLookup(self.both, self.rows),
+            RowLookup(self.idext, self.rows),
+            RowLookup(self.num, self.rows),
+        )
+
+
+class RowLookup(Mapping):
+    """clave -> registro, resuelto a través de las posiciones del índice.
+
+    Los registros son los compartidos de la cache (solo lectura).
+    """
+
+    def __init__(self, positions: Dict, rows: List):
+        self._positions = positions
+        self._rows = rows
+
+    def __getitem__(self, key):
+        return self._rows[self._positions[key]]
+
+    def __contains__(self, key) -> bool:
+        return key in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+
+_INDEXES: Dict[str, DuplicateIndex] = {}
+_LOCK = threading.RLock()
+
+
+def index_path(filename: str) -> Path:
+    path = store._resolve_data_file(filename)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _label(version):
+    # Lo que identifica en disco al índice: el snapshot (sin el diario) con
+    # ficheros JSON, el contador con la BD. En forma serializable.
+    if isinstance(version, tuple):
+        return list(version[0])
+    return version
+
+
+def _build(version, rows: List) -> DuplicateIndex:
+    idx = DuplicateIndex(version, rows)
+    idx._shadowed = set()
+    for pos, rec in enumerate(rows):
+        idx.add(pos, rec)
+    return idx
+
+
+def _read(filename: str, version, rows: List) -> DuplicateIndex | None:
+    path = index_path(filename)
+    try:
+        raw = serialization.read_file(path)
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(raw, dict)
+        or raw.get("label") != _label(version)
+        or not isinstance(raw.get("count"), int)
+        or raw["count"] > len(rows)
+    ):
+        return None
+    idx = DuplicateIndex(
+        version,
+        rows,
+        {(n, i): pos for n, i, pos in raw.get("both", [])},
+        raw.get("idext", {}),
+        raw.get("num", {}),
+    )
+    # Altas que solo están en el diario (posteriores al fichero del índice).
+    for pos in range(raw["count"], len(rows)):
+        idx.add(pos, rows[pos])
+    return idx
+
+
+def _persist(filename: str, idx: DuplicateIndex) -> None:
+    if idx.version is None:
+        return
+    payload = {
+        "label": _label(idx.version),
+        "count": idx.count,
+        "both": [[n, i, pos] for (n, i), pos in idx.both.items()],
+        "idext": idx.idext,
+        "num": idx.num,
+    }
+    store.write_json_atomic(index_path(filename), payload)
+
+
+def _discard(filename: str) -> None:
+    try:
+        index_path(filename).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def get_index(filename: str) -> DuplicateIndex:
+    """Índice vigente del dataset: memoria, disco o reconstrucción, por ese orden."""
+    version, rows = store.load_shared(filename)
+    if not isinstance(rows, list):
+        rows = [rows]
+    with _LOCK:
+        idx = _INDEXES.get(filename)
+        if idx is not None and idx.version == version and idx.rows is rows:
+            return idx
+        idx = _read(filename, version, rows)
+        if idx is None:
+            idx = _build(version, rows)
+            _persist(filename, idx)
+        _INDEXES[filename] = idx
+        return idx
+
+
+def _patched(idx: DuplicateIndex, version, rows: List, changed: List, removed: List):
+    """Índice para `rows` a partir de `idx`, o None si hay que reconstruirlo.
+
+    Vale si las filas nuevas están al final, las demás escritas siguen en su
+    posición con la misma clave (cambios de estado, sustituciones...) y los
+    numeros de `removed` han quedado como lápidas.
+    """
+    n = idx.count
+    if len(rows) < n:
+        return None
+    tail = {id(r) for r in rows[n:]}
+    if len(tail) != len(rows) - n or not tail <= {id(r) for r in changed}:
+        return None
+    gone = set()
+    for numero in removed:
+        pos = idx.num.get(norm(numero))
+        if pos is None or not store.is_tombstone(rows[pos]) or pos >= len(idx.rows):
+            return None
+        gone.add(pos)
+    if len(gone) != sum(1 for rec in changed if store.is_tombstone(rec)):
+        return None
+    for rec in changed:
+        if not isinstance(rec, dict) or id(rec) in tail or store.is_tombstone(rec):
+            continue
+        pos = idx.num.get(match_key(rec)[0])
+        # Con la BD las filas se releen, así que se compara por contenido.
+        if pos is None or not idx.holds(pos, rec) or rows[pos] != rec:
+            return None
+    if not tail and not gone:
+        patched = DuplicateIndex(version, rows, idx.both, idx.idext, idx.num)
+        patched._ids = idx._ids
+        patched._by_id = idx._by_id
+        patched._shadowed = idx._shadowed
+    else:
+        # Diccionarios nuevos: una subida en curso puede seguir leyendo los
+        # anteriores.
+        patched = DuplicateIndex(
+            version,
+            rows,
+            dict(idx.both),
+            dict(idx.idext),
+            dict(idx.num),
+            idx._copy_ids(),
+        )
+        if idx._by_id is not None:
+            patched._by_id = dict(idx._by_id)
+        if idx._shadowed is not None:
+            patched._shadowed = set(idx._shadowed)
+        for pos in gone:
+            if not patched.drop(pos, idx.rows[pos]):
+                return None
+        for pos in range(n, len(rows)):
+            patched.add(pos, rows[pos])
+    for rec in changed:
+        if store.is_tombstone(rec):
+            continue
+        patched._note_id(rec)
+        if isinstance(rec, dict) and id(rec) not in tail:
+            patched._note_pos(idx.num[match_key(rec)[0]], rec)
+    return patched
+
+
+def _on_write(
+    filename: str,
+    old_version,
+    new_version,
+    changed: Iterable[Dict] | None,
+    removed: Iterable[str] | None,
+) -> None:
+    if filename not in store.DATASETS:
+        return
+    changed = list(changed) if changed is not None else None
+    with _LOCK:
+        idx = _INDEXES.pop(filename, None)
+        version, rows = store.load_shared(filename)
+        if version != new_version or not isinstance(rows, list):
+            # Otro escritor ya pasó por delante: se rehace al usarlo.
+            return
+        if idx is None or idx.version != old_version:
+            if _label(old_version) != _label(new_version):
+                # Snapshot nuevo: el índice en disco ya no coincide y nadie
+                # lo está usando en este proceso.
+                return
+            # Solo cambió el diario: hay que comprobar el índice del disco.
+            idx = _read(filename, new_version, rows)
+            if idx is None:
+                return
+        same_label = _label(old_version) == _label(new_version)
+        patched = None
+        if changed is not None and removed is not None:
+            removed = list(removed)
+            patched = _patched(idx, new_version, rows, changed, removed)
+        if patched is not None and (same_label or isinstance(new_version, int)):
+            # Sin snapshot nuevo no se reescribe el fichero (sería O(n) por
+            # cada guardado). Con la BD el contador en disco queda atrás y el
+            # índice se rehace una vez en el siguiente arranque.
+            if removed:
+                # El del disco aún tiene las claves borradas.
+                _discard(filename)
+            _INDEXES[filename] = patched
+            return
+        if patched is None:
+            if same_label:
+                _discard(filename)
+            patched = _build(new_version, rows)
+        _INDEXES[filename] = patched
+        _persist(filename, patched)
+
+
+store.on_write(_on_write)
@@ -0,0 +1,108 @@
+# core/views/common/frames.py
+from typing import Dict
+import pandas as pd
+
+# Operaciones por columnas para preparar un bloque subido antes de pasarlo a
+# registros. Replican el saneado que antes se hacía fila a fila
+# (_is_nan_value, _sanitize_any, cálculo de dueDate) sin bucles en Python.
+# Las fechas se parsean con core.views.common.dates.parse_date_series.
+
+NAN_TOKENS = ("nan", "nat", "none", "null")
+
+# Días hasta dueDate según la prioridad (VIT y VUL); 365 si no está.
+HORIZON_BY_PRIORITY = {
+    "critical": 30,
+    "critico": 30,
+    "crítico": 30,
+    "high": 90,
+    "alto": 90,
+    "alta": 90,
+    "medium": 365,
+    "medio": 365,
+    "media": 365,
+    "low": 365,
+    "bajo": 365,
+    "baja": 365,
+}
+
+
+def _scalar_to_text(v):
+    if isinstance(v, (dict, list, bool, int, float)):
+        return v
+    return str(v)
+
+
+def _clean_column(col: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(col):
+        return col
+    if pd.api.types.is_numeric_dtype(col):
+        if col.isna().any():
+            return col.astype(object).where(col.notna(), "")
+        return col
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return (
+            col.dt.strftime("%Y-%m-%d %H:%M:%S").astype(object).where(col.notna(), "")
+        )
+
+    s = col.astype(object)
+    present = s.notna()
+    if not present.any():
+        return pd.Series("", index=s.index, dtype=object)
+    try:
+        stripped = s.str.strip()
+    except AttributeError:
+        # Ningún valor es texto (p. ej. solo fechas en una columna object).
+        stripped = pd.Series(float("nan"), index=s.index, dtype=object)
+    is_text = stripped.notna()
+    others = present & ~is_text
+    if others.any():
+        s = s.copy()
+        # Sin pasar por Series.map, que convertiría los int a float.
+        s[others] = pd.Series(
+            [_scalar_to_text(v) for v in s[others]],
+            index=s.index[others],
+            dtype=object,
+        )
+    token = is_text & stripped.str.lower().isin(NAN_TOKENS)
+    return s.where(present & ~token, "")
+
+
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Vacíos (NaN, NaT, None, "nan", "none", "null") a "" y valores que no
+    sean bool/int/float/dict/list a texto, columna a columna."""
+    out = df.copy()
+    for i in range(df.shape[1]):
+        out.isetitem(i, _clean_column(df.iloc[:, i]))
+    return out
+
+
+def strip_accents(col: pd.Series) -> pd.Series:
+    """Minúsculas, sin espacios en los extremos y sin tildes (como _norm)."""
+    return (
+        col.astype(object)
+        .where(col.notna(), "")
+        .astype(str)
+        .str.strip()
+        .str.lower()
+        .str.normalize("NFD")
+        .str.replace("[\u0300-\u036f]", "", regex=True)
+    )
+
+
+def horizon_days(
+    prioridad: pd.Series,
+    horizons: Dict[str, int] = HORIZON_BY_PRIORITY,
+    normalize_accents: bool = False,
+) -> pd.Series:
+    if normalize_accents:
+        key = strip_accents(prioridad)
+    else:
+        key = prioridad.astype(object).where(prioridad.notna(), "").astype(str)
+        key = key.str.strip().str.lower()
+    return key.map(horizons).fillna(365).astype(int)
+
+
+def due_dates(base: pd.Series, days: pd.Series) -> pd.Series:
+    """base + días como "YYYY-MM-DD"; "" donde no hay base."""
+    due = (base + pd.to_timedelta(days, unit="D")).dt.strftime("%Y-%m-%d")
+    return due.astype(object).where(base.notna(), "")
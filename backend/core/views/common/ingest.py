@@ -0,0 +1,151 @@
+# core/views/common/ingest.py
+import csv
+from pathlib import Path
+from typing import Iterator, List
+import pandas as pd
+from django.conf import settings
+
+# Filas por bloque al leer un Excel subido. Cada bloque pasa entero por
+# normalización y detección de duplicados antes de leer el siguiente, así que
+# la memoria pico depende de este valor y no del tamaño del fichero.
+UPLOAD_CHUNK_ROWS = getattr(settings, "VMT_UPLOAD_CHUNK_ROWS", 5000)
+
+
+def _header_names(raw) -> List[str]:
+    # Mismos nombres que daría pd.read_excel: "Unnamed: i" para celdas vacías
+    # y sufijo ".n" para columnas repetidas.
+    names: List[str] = []
+    seen: dict[str, int] = {}
+    for i, value in enumerate(raw):
+        name = f"Unnamed: {i}" if value is None or str(value).strip() == "" else value
+        name = str(name) if not isinstance(name, str) else name
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def iter_excel_frames(file, chunk_rows: int | None = None) -> Iterator[pd.DataFrame]:
+    """Lee la primera hoja en modo read_only y la entrega en DataFrames.
+
+    La primera fila no vacía es la cabecera. Las filas totalmente vacías se
+    descartan. Si la hoja tiene cabecera pero ningún dato se entrega un único
+    DataFrame vacío con esas columnas; si no tiene nada, no se entrega ninguno.
+    """
+    from openpyxl import load_workbook
+
+    chunk_rows = chunk_rows or UPLOAD_CHUNK_ROWS
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        columns = None
+        rows = []
+        emitted = False
+        for row in ws.iter_rows(values_only=True):
+            if all(v is None or (isinstance(v, str) and not v.strip()) for v in row):
+                continue
+            if columns is None:
+                columns = _header_names(row)
+                continue
+            row = list(row[: len(columns)])
+            row.extend([None] * (len(columns) - len(row)))
+            rows.append(row)
+            if len(rows) >= chunk_rows:
+                yield pd.DataFrame(rows, columns=columns)
+                emitted = True
+                rows = []
+        if columns is not None and (rows or not emitted):
+            yield pd.DataFrame(rows, columns=columns)
+    finally:
+        wb.close()
+
+
+# Formatos admitidos en las subidas. CSV y Parquet se leen por columnas
+# (parser C de pandas / pyarrow), mucho más rápido que openpyxl celda a celda.
+UPLOAD_FORMATS = ("xlsx", "csv", "parquet")
+
+_EXTENSIONS = {
+    ".xlsx": "xlsx",
+    ".xlsm": "xlsx",
+    ".csv": "csv",
+    ".txt": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+
+def detect_format(file) -> str:
+    """Formato por extensión y, si no es concluyente, por la firma del fichero."""
+    ext = Path(str(getattr(file, "name", "") or "")).suffix.lower()
+    if ext in _EXTENSIONS:
+        return _EXTENSIONS[ext]
+    head = file.read(4)
+    file.seek(0)
+    if head == b"PAR1":
+        return "parquet"
+    if head[:2] == b"PK":
+        return "xlsx"
+    return "csv"
+
+
+def _sniff_delimiter(sample: str) -> str:
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+def iter_csv_frames(file, chunk_rows: int | None = None) -> Iterator[pd.DataFrame]:
+    """CSV por bloques con el parser C de pandas (UTF-8, con o sin BOM).
+
+    El separador (",", ";", tabulador o "|") se deduce de las primeras líneas.
+    Todo se lee como texto para no perder ceros a la izquierda en numero o
+    idExterno; las celdas vacías llegan como NaN, igual que desde Excel.
+    """
+    chunk_rows = chunk_rows or UPLOAD_CHUNK_ROWS
+    sample = file.read(64 * 1024)
+    file.seek(0)
+    if isinstance(sample, bytes):
+        sample = sample.decode("utf-8-sig", errors="replace")
+    if not sample.strip():
+        return
+    with pd.read_csv(
+        file,
+        sep=_sniff_delimiter(sample),
+        encoding="utf-8-sig",
+        dtype=str,
+        chunksize=chunk_rows,
+    ) as reader:
+        yield from reader
+
+
+def iter_parquet_frames(file, chunk_rows: int | None = None) -> Iterator[pd.DataFrame]:
+    """Parquet por row groups/lotes con pyarrow (dependencia opcional)."""
+    import pyarrow.parquet as pq
+
+    chunk_rows = chunk_rows or UPLOAD_CHUNK_ROWS
+    pf = pq.ParquetFile(file)
+    emitted = False
+    for batch in pf.iter_batches(batch_size=chunk_rows):
+        emitted = True
+        yield batch.to_pandas()
+    if not emitted:
+        yield pf.schema_arrow.empty_table().to_pandas()
+
+
+_READERS = {
+    "xlsx": iter_excel_frames,
+    "csv": iter_csv_frames,
+    "parquet": iter_parquet_frames,
+}
+
+
+def iter_upload_frames(file, chunk_rows: int | None = None) -> Iterator[pd.DataFrame]:
+    """Fichero subido (xlsx, csv o parquet) como DataFrames por bloques.
+
+    Mismo contrato que iter_excel_frames para los tres formatos.
+    """
+    return _READERS[detect_format(file)](file, chunk_rows)
@@ -0,0 +1,148 @@
+# core/views/common/jobs.py
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+from django.conf import settings
+from core.views.common import serialization
+from core.views.common.serialization import JsonResponse
+from core.views.common.store import DATA_DIR, write_json_atomic
+
+# Subidas en segundo plano. La petición solo vuelca el fichero a disco y
+# devuelve un id; el proceso (lectura, duplicados, fusión) corre en un pool
+# acotado de hilos. El estado de cada trabajo se guarda en
+# DATA_DIR/jobs/<id>.json, así que cualquier worker puede consultarlo.
+
+UPLOAD_WORKERS = getattr(settings, "VMT_UPLOAD_WORKERS", 2)
+
+# Segundos que se conserva el estado de un trabajo terminado.
+JOB_TTL_SECONDS = getattr(settings, "VMT_UPLOAD_JOB_TTL", 24 * 3600)
+
+JOBS_DIR = DATA_DIR / "jobs"
+
+# Etapas que recorre un trabajo, en orden.
+STAGES = ("queued", "parsing", "comparing", "merging", "done")
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+
+# (fichero abierto, progress) -> (payload, status HTTP)
+UploadRunner = Callable[..., Tuple[Dict, int]]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=max(1, UPLOAD_WORKERS), thread_name_prefix="vmt-upload"
+            )
+        return _EXECUTOR
+
+
+def wants_async(request) -> bool:
+    value = request.GET.get("async") or request.POST.get("async") or ""
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
+def _state_path(job_id: str) -> Path:
+    return JOBS_DIR / f"{job_id}.json"
+
+
+def _save(state: Dict) -> None:
+    state["updatedAt"] = _now()
+    write_json_atomic(_state_path(state["jobId"]), state)
+
+
+def get_job(job_id: str) -> Dict | None:
+    if not _ID_RE.match(str(job_id)):
+        return None
+    try:
+        return serialization.read_file(_state_path(job_id))
+    except (OSError, ValueError):
+        return None
+
+
+def _purge_expired() -> None:
+    cutoff = time.time() - JOB_TTL_SECONDS
+    for path in JOBS_DIR.glob("*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def _run(state: Dict, spool: Path, run: UploadRunner) -> None:
+    def progress(stage: str, rows: int | None = None) -> None:
+        state["stage"] = stage
+        if rows is not None:
+            state["rowsProcessed"] = rows
+        _save(state)
+
+    state["status"] = "running"
+    try:
+        with spool.open("rb") as f:
+            payload, status = run(f, progress)
+        state["status"] = "done" if status < 400 else "failed"
+        state["result"] = payload
+        state["httpStatus"] = status
+    except Exception as e:
+        state["status"] = "failed"
+        state["result"] = {"error": str(e)}
+        state["httpStatus"] = 400
+    finally:
+        state["stage"] = "done"
+        try:
+            spool.unlink()
+        except FileNotFoundError:
+            pass
+        _save(state)
+
+
+def submit(kind: str, upload, run: UploadRunner) -> Dict:
+    """Vuelca `upload` a disco y encola `run`; devuelve el estado inicial."""
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    _purge_expired()
+    job_id = uuid.uuid4().hex
+    # Se conserva la extensión original: detect_format la usa.
+    suffix = Path(str(getattr(upload, "name", "") or "")).suffix.lower()
+    spool = JOBS_DIR / f"{job_id}.upload{suffix}"
+    with spool.open("wb") as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+    state = {
+        "jobId": job_id,
+        "kind": kind,
+        "status": "queued",
+        "stage": "queued",
+        "rowsProcessed": 0,
+        "createdAt": _now(),
+        "result": None,
+        "httpStatus": None,
+    }
+    _save(state)
+    _executor().submit(_run, dict(state), spool, run)
+    return state
+
+
+def job_status_response(request, kind: str, job_id: str):
+    """Respuesta del endpoint de estado (sin cabeceras CORS)."""
+    if request.method == "OPTIONS":
+        return JsonResponse({"message": "Preflight OK"})
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    state = get_job(job_id)
+    if state is None or state.get("kind") != kind:
+        return JsonResponse({"error": "Job not found"}, status=404)
+    return JsonResponse(state)
@@ -0,0 +1,102 @@
+# core/views/common/journal.py
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+from core.views.common.serialization import dumps, loads
+
+# Diario append-only de cambios sobre un fichero JSON. Cada línea es un commit:
+# {"base": <identidad del snapshot>, "records": [[posición, {...}], ...]} con
+# los registros completos tras el cambio. Una posición igual a la longitud
+# actual añade el registro al final. Las líneas se aplican en orden, así que
+# reaplicar el diario sobre el snapshot es idempotente; una línea a medio
+# escribir tras una caída se descarta entera.
+# Las líneas cuyo "base" no coincide con el snapshot actual pertenecen a un
+# snapshot anterior (ya compactado o reescrito) y se ignoran. Las líneas
+# antiguas {"base", "numero", "record"} sustituyen el primer registro con ese
+# numero.
+# Un registro borrado se sustituye por una lápida en su posición (ver
+# store.TOMBSTONE_FIELD), así que las posiciones no cambian hasta compactar.
+# Otros ficheros (ver relations.py) usan el mismo mecanismo con sus propias
+# líneas a través de append_entry y entries. Las líneas de un commit de varios
+# ficheros llevan además su "tx" (ver txlog.py).
+
+
+def journal_path(data_path: Path) -> Path:
+    return data_path.with_name(data_path.name + ".journal")
+
+
+def append_entry(data_path: Path, entry: Dict, sync: bool = True) -> None:
+    """Añade una línea con `entry` (que debe llevar su "base").
+
+    Sin `sync` la línea no espera a disco: dentro de un commit de varios
+    ficheros el fsync lo hace el manifiesto (ver txlog.py).
+    """
+    with journal_path(data_path).open("ab") as f:
+        f.write(dumps(entry) + b"\n")
+        f.flush()
+        if sync:
+            os.fsync(f.fileno())
+
+
+def records_entry(base_key, records: Iterable[Tuple[int, Dict]]) -> Dict:
+    """Línea con los `(posición, registro)` escritos sobre el snapshot `base_key`."""
+    return {"base": list(base_key), "records": [list(r) for r in records]}
+
+
+def _first_positions(data: List[Dict]) -> Dict[str, int]:
+    positions: Dict[str, int] = {}
+    for i, item in enumerate(data):
+        if isinstance(item, dict):
+            positions.setdefault(str(item.get("numero") or "").strip(), i)
+    return positions
+
+
+def entries(data_path: Path, base_key) -> Iterator[Dict]:
+    """Líneas del diario que pertenecen al snapshot `base_key`, en orden."""
+    path = journal_path(data_path)
+    if not path.exists():
+        return
+    base = list(base_key)
+    with path.open("rb") as f:
+        for raw in f:
+            try:
+                entry = loads(raw)
+            except ValueError:
+                # Última línea a medio escribir tras una caída.
+                continue
+            if entry.get("base") == base:
+                yield entry
+
+
+def replay(data_path: Path, base_key, data: List[Dict]) -> List[Dict]:
+    # numero -> primera posición; solo para las líneas antiguas.
+    by_numero: Dict[str, int] | None = None
+    for entry in entries(data_path, base_key):
+        if "records" in entry:
+            for pos, record in entry["records"]:
+                if pos < len(data):
+                    data[pos] = record
+                elif pos == len(data):
+                    data.append(record)
+            by_numero = None
+            continue
+        if by_numero is None:
+            by_numero = _first_positions(data)
+        pos = by_numero.get(str(entry.get("numero")))
+        if pos is not None:
+            data[pos] = entry.get("record")
+    return data
+
+
+def size(data_path: Path) -> int:
+    try:
+        return journal_path(data_path).stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def discard(data_path: Path) -> None:
+    try:
+        journal_path(data_path).unlink()
+    except FileNotFoundError:
+        pass
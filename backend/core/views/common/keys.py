@@ -0,0 +1,64 @@
+# core/views/common/keys.py
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, Tuple
+
+# Clave de coincidencia de un registro: (numero, idExterno) normalizados
+# (sin espacios en los extremos, minúsculas y sin tildes). Se calcula al
+# escribir y se guarda en el propio registro, de modo que la detección de
+# duplicados y el guardado de selecciones no vuelven a normalizar el dataset
+# existente en cada petición. Es un campo interno: no sale por la API.
+MATCH_KEY_FIELD = "_matchKey"
+
+MatchKey = Tuple[str, str]
+
+
+@lru_cache(maxsize=65536)
+def _norm_text(s: str) -> str:
+    s = s.strip().lower()
+    return "".join(
+        c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn"
+    )
+
+
+def norm(value) -> str:
+    """Normalización de las claves (la de los antiguos `_norm`), memorizada."""
+    if value is None:
+        return ""
+    return _norm_text(str(value))
+
+
+def compute_match_key(record: Dict) -> MatchKey:
+    return (norm(record.get("numero", "")), norm(record.get("idExterno", "")))
+
+
+def match_key(record: Dict) -> MatchKey:
+    """Clave guardada en el registro; se calcula si no la tiene."""
+    stored = record.get(MATCH_KEY_FIELD)
+    if isinstance(stored, list) and len(stored) == 2:
+        return stored[0], stored[1]
+    return compute_match_key(record)
+
+
+def stamp(record: Dict) -> MatchKey:
+    """(Re)calcula la clave del registro y la guarda en él."""
+    key = compute_match_key(record)
+    record[MATCH_KEY_FIELD] = list(key)
+    return key
+
+
+def stamp_records(rows, changed: Iterable[Dict] | None = None) -> None:
+    """Recalcula la clave de `changed` y la añade a las filas que no la tengan."""
+    for r in changed or ():
+        if isinstance(r, dict):
+            stamp(r)
+    if not isinstance(rows, list):
+        return
+    for r in rows:
+        if isinstance(r, dict) and MATCH_KEY_FIELD not in r:
+            stamp(r)
+
+
+def strip_match_key(record: Dict) -> Dict:
+    record.pop(MATCH_KEY_FIELD, None)
+    return record
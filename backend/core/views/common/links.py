@@ -0,0 +1,190 @@
+# core/views/common/links.py
+import threading
+from typing import Dict, Iterable
+from core.views.common import relations, store
+from core.views.VIT.risk_logic import link_payload as vul_link_payload
+from core.views.VUL.risk_logic import link_payload as vit_link_payload
+
+VIT_FILE = "CSIRT/vit_Data.json"
+VUL_FILE = "CSIRT/vul_Data.json"
+_KIND_BY_FILE = {VIT_FILE: "vit", VUL_FILE: "vul"}
+
+
+def _key(numero) -> str:
+    return str(numero if numero is not None else "").strip().lower()
+
+
+class LinkView:
+    """Estado de enlaces VIT↔VUL materializado para los listados.
+
+    Guarda las copias saneadas que se incrustan en vulData/vitsData; los
+    enlaces salen del conjunto de aristas (ver core.views.common.relations),
+    de modo que un listado solo hace búsquedas por clave. Los escritores la
+    parchean registro a registro (ver `_on_write`).
+    """
+
+    def __init__(self, versions: Dict[str, object], edges: relations.EdgeSet):
+        self.versions = dict(versions)
+        self.edges = edges
+        self._lock = threading.RLock()
+        self.vit_rows: Dict[str, Dict] = {}
+        self.vul_rows: Dict[str, Dict] = {}
+        # clave -> vulData / vitsData con el campo de enlace ya pintado
+        self._vul_data: Dict[str, Dict] = {}
+        self._vit_data: Dict[str, Dict] = {}
+
+    def relink(self, edges: relations.EdgeSet) -> None:
+        """Cambió el conjunto de aristas: se vacían los datos ya pintados."""
+        with self._lock:
+            if self.edges is edges and self.versions["relations"] == edges.version:
+                return
+            self.edges = edges
+            self.versions["relations"] = edges.version
+            self._vul_data.clear()
+            self._vit_data.clear()
+
+    def put_vit(self, rec: Dict) -> None:
+        key = _key(rec.get("numero"))
+        with self._lock:
+            self.vit_rows[key] = vit_link_payload(rec)
+            self._vit_data.pop(key, None)
+
+    def drop_vit(self, numero) -> None:
+        key = _key(numero)
+        with self._lock:
+            self.vit_rows.pop(key, None)
+            self._vit_data.pop(key, None)
+
+    def put_vul(self, rec: Dict) -> None:
+        key = _key(rec.get("numero"))
+        with self._lock:
+            self.vul_rows[key] = vul_link_payload(rec)
+            self._vul_data.pop(key, None)
+
+    def drop_vul(self, numero) -> None:
+        key = _key(numero)
+        with self._lock:
+            self.vul_rows.pop(key, None)
+            self._vul_data.pop(key, None)
+
+    def vul_data(self, key: str) -> Dict | None:
+        cached = self._vul_data.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            base = self.vul_rows.get(key)
+            if base is None:
+                return None
+            payload = dict(base)
+            # El texto declarado tal cual y, detrás, los VITs que apuntan al
+            # VUL sin estar en él; hasLink solo mira lo que declara el VUL.
+            declared = self.edges.vits_of(key)
+            extra = self.edges.linked_vits(key)[len(declared) :]
+            text = self.edges.vits_text(key)
+            payload["vits"] = relations.join_vits(([text] if text else []) + extra)
+            payload["hasLink"] = bool(declared)
+            self._vul_data[key] = payload
+            return payload
+
+    def vit_data(self, key: str) -> Dict | None:
+        cached = self._vit_data.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            base = self.vit_rows.get(key)
+            if base is None:
+                return None
+            payload = relations.render("vit", dict(base), self.edges)
+            self._vit_data[key] = payload
+            return payload
+
+    def vits_data(self, vul: Dict) -> list:
+        """vitsData de un VUL: sus VITs declarados que existen, en orden."""
+        found = (self.vit_data(_key(v)) for v in self.edges.vits_of(vul.get("numero")))
+        return [v for v in found if v is not None]
+
+    def has_vit(self, numero) -> bool:
+        return _key(numero) in self.vit_rows
+
+    def has_vul(self, numero) -> bool:
+        return _key(numero) in self.vul_rows
+
+    def vit_has_link(self, vit: Dict) -> bool:
+        return _key(self.edges.vul_of(vit.get("numero"))) in self.vul_rows
+
+    def vul_has_link(self, vul: Dict) -> bool:
+        return any(
+            _key(v) in self.vit_rows for v in self.edges.vits_of(vul.get("numero"))
+        )
+
+
+_VIEW: LinkView | None = None
+_LOCK = threading.Lock()
+
+
+def get_view() -> LinkView:
+    """Vista vigente; se reconstruye entera solo si otro proceso escribió."""
+    global _VIEW
+    edges = relations.get_edges()
+    versions = {
+        "vit": store.dataset_version(VIT_FILE),
+        "vul": store.dataset_version(VUL_FILE),
+        "relations": edges.version,
+    }
+    view = _VIEW
+    if view is not None and view.versions == versions and view.edges is edges:
+        return view
+    with _LOCK:
+        view = _VIEW
+        if view is not None and all(
+            view.versions.get(k) == versions[k] for k in ("vit", "vul")
+        ):
+            view.relink(edges)
+            return view
+        vit_version, vit_data = store.load_shared(VIT_FILE)
+        vul_version, vul_data = store.load_shared(VUL_FILE)
+        view = LinkView(
+            {"vit": vit_version, "vul": vul_version, "relations": edges.version},
+            edges,
+        )
+        for vul in vul_data if isinstance(vul_data, list) else [vul_data]:
+            if isinstance(vul, dict) and not store.is_tombstone(vul):
+                view.put_vul(vul)
+        for vit in vit_data if isinstance(vit_data, list) else [vit_data]:
+            if isinstance(vit, dict) and not store.is_tombstone(vit):
+                view.put_vit(vit)
+        _VIEW = view
+        return view
+
+
+def _on_write(
+    filename: str,
+    old_version,
+    new_version,
+    changed: Iterable[Dict] | None,
+    removed: Iterable[str] | None,
+) -> None:
+    global _VIEW
+    kind = _KIND_BY_FILE.get(filename)
+    if kind is None:
+        return
+    with _LOCK:
+        view = _VIEW
+        if view is None:
+            return
+        if changed is None or removed is None or view.versions.get(kind) != old_version:
+            _VIEW = None
+            return
+        if kind == "vit":
+            put, drop = view.put_vit, view.drop_vit
+        else:
+            put, drop = view.put_vul, view.drop_vul
+        for numero in removed:
+            drop(numero)
+        for rec in changed:
+            if isinstance(rec, dict) and not store.is_tombstone(rec):
+                put(rec)
+        view.versions[kind] = new_version
+
+
+store.on_write(_on_write)
@@ -0,0 +1,110 @@
+# core/views/common/locks.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Cerrojos de escritura por fichero de datos, válidos entre procesos (varios
+# workers de gunicorn/uvicorn). Cada fichero tiene un "<nombre>.lock" al lado;
+# los lectores nunca lo toman y siguen viendo el último snapshot publicado con
+# os.replace.
+#
+# Dentro de un proceso el cerrojo es reentrante por hilo, así que un view
+# puede envolver todo su read-modify-write y llamar igualmente a
+# save_json_data / update_record, que también lo piden (ver
+# store.dataset_lock).
+
+_LOCAL = threading.local()
+_THREAD_LOCKS: dict[Path, threading.RLock] = {}
+_THREAD_LOCKS_GUARD = threading.Lock()
+
+
+def lock_path(data_path: Path) -> Path:
+    return data_path.with_name(data_path.name + ".lock")
+
+
+def _thread_lock(path: Path) -> threading.RLock:
+    with _THREAD_LOCKS_GUARD:
+        lock = _THREAD_LOCKS.get(path)
+        if lock is None:
+            lock = _THREAD_LOCKS[path] = threading.RLock()
+        return lock
+
+
+def _lock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK se rinde tras ~10 s; se sigue esperando.
+            time.sleep(0.05)
+
+
+def _unlock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _hold(path: Path):
+    held = getattr(_LOCAL, "held", None)
+    if held is None:
+        held = _LOCAL.held = {}
+    if path in held:
+        held[path] += 1
+        try:
+            yield
+        finally:
+            held[path] -= 1
+        return
+
+    tlock = _thread_lock(path)
+    with tlock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _lock_fd(fd)
+            held[path] = 1
+            try:
+                yield
+            finally:
+                del held[path]
+                _unlock_fd(fd)
+        finally:
+            os.close(fd)
+
+
+@contextmanager
+def locked(*data_paths: Path):
+    """Bloqueo exclusivo de escritura sobre uno o varios ficheros de datos.
+
+    Los cerrojos se toman siempre en el mismo orden para que dos escritores
+    que tocan VIT y VUL a la vez no se bloqueen mutuamente.
+    """
+    paths = sorted({lock_path(Path(p)) for p in data_paths})
+    with _acquire(paths):
+        yield
+
+
+@contextmanager
+def _acquire(paths: list[Path]):
+    if not paths:
+        yield
+        return
+    with _hold(paths[0]):
+        with _acquire(paths[1:]):
+            yield
@@ -0,0 +1,139 @@
+# core/views/common/query.py
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+# Filtros de igualdad (sin distinguir mayúsculas); admiten varios valores
+# separados por comas: ?estado=Abierto,En curso
+FILTER_FIELDS = ("estado", "prioridad", "grupoAsignacion", "asignadoA")
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 5000
+
+_RANGE_PARAMS = ("dueFrom", "dueTo")
+_OTHER_PARAMS = ("page", "limit", "sort", "hasLink")
+
+
+def _s(v: Any) -> str:
+    return "" if v is None else str(v).strip()
+
+
+def _parse_day(value: str, name: str) -> str:
+    try:
+        return datetime.strptime(value.strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"'{name}' must be YYYY-MM-DD")
+
+
+def _parse_int(value: str, name: str, minimum: int) -> int:
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer")
+    if n < minimum:
+        raise ValueError(f"'{name}' must be >= {minimum}")
+    return n
+
+
+def parse_list_params(params) -> Dict | None:
+    """Lee los parámetros de consulta del listado.
+
+    Devuelve None si la petición no usa ninguno, para mantener la respuesta
+    clásica (lista completa). Lanza ValueError con valores inválidos.
+    """
+    known = set(FILTER_FIELDS) | set(_RANGE_PARAMS) | set(_OTHER_PARAMS)
+    if not known & set(params.keys()):
+        return None
+
+    filters = {}
+    for field in FILTER_FIELDS:
+        raw = params.get(field)
+        if raw:
+            values = {v.strip().lower() for v in raw.split(",") if v.strip()}
+            if values:
+                filters[field] = values
+
+    has_link = None
+    if params.get("hasLink"):
+        flag = params["hasLink"].strip().lower()
+        if flag not in ("true", "false", "1", "0"):
+            raise ValueError("'hasLink' must be true or false")
+        has_link = flag in ("true", "1")
+
+    sort_keys: List[Tuple[str, bool]] = []
+    for token in (params.get("sort") or "").split(","):
+        token = token.strip()
+        if token:
+            desc = token.startswith("-")
+            sort_keys.append((token.lstrip("-+"), desc))
+
+    due_from = params.get("dueFrom")
+    due_to = params.get("dueTo")
+    paginate = "page" in params or "limit" in params
+    page, limit = 1, None
+    if paginate:
+        page = _parse_int(params.get("page", "1"), "page", 1)
+        limit = min(
+            _parse_int(params.get("limit", DEFAULT_LIMIT), "limit", 1), MAX_LIMIT
+        )
+    return {
+        "filters": filters,
+        "has_link": has_link,
+        "due_from": _parse_day(due_from, "dueFrom") if due_from else None,
+        "due_to": _parse_day(due_to, "dueTo") if due_to else None,
+        "sort": sort_keys,
+        "paginate": paginate,
+        "page": page,
+        "limit": limit,
+    }
+
+
+def _matches(row: Dict, q: Dict) -> bool:
+    for field, values in q["filters"].items():
+        if _s(row.get(field)).lower() not in values:
+            return False
+    if q["has_link"] is not None and bool(row.get("hasLink")) != q["has_link"]:
+        return False
+    if q["due_from"] or q["due_to"]:
+        due = _s(row.get("dueDate"))[:10]
+        if not due:
+            return False
+        if q["due_from"] and due < q["due_from"]:
+            return False
+        if q["due_to"] and due > q["due_to"]:
+            return False
+    return True
+
+
+def _sort_value(v: Any) -> Tuple:
+    # Números antes que texto para no comparar tipos mezclados.
+    if isinstance(v, bool):
+        return (0, int(v), "")
+    if isinstance(v, (int, float)):
+        return (0, v, "")
+    return (1, 0, str(v).strip().lower())
+
+
+def apply_list_params(rows: List[Dict], q: Dict) -> Tuple[List[Dict], int]:
+    """Filtra, ordena y pagina. Devuelve (filas de la página, total filtrado)."""
+    out = [r for r in rows if isinstance(r, dict) and _matches(r, q)]
+    # Orden estable: se aplica de la última clave a la primera, dejando los
+    # vacíos siempre al final.
+    for field, desc in reversed(q["sort"]):
+        empties = [r for r in out if r.get(field) in (None, "")]
+        filled = [r for r in out if r.get(field) not in (None, "")]
+        filled.sort(key=lambda r: _sort_value(r.get(field)), reverse=desc)
+        out = filled + empties
+    total = len(out)
+    if q["paginate"]:
+        start = (q["page"] - 1) * q["limit"]
+        out = out[start : start + q["limit"]]
+    return out, total
+
+
+def paginated_payload(rows: List[Dict], total: int, q: Dict) -> Dict:
+    return {
+        "results": rows,
+        "count": total,
+        "page": q["page"],
+        "limit": q["limit"],
+    }
@@ -0,0 +1,436 @@
+# core/views/common/relations.py
+import threading
+from typing import Dict, Iterable, List, Tuple
+from core.views.common import db_store, journal, serialization, store
+
+# Enlaces VIT↔VUL como conjunto de aristas normalizado, en lugar de los campos
+# de texto `vul` (en cada VIT) y `vits` (lista separada por comas en cada VUL).
+# Cada lado declara sus propios enlaces, como hacían esos campos:
+#
+# - origen "vit": un VIT apunta a un VUL (o a ninguno);
+# - origen "vul": un VUL lista cero o más VITs, sin repetidos y en orden.
+#
+# Del lado VUL se guarda además el texto `vits` tal como llegó ("VIT-1, VIT-9")
+# para devolverlo sin normalizar; relations.json lo escribe en lugar de la
+# lista cuando difiere de `join_vits`. La tabla VitVulRelation solo guarda las
+# aristas, así que con sqlite el texto se vuelve a unir con `join_vits`.
+#
+# Las claves son los numeros normalizados (strip + minúsculas) y se guarda el
+# numero tal cual para mostrarlo. Los registros de los datasets ya no llevan
+# esos campos: se separan al escribir (`take_links`) y los views los vuelven a
+# pintar al responder (`render`).
+#
+# Con ficheros JSON el conjunto vive en CSIRT/relations.json ({"vit": {VIT:
+# VUL}, "vul": {VUL: [VITs]}}) y cada commit añade al diario las declaraciones
+# que cambian; con sqlite, en la tabla VitVulRelation. La primera lectura sin
+# relations.json lo crea a partir de los campos de los registros.
+
+RELATIONS_FILE = "CSIRT/relations.json"
+
+VIT_FILE = "CSIRT/vit_Data.json"
+VUL_FILE = "CSIRT/vul_Data.json"
+
+# Campo de cada dataset que declara el enlace con el otro lado.
+LINK_FIELD = {"vit": "vul", "vul": "vits"}
+
+_DB_NAME = "relations"
+
+
+def key(numero) -> str:
+    return clean(numero).lower()
+
+
+def clean(v) -> str:
+    if v is None or (isinstance(v, float) and v != v):
+        return ""
+    t = str(v).strip()
+    return "" if t.lower() in ("nan", "none", "null") else t
+
+
+def split_vits(raw) -> List[str]:
+    """Numeros de un campo `vits` ("A, B,,C"), sin vacíos."""
+    return [c for c in (s.strip() for s in clean(raw).split(",")) if c]
+
+
+def join_vits(numeros: Iterable[str]) -> str:
+    return ",".join(numeros)
+
+
+class EdgeSet:
+    """Aristas VIT↔VUL con índices por extremo; todas las consultas son por
+    clave. El conjunto publicado no se modifica: `commit` trabaja sobre una
+    copia y la publica al cerrarse el commit."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self._lock = threading.RLock()
+        # clave VIT -> (numero VIT, numero VUL) declarado por el VIT
+        self._vit_decl: Dict[str, Tuple[str, str]] = {}
+        # clave VUL -> (numero VUL, {clave VIT: numero VIT}, texto `vits`)
+        # declarados por el VUL
+        self._vul_decl: Dict[str, Tuple[str, Dict[str, str], str]] = {}
+        # clave VUL -> {clave VIT: numero VIT} de los VIT que lo declaran
+        self._referrers: Dict[str, Dict[str, str]] = {}
+        # clave VIT -> {clave VUL: numero VUL} de los VUL que lo listan
+        self._listed_in: Dict[str, Dict[str, str]] = {}
+
+    def copy(self) -> "EdgeSet":
+        with self._lock:
+            other = EdgeSet(self.version)
+            other._vit_decl = dict(self._vit_decl)
+            # Las declaraciones de VUL se sustituyen enteras; los índices por
+            # extremo se modifican en sitio y se copian un nivel más.
+            other._vul_decl = dict(self._vul_decl)
+            other._referrers = {k: dict(v) for k, v in self._referrers.items()}
+            other._listed_in = {k: dict(v) for k, v in self._listed_in.items()}
+        return other
+
+    def set_vul(self, vit_num, vul_num) -> None:
+        """Sustituye la declaración del VIT; un VUL vacío la elimina."""
+        vit_num, vul_num = clean(vit_num), clean(vul_num)
+        vit_key = vit_num.lower()
+        if not vit_key:
+            return
+        with self._lock:
+            old = self._vit_decl.pop(vit_key, None)
+            if old:
+                refs = self._referrers.get(old[1].lower(), {})
+                refs.pop(vit_key, None)
+                if not refs:
+                    self._referrers.pop(old[1].lower(), None)
+            if vul_num:
+                self._vit_decl[vit_key] = (vit_num, vul_num)
+                self._referrers.setdefault(vul_num.lower(), {})[vit_key] = vit_num
+
+    def set_vits(self, vul_num, vit_nums: Iterable | str) -> None:
+        """Sustituye la declaración del VUL por una lista de numeros o por el
+        texto `vits` tal cual; vacía, la elimina."""
+        vul_num = clean(vul_num)
+        vul_key = vul_num.lower()
+        if not vul_key:
+            return
+        text = clean(vit_nums) if isinstance(vit_nums, str) else None
+        declared: Dict[str, str] = {}
+        for vit_num in split_vits(text) if text is not None else map(clean, vit_nums):
+            if vit_num:
+                declared.setdefault(vit_num.lower(), vit_num)
+        if text is None:
+            text = join_vits(declared.values())
+        with self._lock:
+            old = self._vul_decl.pop(vul_key, None)
+            for vit_key in old[1] if old else ():
+                listed = self._listed_in.get(vit_key, {})
+                listed.pop(vul_key, None)
+                if not listed:
+                    self._listed_in.pop(vit_key, None)
+            if declared:
+                self._vul_decl[vul_key] = (vul_num, declared, text)
+                for vit_key in declared:
+                    self._listed_in.setdefault(vit_key, {})[vul_key] = vul_num
+
+    def apply(self, delta: Dict) -> None:
+        """Aplica {"vit": {VIT: VUL}, "vul": {VUL: [VITs] o texto}} (líneas del
+        diario)."""
+        with self._lock:
+            for vit_num, vul_num in (delta.get("vit") or {}).items():
+                self.set_vul(vit_num, vul_num)
+            for vul_num, vit_nums in (delta.get("vul") or {}).items():
+                self.set_vits(vul_num, vit_nums)
+
+    def vul_of(self, vit_numero) -> str:
+        """VUL declarado por el VIT ("" si ninguno)."""
+        decl = self._vit_decl.get(key(vit_numero))
+        return decl[1] if decl else ""
+
+    def vits_of(self, vul_numero) -> List[str]:
+        """VITs declarados por el VUL, en orden."""
+        decl = self._vul_decl.get(key(vul_numero))
+        return list(decl[1].values()) if decl else []
+
+    def vits_text(self, vul_numero) -> str:
+        """Texto `vits` del VUL tal como se declaró ("" si ninguno)."""
+        decl = self._vul_decl.get(key(vul_numero))
+        return decl[2] if decl else ""
+
+    def has_vit(self, vul_numero, vit_numero) -> bool:
+        decl = self._vul_decl.get(key(vul_numero))
+        return bool(decl) and key(vit_numero) in decl[1]
+
+    def referrers_of(self, vul_numero) -> List[str]:
+        """VITs que declaran ese VUL (exista o no), en orden de alta."""
+        with self._lock:
+            return list(self._referrers.get(key(vul_numero), {}).values())
+
+    def listed_in(self, vit_numero) -> List[str]:
+        """VULs que listan ese VIT (exista o no)."""
+        with self._lock:
+            return list(self._listed_in.get(key(vit_numero), {}).values())
+
+    def unlinked(self, kind: str, numeros: Iterable) -> Dict:
+        """Delta para `commit` que quita todos los enlaces de esos registros,
+        los que declaran y los que los nombran desde el otro lado."""
+        gone = {key(n) for n in numeros} - {""}
+        vit: Dict[str, str] = {}
+        vul: Dict[str, List[str]] = {}
+        with self._lock:
+            for k in gone:
+                if kind == "vit":
+                    if k in self._vit_decl:
+                        vit[self._vit_decl[k][0]] = ""
+                    for vul_key, vul_num in self._listed_in.get(k, {}).items():
+                        vul[vul_num] = [
+                            num
+                            for vit_key, num in self._vul_decl[vul_key][1].items()
+                            if vit_key not in gone
+                        ]
+                else:
+                    if k in self._vul_decl:
+                        vul[self._vul_decl[k][0]] = []
+                    for vit_num in self._referrers.get(k, {}).values():
+                        vit[vit_num] = ""
+        return {"vit": vit, "vul": vul}
+
+    def linked_vits(self, vul_numero) -> List[str]:
+        """Declarados por el VUL y, detrás, los VITs que lo declaran."""
+        vul_key = key(vul_numero)
+        with self._lock:
+            decl = self._vul_decl.get(vul_key)
+            linked = dict(decl[1]) if decl else {}
+            for vit_key, vit_num in self._referrers.get(vul_key, {}).items():
+                linked.setdefault(vit_key, vit_num)
+        return list(linked.values())
+
+    def declarations(self) -> Dict:
+        """Forma de relations.json."""
+        with self._lock:
+            return {
+                "vit": {num: vul for num, vul in self._vit_decl.values()},
+                "vul": {
+                    num: text if text != join_vits(v.values()) else list(v.values())
+                    for num, v, text in self._vul_decl.values()
+                },
+            }
+
+    def edges(self) -> List[Tuple[str, str, str]]:
+        """(numero VIT, numero VUL, origen) de todas las aristas."""
+        with self._lock:
+            out = [(vit, vul, "vit") for vit, vul in self._vit_decl.values()]
+            for vul, declared, _ in self._vul_decl.values():
+                out.extend((vit, vul, "vul") for vit in declared.values())
+        return out
+
+    def _declarers(self, delta: Dict) -> List[Tuple[str, str]]:
+        # (origen, numero guardado) de cada declaración que cambia, tanto el
+        # numero recibido como el que ya había con otra grafía.
+        out = []
+        for origin, decl in (("vit", self._vit_decl), ("vul", self._vul_decl)):
+            for numero in delta.get(origin) or {}:
+                out.append((origin, clean(numero)))
+                old = decl.get(key(numero))
+                if old and old[0] != clean(numero):
+                    out.append((origin, old[0]))
+        return out
+
+
+def edges_from_records(vit_rows: Iterable, vul_rows: Iterable) -> EdgeSet:
+    """Conjunto declarado por los campos `vul`/`vits` de los registros."""
+    edges = EdgeSet()
+    for rec in vit_rows:
+        if isinstance(rec, dict) and not store.is_tombstone(rec):
+            edges.set_vul(rec.get("numero"), rec.get("vul"))
+    for rec in vul_rows:
+        if isinstance(rec, dict) and not store.is_tombstone(rec):
+            edges.set_vits(rec.get("numero"), clean(rec.get("vits")))
+    return edges
+
+
+def _path():
+    return store.DATA_DIR / RELATIONS_FILE
+
+
+def _use_db() -> bool:
+    return store.STORAGE_BACKEND == "sqlite"
+
+
+def version():
+    """Identidad actual del conjunto (fichero + diario, o contador en BD)."""
+    if _use_db():
+        return db_store.dataset_version(_DB_NAME)
+    return store.dataset_version(RELATIONS_FILE)
+
+
+def last_modified():
+    """Última escritura del conjunto: relations.json o su diario, o la BD."""
+    if _use_db():
+        return db_store.dataset_updated_at(_DB_NAME)
+    return store.dataset_last_modified(RELATIONS_FILE)
+
+
+def read_json(legacy_vit: Iterable = (), legacy_vul: Iterable = ()) -> EdgeSet:
+    """Conjunto guardado en relations.json (con su diario) o, si no existe,
+    el que declaran los registros `legacy_*`."""
+    path = _path()
+    current = store.dataset_version(RELATIONS_FILE)
+    if current is None:
+        return edges_from_records(legacy_vit, legacy_vul)
+    edges = EdgeSet(current)
+    edges.apply(serialization.read_file(path) or {})
+    for entry in journal.entries(path, current[0]):
+        edges.apply(entry)
+    return edges
+
+
+def _load() -> EdgeSet:
+    if _use_db():
+        current = db_store.dataset_version(_DB_NAME)
+        edges = EdgeSet(current)
+        vul_decl: Dict[str, List[str]] = {}
+        for vit_num, vul_num, origin in db_store.load_edges():
+            if origin == "vit":
+                edges.set_vul(vit_num, vul_num)
+            else:
+                vul_decl.setdefault(vul_num, []).append(vit_num)
+        for vul_num, vit_nums in vul_decl.items():
+            edges.set_vits(vul_num, vit_nums)
+        return edges
+    if store.dataset_version(RELATIONS_FILE) is None:
+        # Datos anteriores al conjunto de aristas: se migran una vez.
+        with store.dataset_lock(RELATIONS_FILE):
+            if store.dataset_version(RELATIONS_FILE) is None:
+                edges = edges_from_records(
+                    store.load_shared(VIT_FILE)[1], store.load_shared(VUL_FILE)[1]
+                )
+                store.write_json_atomic(_path(), edges.declarations())
+    return read_json()
+
+
+_EDGES: EdgeSet | None = None
+_LOCK = threading.Lock()
+
+# (tx, conjunto) con los cambios del commit_group en curso en este hilo; se
+# publica en _EDGES al cerrarse (ver commit).
+_PENDING = threading.local()
+
+
+def get_edges() -> EdgeSet:
+    """Conjunto vigente; se relee entero solo si otro proceso escribió."""
+    global _EDGES
+    pending = getattr(_PENDING, "edges", None)
+    if pending is not None and pending[0] == store.current_commit():
+        return pending[1]
+    current = version()
+    edges = _EDGES
+    if edges is not None and edges.version == current:
+        return edges
+    with _LOCK:
+        if _EDGES is None or _EDGES.version != version():
+            _EDGES = _load()
+        return _EDGES
+
+
+def commit(vit: Dict | None = None, vul: Dict | None = None) -> None:
+    """Sustituye declaraciones en un solo commit.
+
+    `vit` es {numero VIT: numero VUL} ("" elimina el enlace) y `vul`
+    {numero VUL: [numeros VIT] o texto `vits`} ([] o "" lo vacía). Coste
+    proporcional al tamaño del cambio: una línea del diario o una transacción
+    en BD. Dentro de `store.commit_group` forma parte de ese commit.
+
+    Los cambios se aplican a una copia del conjunto, que sustituye a la
+    vigente al publicarse el commit (como las listas de store.upsert_records);
+    hasta entonces solo la ve este hilo.
+    """
+    delta = {
+        "vit": {clean(k): clean(v) for k, v in (vit or {}).items() if clean(k)},
+        "vul": {
+            clean(k): (
+                clean(v) if isinstance(v, str) else [c for c in map(clean, v) if c]
+            )
+            for k, v in (vul or {}).items()
+            if clean(k)
+        },
+    }
+    if not delta["vit"] and not delta["vul"]:
+        return
+    with store.dataset_lock(RELATIONS_FILE):
+        edges = get_edges()
+        old = edges.version
+        changed = edges.copy()
+        changed.apply(delta)
+        if _use_db():
+            added = EdgeSet()
+            added.apply(delta)
+            changed.version = db_store.set_links(edges._declarers(delta), added.edges())
+        else:
+            store.append_journal(_path(), {"base": list(old[0]), **delta})
+            changed.version = store.dataset_version(RELATIONS_FILE)
+        tx = store.current_commit()
+        if tx is not None:
+            _PENDING.edges = (tx, changed)
+        store.after_commit(lambda: _publish(changed, old))
+
+
+def _publish(edges: EdgeSet, old) -> None:
+    global _EDGES
+    _PENDING.edges = None
+    with _LOCK:
+        if _use_db() and edges.version != old + 1:
+            # Otro proceso escribió entre medias: se relee la próxima vez.
+            _EDGES = None
+        else:
+            _EDGES = edges
+    if not _use_db():
+        _maybe_compact()
+
+
+def _maybe_compact() -> None:
+    # Tras publicar el commit: un snapshot nuevo no puede esperar al manifiesto.
+    global _EDGES
+    path = _path()
+    with store.dataset_lock(RELATIONS_FILE):
+        if journal.size(path) <= store.JOURNAL_COMPACT_BYTES:
+            return
+        edges = get_edges()
+        store.write_json_atomic(path, edges.declarations())
+        journal.discard(path)
+        with _LOCK:
+            edges.version = store.dataset_version(RELATIONS_FILE)
+
+
+def _on_write(filename: str, old_version, new_version, changed, removed) -> None:
+    # Un commit de varios datasets que se deshace también retira sus aristas.
+    global _EDGES
+    if filename == RELATIONS_FILE and new_version is None:
+        _PENDING.edges = None
+        with _LOCK:
+            _EDGES = None
+
+
+store.on_write(_on_write)
+
+
+def take_links(kind: str, records: Iterable[Dict]) -> Dict:
+    """Quita el campo de enlace de cada registro y devuelve sus declaraciones,
+    listas para `commit(**{kind: ...})`. Los registros sin el campo no
+    cambian sus enlaces."""
+    field = LINK_FIELD[kind]
+    out: Dict = {}
+    for rec in records:
+        if not isinstance(rec, dict) or field not in rec:
+            continue
+        raw = rec.pop(field)
+        numero = clean(rec.get("numero"))
+        if numero:
+            # El texto `vits` se guarda tal cual (ver EdgeSet.set_vits).
+            out[numero] = clean(raw)
+    return out
+
+
+def render(kind: str, rec: Dict, edges: EdgeSet | None = None) -> Dict:
+    """Pinta en `rec` el campo `vul`/`vits` de siempre desde el conjunto."""
+    edges = edges or get_edges()
+    if kind == "vit":
+        rec["vul"] = edges.vul_of(rec.get("numero"))
+    else:
+        rec["vits"] = edges.vits_text(rec.get("numero"))
+    return rec
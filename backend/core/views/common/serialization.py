@@ -0,0 +1,93 @@
+# core/views/common/serialization.py
+import json
+from pathlib import Path
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.http import JsonResponse as DjangoJsonResponse
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None
+
+# Formato con el que se escriben los ficheros de datos:
+#   "compact" -> JSON minificado (por defecto)
+#   "pretty"  -> JSON indentado, el formato histórico
+# Al leer da igual: los dos son JSON válido.
+DATA_FORMAT = getattr(settings, "VMT_DATA_FORMAT", "compact")
+
+_DJANGO_ENCODER = DjangoJSONEncoder()
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj):
+    # Lo que orjson no conoce (Decimal, Timestamp de pandas, UUID...) se
+    # resuelve igual que con el JsonResponse de Django.
+    return _DJANGO_ENCODER.default(obj)
+
+
+def dumps(data, pretty: bool = False) -> bytes:
+    """Serializa a bytes UTF-8; usa orjson si está instalado."""
+    if orjson is not None:
+        opts = _ORJSON_OPTS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(data, default=_default, option=opts)
+    if pretty:
+        text = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(
+            data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(",", ":")
+        )
+    return text.encode("utf-8")
+
+
+def loads(raw: bytes | str):
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # Ficheros antiguos guardados desde pandas pueden llevar NaN o
+            # Infinity, que orjson rechaza y json sí acepta.
+            pass
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+    return json.loads(raw)
+
+
+def read_file(path: Path):
+    with path.open("rb") as f:
+        return loads(f.read())
+
+
+def dumps_file(data) -> bytes:
+    """Bytes a escribir en disco según DATA_FORMAT."""
+    return dumps(data, pretty=DATA_FORMAT == "pretty")
+
+
+class JsonResponse(DjangoJsonResponse):
+    """JsonResponse de Django serializado con `dumps` (orjson si está).
+
+    Mismo contrato que el original; si se pide un `encoder` propio o
+    `json_dumps_params` se delega en la implementación de Django.
+    """
+
+    def __init__(
+        self,
+        data,
+        encoder=DjangoJSONEncoder,
+        safe=True,
+        json_dumps_params=None,
+        **kwargs,
+    ):
+        if encoder is not DjangoJSONEncoder or json_dumps_params:
+            super().__init__(data, encoder, safe, json_dumps_params, **kwargs)
+            return
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        HttpResponse.__init__(self, content=dumps(data), **kwargs)
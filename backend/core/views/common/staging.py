@@ -0,0 +1,114 @@
+# core/views/common/staging.py
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+from django.conf import settings
+from core.views.common import serialization
+from core.views.common.store import DATA_DIR, write_json_atomic
+
+# Resoluciones pendientes de una subida (entradas nuevas, pares de duplicados
+# y relaciones) guardadas en el servidor bajo un token. El cliente ya no
+# reenvía los registros: manda el token y sus elecciones (qué lado de cada
+# duplicado se queda, qué relaciones se aplican) a save-selection y
+# apply-relations. Se guardan en DATA_DIR/staging/<token>.json para que
+# cualquier worker pueda resolverlas; caducan a los STAGING_TTL_SECONDS.
+
+STAGING_TTL_SECONDS = getattr(settings, "VMT_STAGING_TTL", 3600)
+
+STAGING_DIR = DATA_DIR / "staging"
+
+_TOKEN_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _path(token: str) -> Path:
+    return STAGING_DIR / f"{token}.json"
+
+
+def _expired(path: Path) -> bool:
+    return path.stat().st_mtime < time.time() - STAGING_TTL_SECONDS
+
+
+def _purge_expired() -> None:
+    for path in STAGING_DIR.glob("*.json"):
+        try:
+            if _expired(path):
+                path.unlink()
+        except OSError:
+            pass
+
+
+def stage(
+    kind: str, new: List[Dict], duplicates: List[Dict], relations: List[Dict]
+) -> str:
+    """Guarda la resolución pendiente y devuelve su token."""
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    _purge_expired()
+    token = uuid.uuid4().hex
+    write_json_atomic(
+        _path(token),
+        {
+            "kind": kind,
+            "new": new,
+            "duplicates": duplicates,
+            "relations": relations,
+        },
+    )
+    return token
+
+
+def load_staged(kind: str, token) -> Dict:
+    """Resolución guardada bajo `token`; ValueError si no existe o caducó."""
+    path = _path(str(token))
+    try:
+        if not _TOKEN_RE.match(str(token)) or _expired(path):
+            raise FileNotFoundError
+        staged = serialization.read_file(path)
+    except (OSError, ValueError):
+        staged = None
+    if not isinstance(staged, dict) or staged.get("kind") != kind:
+        raise ValueError("Unknown or expired upload token.")
+    return staged
+
+
+def discard(token) -> None:
+    if not _TOKEN_RE.match(str(token)):
+        return
+    try:
+        _path(token).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def selected_entries(staged: Dict, choices) -> List[Dict]:
+    """Entradas nuevas más el lado elegido ("incoming" por defecto) de cada par."""
+    pairs = staged.get("duplicates") or []
+    choices = choices if isinstance(choices, list) else []
+    if len(choices) > len(pairs):
+        raise ValueError("Invalid data format: too many 'choices'.")
+    entries = list(staged.get("new") or [])
+    for i, pair in enumerate(pairs):
+        side = choices[i] if i < len(choices) else "incoming"
+        if side not in ("incoming", "existing"):
+            raise ValueError(
+                "Invalid data format: 'choices' must be 'incoming' or 'existing'."
+            )
+        entries.append(pair[side])
+    return entries
+
+
+def selected_relations(staged: Dict, apply) -> List[Dict]:
+    """Relaciones guardadas cuyas posiciones vienen en `apply` (todas si falta)."""
+    relations = staged.get("relations") or []
+    if apply is None:
+        return list(relations)
+    if not isinstance(apply, list):
+        raise ValueError("Invalid data format: 'apply' must be a list.")
+    try:
+        positions = [int(i) for i in apply]
+    except (TypeError, ValueError):
+        positions = [-1]
+    if any(not 0 <= i < len(relations) for i in positions):
+        raise ValueError("Invalid data format: unknown relation in 'apply'.")
+    return [relations[i] for i in positions]
@@ -0,0 +1,743 @@
+# core/views/common/store.py
+import os
+import threading
+import uuid
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Callable, Dict, Iterable
+from django.apps import apps
+from django.conf import settings
+from core.views.common import db_store, journal, keys, locks, serialization, txlog
+
+CORE_DIR = Path(apps.get_app_config("core").path)
+DATA_DIR = CORE_DIR / "data"
+DATA_DIR.mkdir(exist_ok=True)
+
+# "json" (ficheros en DATA_DIR) o "sqlite" (tablas de core.models).
+STORAGE_BACKEND = getattr(settings, "VMT_STORAGE_BACKEND", "json")
+
+DATASETS = {
+    "CSIRT/vit_Data.json": "vit",
+    "CSIRT/vul_Data.json": "vul",
+}
+
+FILE_ALIASES = {
+    "vit_Data.json": ["tshirt_Data.json"],
+    "vul_Data.json": ["soup_Data.json"],
+    "tshirt_Data.json": ["vit_Data.json"],
+    "soup_Data.json": ["vul_Data.json"],
+}
+
+# Tamaño a partir del cual el diario de cambios (ver journal.py) se compacta
+# en segundo plano sobre el snapshot JSON.
+JOURNAL_COMPACT_BYTES = getattr(settings, "VMT_JOURNAL_COMPACT_BYTES", 1024 * 1024)
+
+# Los borrados con ficheros JSON dejan una lápida ({"_deleted": true}) en la
+# posición del registro, con una línea del diario, en lugar de reescribir el
+# dataset; load_json_data no las devuelve y quien lee con load_shared las
+# salta (ver is_tombstone). Las posiciones no se mueven hasta que la
+# compactación en segundo plano las elimina: al pasar de
+# TOMBSTONE_COMPACT_ROWS lápidas o tras IDLE_COMPACT_SECONDS sin escrituras.
+# Cualquier reescritura completa (save_json_data) también las elimina.
+TOMBSTONE_FIELD = "_deleted"
+TOMBSTONE_COMPACT_ROWS = getattr(settings, "VMT_TOMBSTONE_COMPACT_ROWS", 1000)
+IDLE_COMPACT_SECONDS = getattr(settings, "VMT_IDLE_COMPACT_SECONDS", 60)
+
+# Cache de datasets ya parseados, indexado por ruta. Cada entrada guarda la
+# identidad del snapshot y de su diario (inode, mtime, tamaño) con la que se
+# leyó; si otro proceso escribe cualquiera de los dos se vuelve a parsear.
+# Con el backend sqlite la identidad es el contador de DatasetState.
+_CACHE: dict[object, tuple[object, object]] = {}
+_CACHE_LOCK = threading.Lock()
+
+_COMPACTING: set[Path] = set()
+
+# Lápidas pendientes de compactar por dataset y temporizadores de inactividad.
+_GARBAGE: dict[Path, int] = {}
+_IDLE_TIMERS: dict[Path, threading.Timer] = {}
+
+_WRITE_LISTENERS: list[Callable] = []
+
+# Commit de varios datasets en curso en este hilo (ver commit_group).
+_LOCAL = threading.local()
+
+# Proceso que ya pasó por `recover` (ver ensure_recovered).
+_RECOVERED_PID: int | None = None
+_RECOVER_LOCK = threading.Lock()
+
+
+def _resolve_data_file(filename: str) -> Path:
+    primary = DATA_DIR / filename
+    if primary.exists():
+        return primary
+    base_name = Path(filename).name
+    subdir = Path(filename).parent
+    for alt in FILE_ALIASES.get(base_name, []):
+        alt_path = DATA_DIR / subdir / alt
+        if alt_path.exists():
+            return alt_path
+    return primary
+
+
+def file_version(path: Path) -> tuple | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _json_version(path: Path) -> tuple | None:
+    base = file_version(path)
+    if base is None:
+        return None
+    return (base, file_version(journal.journal_path(path)))
+
+
+def is_tombstone(record) -> bool:
+    return isinstance(record, dict) and record.get(TOMBSTONE_FIELD) is True
+
+
+def _copy_records(data):
+    # Los views mutan los registros (hasLink, vulData, saneado...), así que
+    # nunca se entrega el objeto cacheado, sino una copia superficial.
+    if isinstance(data, list):
+        return [
+            dict(r) if isinstance(r, dict) else r for r in data if not is_tombstone(r)
+        ]
+    if isinstance(data, dict):
+        return dict(data)
+    return data
+
+
+def _db_kind(filename: str) -> str | None:
+    if STORAGE_BACKEND != "sqlite":
+        return None
+    return DATASETS.get(filename)
+
+
+def _load_db(kind: str):
+    version = db_store.dataset_version(kind)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(("db", kind))
+    if cached is not None and cached[0] == version:
+        return version, cached[1]
+    data = db_store.load_records(kind)
+    keys.stamp_records(data)
+    with _CACHE_LOCK:
+        _CACHE[("db", kind)] = (version, data)
+    return version, data
+
+
+def _load_versioned(filename: str):
+    kind = _db_kind(filename)
+    if kind:
+        return _load_db(kind)
+    ensure_recovered()
+    file_path = _resolve_data_file(filename)
+    key = _json_version(file_path)
+    if key is None:
+        return None, []
+    with _CACHE_LOCK:
+        cached = _CACHE.get(file_path)
+    if cached is not None and cached[0] == key:
+        return key, cached[1]
+    data = serialization.read_file(file_path)
+    if isinstance(data, list):
+        data = journal.replay(file_path, key[0], data)
+    garbage = 0
+    if filename in DATASETS:
+        # Datos escritos antes de existir las claves de coincidencia.
+        keys.stamp_records(data)
+        if isinstance(data, list):
+            garbage = sum(1 for r in data if is_tombstone(r))
+    with _CACHE_LOCK:
+        _CACHE[file_path] = (key, data)
+        _GARBAGE[file_path] = garbage
+    if garbage:
+        # Lápidas de otro proceso (o de antes de arrancar).
+        _schedule_idle_compaction(filename, file_path)
+    return key, data
+
+
+def load_json_data(filename: str):
+    return _copy_records(_load_versioned(filename)[1])
+
+
+def load_shared(filename: str):
+    """Devuelve (versión, datos) cacheados SIN copiar: solo lectura.
+
+    Los datasets pueden llevar lápidas de registros borrados (ver
+    is_tombstone), que ocupan su posición.
+    """
+    return _load_versioned(filename)
+
+
+def dataset_version(filename: str):
+    """Identidad actual del dataset (clave de fichero o contador en BD)."""
+    kind = _db_kind(filename)
+    if kind:
+        return db_store.dataset_version(kind)
+    ensure_recovered()
+    return _json_version(_resolve_data_file(filename))
+
+
+def dataset_last_modified(filename: str) -> datetime | None:
+    kind = _db_kind(filename)
+    if kind:
+        return db_store.dataset_updated_at(kind)
+    return data_last_modified(_resolve_data_file(filename))
+
+
+def data_last_modified(path: Path) -> datetime | None:
+    """Última escritura de un fichero de datos: su snapshot o su diario, que
+    es lo único que cambia con update_record, upsert_records y los borrados."""
+    candidates = (path, journal.journal_path(path))
+    stamps = [s for s in map(file_last_modified, candidates) if s is not None]
+    return max(stamps) if stamps else None
+
+
+def file_last_modified(path: Path) -> datetime | None:
+    try:
+        return datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc)
+    except FileNotFoundError:
+        return None
+
+
+def on_write(listener: Callable) -> None:
+    """Registra `listener(filename, old_version, new_version, changed, removed)`.
+
+    `changed` (registros escritos) y `removed` (numeros eliminados) son None
+    cuando el escritor no sabe qué registros tocó; el oyente debe entonces
+    descartar cualquier estado derivado.
+    """
+    _WRITE_LISTENERS.append(listener)
+
+
+def _notify(filename, old_version, new_version, changed, removed) -> None:
+    for listener in _WRITE_LISTENERS:
+        listener(filename, old_version, new_version, changed, removed)
+
+
+def dataset_lock(*filenames: str):
+    """Cerrojo de escritura (entre procesos) de uno o varios datasets.
+
+    Los views que hacen read-modify-write deben envolver la lectura y el
+    guardado con él; save_json_data y update_record lo vuelven a pedir, pero
+    es reentrante. Se bloquea el fichero que se escribe, con su alias ya
+    resuelto (ver _resolve_data_file).
+    """
+    ensure_recovered()
+    return locks.locked(*map(_resolve_data_file, filenames))
+
+
+class _Group:
+    def __init__(self, filenames):
+        self.tx = uuid.uuid4().hex
+        self.filenames = filenames
+        # (ruta relativa a DATA_DIR, línea) en orden de escritura
+        self.entries: list[tuple[str, Dict]] = []
+        # diario -> tamaño antes del commit (None si no existía)
+        self.sizes: dict[Path, int | None] = {}
+        # ficheros con una versión nueva preparada (ver replace_file)
+        self.replaced: list[Path] = []
+        self.after: list[Callable[[], None]] = []
+
+
+def in_commit_group() -> bool:
+    return getattr(_LOCAL, "group", None) is not None
+
+
+def current_commit() -> str | None:
+    """Identificador ("tx") del commit_group en curso en este hilo, o None."""
+    group = getattr(_LOCAL, "group", None)
+    return group.tx if group is not None else None
+
+
+@contextmanager
+def commit_group(*filenames: str):
+    """Agrupa las escrituras de varios datasets en un solo commit.
+
+    Toma los cerrojos de todos ellos en el orden dado, que debe ser el de los
+    demás escritores (los datasets antes que relations.json). Dentro, cada
+    escritura por diario (update_record, upsert_records, relations.commit)
+    añade su línea sin fsync y cada reescritura completa (save_json_data,
+    replace_file) deja preparada la versión nueva; al salir, una línea del
+    manifiesto lo publica todo junto con un único fsync (ver txlog.py) y
+    después se instalan los preparados. Si el bloque falla, nada de eso queda
+    y los oyentes descartan su estado. Con sqlite es una transacción.
+    """
+    if in_commit_group():
+        # Anidado: forma parte del commit de fuera.
+        with dataset_lock(*filenames):
+            yield
+        return
+    with ExitStack() as held:
+        for filename in filenames:
+            held.enter_context(dataset_lock(filename))
+        group = _LOCAL.group = _Group(filenames)
+        try:
+            if STORAGE_BACKEND == "sqlite":
+                with db_store.atomic():
+                    yield
+            else:
+                yield
+        except BaseException:
+            _LOCAL.group = None
+            _rollback(group)
+            raise
+        _LOCAL.group = None
+        if group.entries or group.replaced:
+            replaced = [p.relative_to(DATA_DIR).as_posix() for p in group.replaced]
+            txlog.publish(DATA_DIR, group.tx, group.entries, replaced)
+        for file_path in group.replaced:
+            txlog.install(file_path, group.tx)
+        for callback in group.after:
+            callback()
+        if txlog.size(DATA_DIR) > JOURNAL_COMPACT_BYTES:
+            txlog.trim(DATA_DIR)
+
+
+def append_journal(file_path: Path, entry: Dict) -> None:
+    """Añade `entry` al diario de `file_path`, dentro del commit en curso si lo
+    hay (sin fsync y marcada con su "tx")."""
+    group = getattr(_LOCAL, "group", None)
+    if group is None:
+        journal.append_entry(file_path, entry)
+        return
+    if file_path in group.replaced:
+        # Su línea apuntaría al snapshot que el commit va a sustituir.
+        raise RuntimeError(f"{file_path.name} ya se reescribe en este commit.")
+    jpath = journal.journal_path(file_path)
+    group.sizes.setdefault(jpath, jpath.stat().st_size if jpath.exists() else None)
+    entry = dict(entry, tx=group.tx)
+    journal.append_entry(file_path, entry, sync=False)
+    group.entries.append((file_path.relative_to(DATA_DIR).as_posix(), entry))
+
+
+def replace_file(file_path: Path, data) -> None:
+    """write_json_atomic; dentro de commit_group la versión nueva se prepara y
+    se instala al publicarse el commit. El fichero debe ser uno de los del
+    grupo (sus cerrojos protegen la versión preparada)."""
+    group = getattr(_LOCAL, "group", None)
+    if group is None:
+        write_json_atomic(file_path, data)
+        return
+    if file_path not in set(map(_resolve_data_file, group.filenames)):
+        raise RuntimeError(f"{file_path.name} no está entre los del commit.")
+    if journal.journal_path(file_path) in group.sizes:
+        raise RuntimeError(f"{file_path.name} ya tiene líneas en este commit.")
+    with txlog.staged_path(file_path, group.tx).open("wb") as f:
+        f.write(serialization.dumps_file(data))
+        f.flush()
+        os.fsync(f.fileno())
+    if file_path not in group.replaced:
+        group.replaced.append(file_path)
+
+
+def after_commit(callback: Callable[[], None]) -> None:
+    """Ejecuta `callback` al publicarse el commit en curso (o ya, si no hay)."""
+    group = getattr(_LOCAL, "group", None)
+    if group is None:
+        callback()
+    else:
+        group.after.append(callback)
+
+
+def _rollback(group: _Group) -> None:
+    for jpath, size in group.sizes.items():
+        if size is None:
+            jpath.unlink(missing_ok=True)
+        else:
+            os.truncate(jpath, size)
+    for file_path in group.replaced:
+        txlog.staged_path(file_path, group.tx).unlink(missing_ok=True)
+    with _CACHE_LOCK:
+        for filename in group.filenames:
+            _CACHE.pop(_resolve_data_file(filename), None)
+            _GARBAGE.pop(_resolve_data_file(filename), None)
+            _CACHE.pop(("db", _db_kind(filename)), None)
+    for filename in group.filenames:
+        _notify(filename, None, None, None, None)
+
+
+def recover() -> None:
+    """Deshace o rehace los commits de varios datasets que una caída dejó a
+    medias (ver ensure_recovered)."""
+    if STORAGE_BACKEND != "sqlite":
+        txlog.recover(DATA_DIR, file_version)
+
+
+def ensure_recovered() -> None:
+    """Llama a `recover` una vez por proceso, con el primer acceso a los datos
+    y antes de tomar ningún cerrojo; no al cargar Django, para que manage.py
+    test, check o shell no toquen DATA_DIR."""
+    global _RECOVERED_PID
+    if _RECOVERED_PID == os.getpid():
+        return
+    with _RECOVER_LOCK:
+        if _RECOVERED_PID != os.getpid():
+            recover()
+            _RECOVERED_PID = os.getpid()
+
+
+def write_json_atomic(file_path: Path, data) -> None:
+    """Escribe en un temporal del mismo directorio y lo publica con os.replace.
+
+    Los lectores ven el fichero anterior o el nuevo completo, nunca uno a medias.
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(
+        "wb", delete=False, dir=file_path.parent, suffix=".tmp"
+    ) as tmp:
+        tmp.write(serialization.dumps_file(data))
+        tmp.flush()
+        os.fsync(tmp.fileno())
+        tmp_name = tmp.name
+    os.replace(tmp_name, file_path)
+
+
+def _write_snapshot(file_path: Path, data) -> None:
+    write_json_atomic(file_path, data)
+    # El snapshot nuevo ya incluye todo lo del diario. Si el proceso cae antes
+    # de borrarlo, sus líneas apuntan al snapshot anterior y se ignoran.
+    journal.discard(file_path)
+
+
+def save_json_data(
+    filename: str,
+    data,
+    changed: Iterable[Dict] | None = None,
+    removed: Iterable[str] | None = None,
+) -> None:
+    if filename in DATASETS:
+        changed = list(changed) if changed is not None else None
+        if isinstance(data, list) and any(is_tombstone(r) for r in data):
+            # La reescritura elimina las lápidas y mueve posiciones: los
+            # oyentes tienen que rehacer su estado.
+            data = [r for r in data if not is_tombstone(r)]
+            changed = removed = None
+        keys.stamp_records(data, changed)
+    kind = _db_kind(filename)
+    if kind:
+        new_version = db_store.replace_records(
+            kind, data if isinstance(data, list) else [data]
+        )
+        _notify(filename, new_version - 1, new_version, changed, removed)
+        return
+    file_path = _resolve_data_file(filename)
+    with dataset_lock(filename):
+        old_key = _json_version(file_path)
+        if in_commit_group():
+            replace_file(file_path, data)
+            after_commit(
+                lambda: _installed(filename, file_path, old_key, data, changed, removed)
+            )
+            return
+        _write_snapshot(file_path, data)
+        # Write-through: el siguiente lector obtiene lo recién escrito sin parsear.
+        key = _json_version(file_path)
+        with _CACHE_LOCK:
+            if key is not None:
+                _CACHE[file_path] = (key, data)
+            _GARBAGE.pop(file_path, None)
+    _notify(filename, old_key, key, changed, removed)
+
+
+def _installed(filename, file_path, old_key, data, changed, removed) -> None:
+    # Snapshot de save_json_data instalado al publicarse su commit.
+    key = _json_version(file_path)
+    with _CACHE_LOCK:
+        _CACHE[file_path] = (key, data)
+        _GARBAGE.pop(file_path, None)
+    _notify(filename, old_key, key, changed, removed)
+
+
+def _restamping(mutate: Callable[[Dict], None]) -> Callable[[Dict], None]:
+    # Un cambio de numero/idExterno debe reflejarse en la clave guardada.
+    def apply(item: Dict) -> None:
+        mutate(item)
+        keys.stamp(item)
+
+    return apply
+
+
+def update_record(
+    filename: str, numero: str, mutate: Callable[[Dict], None]
+) -> Dict | None:
+    """Aplica `mutate` al registro con ese `numero`; None si no existe.
+
+    Con ficheros JSON el cambio se añade al diario en lugar de reescribir el
+    dataset; el diario se compacta en segundo plano al superar
+    JOURNAL_COMPACT_BYTES.
+    """
+    mutate = _restamping(mutate)
+    kind = _db_kind(filename)
+    if kind:
+        result = db_store.update_record(kind, numero, mutate)
+        if result is None:
+            return None
+        item, new_version = result
+        _notify(filename, new_version - 1, new_version, [item], [])
+        return item
+    with dataset_lock(filename):
+        file_path = _resolve_data_file(filename)
+        old_key, data = _load_versioned(filename)
+        if old_key is None or not isinstance(data, list):
+            return None
+        for i, current in enumerate(data):
+            if not isinstance(current, dict):
+                continue
+            if str(current.get("numero") or "").strip() == numero:
+                break
+        else:
+            return None
+        item = dict(current)
+        mutate(item)
+        append_journal(file_path, journal.records_entry(old_key[0], [(i, item)]))
+        # El objeto cacheado se actualiza en sitio: los lectores reciben
+        # copias, así que solo cambia la referencia de esta posición.
+        data[i] = item
+        key = _json_version(file_path)
+        with _CACHE_LOCK:
+            _CACHE[file_path] = (key, data)
+    _notify(filename, old_key, key, [item], [])
+    if journal.size(file_path) > JOURNAL_COMPACT_BYTES:
+        _schedule_compaction(filename, file_path)
+    return dict(item)
+
+
+def update_records(
+    filename: str, updates: Iterable[tuple[str, Callable[[Dict], None]]]
+) -> Dict[str, Dict]:
+    """Aplica varios `(numero, mutate)` en una sola pasada y un solo commit:
+    una línea del diario con ficheros JSON, coste proporcional al lote.
+
+    Devuelve {numero: registro actualizado} de los que existen; los numeros
+    ausentes no aparecen. Si un numero se repite, sus cambios se encadenan.
+    """
+    updates = [(numero, _restamping(mutate)) for numero, mutate in updates]
+    kind = _db_kind(filename)
+    if kind:
+        result = db_store.update_records(kind, updates)
+        if result is None:
+            return {}
+        items, new_version = result
+        _notify(filename, new_version - 1, new_version, list(items.values()), [])
+        return items
+    with dataset_lock(filename):
+        file_path = _resolve_data_file(filename)
+        old_key, data = _load_versioned(filename)
+        if old_key is None or not isinstance(data, list):
+            return {}
+        wanted = {numero for numero, _ in updates}
+        positions = {}
+        for i, current in enumerate(data):
+            if isinstance(current, dict):
+                numero = str(current.get("numero") or "").strip()
+                if numero in wanted and numero not in positions:
+                    positions[numero] = i
+        if not positions:
+            return {}
+        # Lista nueva que comparte los registros no tocados con la cacheada.
+        new_data = list(data)
+        items: Dict[str, Dict] = {}
+        for numero, mutate in updates:
+            if numero not in positions:
+                continue
+            item = items.get(numero) or dict(new_data[positions[numero]])
+            mutate(item)
+            items[numero] = new_data[positions[numero]] = item
+        # Una sola línea del diario con todos, como upsert_records.
+        writes = sorted((positions[numero], item) for numero, item in items.items())
+        append_journal(file_path, journal.records_entry(old_key[0], writes))
+        key = _json_version(file_path)
+        with _CACHE_LOCK:
+            _CACHE[file_path] = (key, new_data)
+    _notify(filename, old_key, key, list(items.values()), [])
+    if journal.size(file_path) > JOURNAL_COMPACT_BYTES:
+        _schedule_compaction(filename, file_path)
+    return {numero: dict(item) for numero, item in items.items()}
+
+
+def upsert_records(
+    filename: str, version, rows: Iterable[tuple[int | None, Dict]]
+) -> tuple[list[Dict], list[str]]:
+    """Sustituye o inserta registros sin reescribir el dataset.
+
+    `rows` son `(posición, registro)`; la posición es la del registro que se
+    sustituye en la versión `version` (la que leyó quien calculó el plan) o
+    None para añadirlo al final. Todo va en un commit: una línea del diario
+    con ficheros JSON, una transacción con la BD. Devuelve los registros
+    escritos y los numeros que dejaron de existir.
+    """
+    rows = list(rows)
+    kind = _db_kind(filename)
+    with dataset_lock(filename):
+        old_key, data = _load_versioned(filename)
+        if old_key != version or not isinstance(data, list):
+            raise ValueError("Dataset changed while saving; please retry.")
+        new_data = list(data)
+        writes: Dict[int, Dict] = {}
+        removed: list[str] = []
+        for pos, record in rows:
+            keys.stamp(record)
+            if pos is None:
+                pos = len(new_data)
+                new_data.append(record)
+            else:
+                before = str(new_data[pos].get("numero") or "").strip()
+                if before != str(record.get("numero") or "").strip():
+                    removed.append(before)
+                new_data[pos] = record
+            writes[pos] = record
+        if not writes:
+            return [], []
+        if kind:
+            replaced = [
+                (str(data[p].get("numero") or "").strip(), r)
+                for p, r in writes.items()
+                if p < len(data)
+            ]
+            inserted = [r for p, r in sorted(writes.items()) if p >= len(data)]
+            new_key = db_store.upsert_records(kind, replaced, inserted)
+            if new_key == old_key + 1:
+                # Nadie más escribió entre medias: la lista nueva es la de la BD.
+                with _CACHE_LOCK:
+                    _CACHE[("db", kind)] = (new_key, new_data)
+        else:
+            file_path = _resolve_data_file(filename)
+            if old_key is None:
+                # Aún no hay snapshot al que apunten las líneas: se crea.
+                changed = list(writes.values())
+                save_json_data(filename, new_data, changed, removed)
+                return changed, removed
+            append_journal(
+                file_path, journal.records_entry(old_key[0], sorted(writes.items()))
+            )
+            new_key = _json_version(file_path)
+            with _CACHE_LOCK:
+                _CACHE[file_path] = (new_key, new_data)
+    changed = list(writes.values())
+    _notify(filename, old_key, new_key, changed, removed)
+    if not kind and journal.size(file_path) > JOURNAL_COMPACT_BYTES:
+        _schedule_compaction(filename, file_path)
+    return changed, removed
+
+
+def delete_records(filename: str, version, positions: Iterable[int]) -> list[Dict]:
+    """Borra los registros en `positions` de la versión `version` (la que leyó
+    quien las resolvió, normalmente con dup_index). Devuelve los borrados.
+
+    Con ficheros JSON deja lápidas con una línea del diario (ver
+    TOMBSTONE_FIELD); con la BD borra esas filas.
+    """
+    positions = sorted(set(positions))
+    kind = _db_kind(filename)
+    with dataset_lock(filename):
+        old_key, data = _load_versioned(filename)
+        if old_key != version or not isinstance(data, list):
+            raise ValueError("Dataset changed while deleting; please retry.")
+        gone = [data[p] for p in positions]
+        if not gone:
+            return []
+        removed = [str(r.get("numero") or "").strip() for r in gone]
+        if kind:
+            dropped = set(positions)
+            new_data = [r for i, r in enumerate(data) if i not in dropped]
+            new_key = db_store.delete_records(kind, gone)
+            if new_key == old_key + 1:
+                with _CACHE_LOCK:
+                    _CACHE[("db", kind)] = (new_key, new_data)
+            tombstones = []
+        else:
+            file_path = _resolve_data_file(filename)
+            tombstones = [{TOMBSTONE_FIELD: True} for _ in positions]
+            writes = list(zip(positions, tombstones))
+            append_journal(file_path, journal.records_entry(old_key[0], writes))
+            new_data = list(data)
+            for pos, tombstone in writes:
+                new_data[pos] = tombstone
+            new_key = _json_version(file_path)
+            with _CACHE_LOCK:
+                _CACHE[file_path] = (new_key, new_data)
+                garbage = _GARBAGE[file_path] = _GARBAGE.get(file_path, 0) + len(gone)
+    _notify(filename, old_key, new_key, tombstones, removed)
+    if not kind:
+        if (
+            garbage > TOMBSTONE_COMPACT_ROWS
+            or journal.size(file_path) > JOURNAL_COMPACT_BYTES
+        ):
+            _schedule_compaction(filename, file_path)
+        else:
+            _schedule_idle_compaction(filename, file_path)
+    return [dict(r) for r in gone]
+
+
+def _schedule_compaction(filename: str, file_path: Path) -> None:
+    with _CACHE_LOCK:
+        if file_path in _COMPACTING:
+            return
+        _COMPACTING.add(file_path)
+    threading.Thread(target=_compact, args=(filename, file_path), daemon=True).start()
+
+
+def _compact(filename: str, file_path: Path) -> None:
+    """Vuelca snapshot + diario en un snapshot nuevo, sin las lápidas, y
+    descarta el diario."""
+    try:
+        with dataset_lock(filename):
+            old_key, data = _load_versioned(filename)
+            if old_key is None or old_key[1] is None:
+                return
+            live = data
+            if isinstance(data, list):
+                live = [r for r in data if not is_tombstone(r)]
+            _write_snapshot(file_path, live)
+            key = _json_version(file_path)
+            with _CACHE_LOCK:
+                _CACHE[file_path] = (key, live)
+                _GARBAGE.pop(file_path, None)
+        if live is data:
+            # Mismo contenido, versión nueva: los oyentes solo actualizan versión.
+            _notify(filename, old_key, key, [], [])
+        else:
+            # Sin las lápidas se mueven posiciones: los oyentes se rehacen.
+            _notify(filename, old_key, key, None, None)
+    finally:
+        with _CACHE_LOCK:
+            _COMPACTING.discard(file_path)
+
+
+def _schedule_idle_compaction(filename: str, file_path: Path) -> None:
+    """Compacta las lápidas cuando el dataset lleva IDLE_COMPACT_SECONDS sin
+    escrituras; cada llamada reinicia la espera."""
+    timer = threading.Timer(
+        IDLE_COMPACT_SECONDS, _idle_compaction, (filename, file_path)
+    )
+    timer.daemon = True
+    timer.key = _json_version(file_path)
+    with _CACHE_LOCK:
+        previous = _IDLE_TIMERS.get(file_path)
+        _IDLE_TIMERS[file_path] = timer
+    if previous is not None:
+        previous.cancel()
+    timer.start()
+
+
+def _idle_compaction(filename: str, file_path: Path) -> None:
+    timer = threading.current_thread()
+    with _CACHE_LOCK:
+        if _IDLE_TIMERS.get(file_path) is not timer:
+            return
+        del _IDLE_TIMERS[file_path]
+        pending = _GARBAGE.get(file_path)
+    if not pending:
+        return
+    if _json_version(file_path) != timer.key:
+        # Hubo escrituras durante la espera: se espera otro periodo.
+        _schedule_idle_compaction(filename, file_path)
+        return
+    _schedule_compaction(filename, file_path)
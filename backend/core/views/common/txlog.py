@@ -0,0 +1,233 @@
+# core/views/common/txlog.py
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Callable, Dict, Iterable, List, Tuple
+from core.views.common import journal, locks
+from core.views.common.serialization import dumps, loads
+
+# Commits que tocan varios ficheros a la vez (ver store.commit_group).
+#
+# Cada fichero recibe sus líneas de diario de siempre, marcadas con el id del
+# commit ("tx") y sin fsync. El commit queda hecho cuando su línea entra en el
+# manifiesto (DATA_DIR/commits.manifest), con un único fsync para todo el
+# grupo. Esa línea lleva también las líneas de cada fichero, para rehacerlas si
+# una caída del sistema se llevó alguna antes de llegar a disco.
+#
+# Los ficheros que se reescriben enteros (un dataset tras un borrado, los
+# comentarios) se preparan en "<fichero>.<tx>.tmp", ya en disco, y se
+# instalan con os.replace después de publicar; la línea del manifiesto los
+# lista en "replaced".
+#
+# `recover` deja cada fichero como si el commit se hubiera aplicado entero o
+# no se hubiera empezado: instala los preparados de commits publicados y
+# borra los demás, descarta las líneas de commits que no llegaron al
+# manifiesto y rehace las que faltan de los que sí. `trim` lleva a disco los
+# diarios, quita de cada línea del manifiesto lo que ya no hay que rehacer y
+# olvida los commits sin rastro en ningún fichero (compactados).
+
+MANIFEST_NAME = "commits.manifest"
+
+
+def manifest_path(data_dir: Path) -> Path:
+    return data_dir / MANIFEST_NAME
+
+
+def _fsync_append(path: Path, line: bytes) -> None:
+    with path.open("ab") as f:
+        f.write(line + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_lines(path: Path) -> List[Dict]:
+    try:
+        f = path.open("rb")
+    except FileNotFoundError:
+        return []
+    out = []
+    with f:
+        for raw in f:
+            try:
+                out.append(loads(raw))
+            except ValueError:
+                # Línea a medio escribir tras una caída.
+                continue
+    return out
+
+
+def staged_path(data_path: Path, tx: str) -> Path:
+    """Dónde se prepara la versión nueva de `data_path` en el commit `tx`."""
+    return data_path.with_name(f"{data_path.name}.{tx}.tmp")
+
+
+def _staged_tx(path: Path) -> str | None:
+    stem, _, tx = path.name[: -len(".tmp")].rpartition(".")
+    if stem and len(tx) == 32 and all(c in "0123456789abcdef" for c in tx):
+        return tx
+    return None
+
+
+def _staged_target(path: Path) -> Path:
+    return path.with_name(path.name[: -len(".tmp")].rpartition(".")[0])
+
+
+def install(data_path: Path, tx: str) -> None:
+    """Publica la versión preparada de `data_path` en el commit `tx`."""
+    os.replace(staged_path(data_path, tx), data_path)
+    # Como tras cualquier snapshot nuevo: el diario anterior ya está dentro.
+    journal.discard(data_path)
+
+
+def publish(
+    data_dir: Path,
+    tx: str,
+    entries: Iterable[Tuple[str, Dict]],
+    replaced: Iterable[str] = (),
+) -> None:
+    """Da por hecho el commit `tx`; `entries` son (ruta relativa, línea) y
+    `replaced` las rutas relativas con una versión preparada."""
+    path = manifest_path(data_dir)
+    line = {"tx": tx, "entries": [list(e) for e in entries]}
+    replaced = list(replaced)
+    if replaced:
+        line["replaced"] = replaced
+    with locks.locked(path):
+        _fsync_append(path, dumps(line))
+
+
+def size(data_dir: Path) -> int:
+    try:
+        return manifest_path(data_dir).stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _committed(data_dir: Path) -> Dict[str, Dict]:
+    """{tx: línea del manifiesto} de los commits publicados, en orden."""
+    return {line.get("tx"): line for line in _read_lines(manifest_path(data_dir))}
+
+
+def _pending(data_dir: Path, tx: str, line: Dict) -> bool:
+    # Alguno de sus ficheros preparados sigue sin instalar.
+    return any(
+        staged_path(data_dir / rel, tx).exists() for rel in line.get("replaced", [])
+    )
+
+
+def _tagged(path: Path) -> set:
+    return {line["tx"] for line in _read_lines(path) if "tx" in line}
+
+
+def _fsync_file(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _rewrite(path: Path, lines: List[Dict]) -> None:
+    with NamedTemporaryFile("wb", delete=False, dir=path.parent, suffix=".tmp") as tmp:
+        for line in lines:
+            tmp.write(dumps(line) + b"\n")
+        tmp.flush()
+        os.fsync(tmp.fileno())
+        tmp_name = tmp.name
+    os.replace(tmp_name, path)
+
+
+def _journals(data_dir: Path) -> set:
+    """Ficheros de datos con diario en `data_dir`."""
+    return {
+        p.with_name(p.name[: -len(".journal")]) for p in data_dir.rglob("*.journal")
+    }
+
+
+def trim(data_dir: Path) -> None:
+    """Deja en el manifiesto solo los ids de commit que siguen en algún diario."""
+    path = manifest_path(data_dir)
+    with locks.locked(path):
+        committed = _committed(data_dir)
+        if not committed:
+            return
+        present = set()
+        for data_path in _journals(data_dir):
+            jpath = journal.journal_path(data_path)
+            # Sus líneas pasan a estar en disco: ya no hace falta rehacerlas.
+            _fsync_file(jpath)
+            present |= _tagged(jpath)
+        kept = []
+        for tx, line in committed.items():
+            if _pending(data_dir, tx, line):
+                # Quien lo publicó cayó antes de instalarlo: lo hará recover.
+                kept.append(line)
+            elif tx in present:
+                kept.append({"tx": tx})
+        _rewrite(path, kept)
+
+
+def _recover_file(data_dir: Path, data_path: Path, base) -> None:
+    # Con el cerrojo del fichero tomado ningún commit sobre él está a medias:
+    # quien lo escribía lo soltó tras publicar o murió antes.
+    committed = _committed(data_dir)
+    rel = data_path.relative_to(data_dir).as_posix()
+    jpath = journal.journal_path(data_path)
+    lines = _read_lines(jpath)
+    kept = [line for line in lines if "tx" not in line or line["tx"] in committed]
+    seen = {line["tx"] for line in kept if "tx" in line}
+    for tx, line in committed.items():
+        if tx not in seen:
+            # Las de un snapshot anterior ya están dentro del actual.
+            kept.extend(
+                entry
+                for r, entry in line.get("entries") or []
+                if r == rel and base is not None and entry.get("base") == list(base)
+            )
+    raw = _count_raw(jpath) if jpath.exists() else 0
+    if kept != lines or raw != len(lines):
+        _rewrite(jpath, kept)
+
+
+def _count_raw(path: Path) -> int:
+    with path.open("rb") as f:
+        return sum(1 for _ in f)
+
+
+def _install_staged(data_dir: Path, data_path: Path) -> None:
+    # Igual que _recover_file: con el cerrojo tomado, lo preparado por un
+    # commit publicado se instala (en orden de publicación) y lo demás sobra.
+    committed = _committed(data_dir)
+    rel = data_path.relative_to(data_dir).as_posix()
+    for tx, line in committed.items():
+        if rel in line.get("replaced", []) and staged_path(data_path, tx).exists():
+            install(data_path, tx)
+    for staged in data_path.parent.glob(f"{data_path.name}.*.tmp"):
+        if _staged_tx(staged) and _staged_target(staged) == data_path:
+            staged.unlink(missing_ok=True)
+
+
+def recover(data_dir: Path, snapshot_version: Callable[[Path], object]) -> None:
+    """Deja todos los ficheros coherentes con el manifiesto y lo recorta.
+
+    `snapshot_version(ruta)` es la identidad del snapshot a la que apuntan
+    las líneas ("base").
+    """
+    staged = {_staged_target(p) for p in data_dir.rglob("*.tmp") if _staged_tx(p)}
+    for data_path in sorted(staged):
+        with locks.locked(data_path):
+            _install_staged(data_dir, data_path)
+    journals = _journals(data_dir)
+    journals.update(
+        data_dir / rel
+        for line in _committed(data_dir).values()
+        for rel, _ in line.get("entries") or []
+    )
+    for data_path in sorted(journals):
+        with locks.locked(data_path):
+            _recover_file(data_dir, data_path, snapshot_version(data_path))
+    if size(data_dir):
+        trim(data_dir)
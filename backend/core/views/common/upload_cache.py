@@ -0,0 +1,120 @@
+# core/views/common/upload_cache.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from typing import Dict, List
+from django.conf import settings
+from core.views.common import serialization
+from core.views.common.ingest import detect_format
+from core.views.common.store import DATA_DIR, write_json_atomic
+
+# Cache de subidas ya leídas, por contenido. Volver a subir el mismo export
+# (o reintentar tras un timeout) reutiliza las entradas ya leídas, normalizadas
+# y saneadas, y pasa directamente a compararlas con los datos actuales.
+#
+# - La clave es el tipo (vit/vul), el formato, el SHA-256 del fichero y la
+#   fecha del día: las entradas sin fecha calculan dueDate a partir de hoy.
+# - En memoria es un LRU acotado por número de subidas y de filas; lo que
+#   sale de él se vuelca a DATA_DIR/upload_cache/ (también acotado).
+# - Una subida de más de UPLOAD_CACHE_ROWS filas no se guarda: run_upload deja
+#   de copiar sus bloques en cuanto pasa del límite.
+# - Se guardan y se entregan copias: quien las recibe puede modificarlas.
+
+UPLOAD_CACHE_ENTRIES = getattr(settings, "VMT_UPLOAD_CACHE_ENTRIES", 4)
+
+UPLOAD_CACHE_ROWS = getattr(settings, "VMT_UPLOAD_CACHE_ROWS", 200_000)
+
+UPLOAD_CACHE_DISK_ENTRIES = getattr(settings, "VMT_UPLOAD_CACHE_DISK_ENTRIES", 32)
+
+CACHE_DIR = DATA_DIR / "upload_cache"
+
+_HASH_BLOCK = 1024 * 1024
+
+Chunks = List[List[Dict]]
+
+_MEM: "OrderedDict[str, Chunks]" = OrderedDict()
+_MEM_ROWS = 0
+_LOCK = threading.Lock()
+
+
+def content_key(kind: str, upload) -> str:
+    """Clave de la subida; deja el fichero al principio."""
+    h = hashlib.sha256()
+    upload.seek(0)
+    for block in iter(lambda: upload.read(_HASH_BLOCK), b""):
+        h.update(block)
+    upload.seek(0)
+    fmt = detect_format(upload)
+    return f"{kind}-{fmt}-{date.today().isoformat()}-{h.hexdigest()}"
+
+
+def _rows(chunks: Chunks) -> int:
+    return sum(len(c) for c in chunks)
+
+
+def _copy(chunks: Chunks) -> Chunks:
+    return [[dict(r) for r in c] for c in chunks]
+
+
+def _path(key: str) -> Path:
+    return CACHE_DIR / f"{key}.json"
+
+
+def _spill(key: str, chunks: Chunks) -> None:
+    try:
+        write_json_atomic(_path(key), chunks)
+        files = sorted(CACHE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for old in files[: max(0, len(files) - UPLOAD_CACHE_DISK_ENTRIES)]:
+            old.unlink()
+    except OSError:
+        pass
+
+
+def _load_spilled(key: str) -> Chunks | None:
+    path = _path(key)
+    try:
+        chunks = serialization.read_file(path)
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return chunks if isinstance(chunks, list) else None
+
+
+def _remember(key: str, chunks: Chunks) -> None:
+    global _MEM_ROWS
+    if key in _MEM:
+        _MEM_ROWS -= _rows(_MEM.pop(key))
+    _MEM[key] = chunks
+    _MEM_ROWS += _rows(chunks)
+    while _MEM and (len(_MEM) > UPLOAD_CACHE_ENTRIES or _MEM_ROWS > UPLOAD_CACHE_ROWS):
+        old_key, old = _MEM.popitem(last=False)
+        _MEM_ROWS -= _rows(old)
+        _spill(old_key, old)
+
+
+def get(key: str) -> Chunks | None:
+    """Entradas por bloques de una subida ya procesada, o None."""
+    with _LOCK:
+        chunks = _MEM.get(key)
+        if chunks is not None:
+            _MEM.move_to_end(key)
+            return _copy(chunks)
+    chunks = _load_spilled(key)
+    if chunks is None:
+        return None
+    with _LOCK:
+        _remember(key, chunks)
+        return _copy(chunks)
+
+
+def put(key: str, chunks: Chunks) -> None:
+    """Guarda los bloques de una subida y se queda con ellos: quien llama
+    pasa una copia que ya no toca. Por encima de UPLOAD_CACHE_ROWS filas no
+    se guarda nada."""
+    if _rows(chunks) > UPLOAD_CACHE_ROWS:
+        return
+    with _LOCK:
+        _remember(key, chunks)
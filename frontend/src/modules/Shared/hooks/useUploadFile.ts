@@ -12,7 +12,8 @@ type RelationChange = { vulNumero: string; vitNumero: string; before: string; af
 type Endpoints = { uploadUrl: string; saveUrl: string; listUrlForMutate?: string };
 type UploadResponse = {
   duplicates?: DuplicatePair[];
-  new?: Entry[];
+  token?: string;
+  newCount?: number;
   relations?: RelationChange[];
   error?: string;
   message?: string;
@@ -98,7 +99,9 @@ export function useUploadFile(onClose: (success: boolean) => void, endpoints: En
   const [mensaje, setMensaje] = useState<string | null>(null);
   const [duplicates, setDuplicates] = useState<DuplicatePair[]>([]);
   const [resolverOpen, setResolverOpen] = useState(false);
-  const [newEntries, setNewEntries] = useState<Entry[]>([]);
+  // Las entradas nuevas quedan en el servidor bajo este token; aquí solo se
+  // guardan las elecciones del usuario.
+  const [stagingToken, setStagingToken] = useState<string | null>(null);
   const [selectedOptions, setSelectedOptions] = useState<('existing' | 'incoming')[]>([]);
   const [loading, setLoading] = useState(false);
 
@@ -158,7 +161,6 @@ export function useUploadFile(onClose: (success: boolean) => void, endpoints: En
   const processUpload = async (file: File, detected: FileType) => {
     const currentUrlType = getUrlType(uploadUrl);
     const targetUploadUrl = swapUrlTo(uploadUrl, detected);
-    const targetSaveUrl = swapUrlTo(saveUrl, detected);
 
     if (currentUrlType !== detected) {
       setMensaje(
@@ -187,13 +189,13 @@ export function useUploadFile(onClose: (success: boolean) => void, endpoints: En
       throw new Error(msg);
     }
 
+    setStagingToken(result.token ?? null);
     if (Array.isArray(result.duplicates) && result.duplicates.length > 0) {
       const sanitizedDuplicates = result.duplicates.map(pair => ({
         existing: sanitizeEntry(pair.existing),
         incoming: sanitizeEntry(pair.incoming),
       }));
       setDuplicates(sanitizedDuplicates);
-      setNewEntries(Array.isArray(result.new) ? result.new.map(sanitizeEntry) : []);
       setSelectedOptions(Array(result.duplicates.length).fill('incoming'));
       setResolverOpen(true);
       setMensaje('⚠️ Duplicates detected. Choose which lines to keep.');
@@ -203,15 +205,13 @@ export function useUploadFile(onClose: (success: boolean) => void, endpoints: En
         setRelationSelections(new Array(result.relations.length).fill('apply'));
       }
     } else {
-      const sanitizedNew = Array.isArray(result.new) ? result.new.map(sanitizeEntry) : [];
       if (result.relations && result.relations.length > 0) {
-        setNewEntries(sanitizedNew);
+        setSelectedOptions([]);
         setRelations(result.relations);
         setRelationSelections(new Array(result.relations.length).fill('apply'));
         setRelationModalOpen(true);
         setMensaje('⚠️ Relations detected. Confirm before saving.');
       } else {
-        await guardarFinal(targetSaveUrl, sanitizedNew);
         setMensaje('✅ File uploaded successfully.');
         onClose(true);
         safeMutate();
@@ -219,12 +219,11 @@ export function useUploadFile(onClose: (success: boolean) => void, endpoints: En
     }
   };
 
-  const guardarFinal = async (saveEndpoint: string, finalEntries: Entry[]) => {
-    const sanitizedFinal = finalEntries.map(sanitizeEntry);
+  const guardarFinal = async (saveEndpoint: string, choices: ('existing' | 'incoming')[]) => {
     const res = await fetch(saveEndpoint, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ entries: sanitizedFinal }),
+      body: JSON.stringify({ token: stagingToken, choices }),
     });
     if (!res.ok) {
       let msg = `HTTP ${res.status}`;
@@ -240,19 +239,14 @@ export function useUploadFile(onClose: (success: boolean) => void, endpoints: En
     if (loading) return;
     setLoading(true);
     try {
-      const seleccionadas = selectedOptions.map((choice, idx) =>
-        choice === 'incoming' ? duplicates[idx].incoming : duplicates[idx].existing
-      );
-      const finalEntries = [...newEntries, ...seleccionadas];
       setResolverOpen(false);
 
       if (relations.length > 0) {
-        setNewEntries(finalEntries);
         setRelationModalOpen(true);
         setMensaje('⚠️ Relations detected. Confirm before saving.');
       } else {
         const targetSaveUrl = swapUrlTo(saveUrl, getUrlType(uploadUrl));
-        await guardarFinal(targetSaveUrl, finalEntries);
+        await guardarFinal(targetSaveUrl, selectedOptions);
         setMensaje('✅ Selection saved successfully.');
         onClose(true);
         safeMutate();
@@ -273,7 +267,9 @@ export function useUploadFile(onClose: (success: boolean) => void, endpoints: En
     if (loading) return;
     setLoading(true);
     try {
-      const relacionesAplicadas = relations.filter((_, idx) => relationSelections[idx] === 'apply');
+      const relacionesAplicadas = relations
+        .map((_, idx) => idx)
+        .filter(idx => relationSelections[idx] === 'apply');
       if (relacionesAplicadas.length === 0) {
         setMensaje('❌ No relations applied.');
         setRelationModalOpen(false);
@@ -284,9 +280,7 @@ export function useUploadFile(onClose: (success: boolean) => void, endpoints: En
       const detectedForApply = getUrlType(uploadUrl);
       const targetSaveUrl = swapUrlTo(saveUrl, detectedForApply);
 
-      if (newEntries.length > 0) {
-        await guardarFinal(targetSaveUrl, newEntries);
-      }
+      await guardarFinal(targetSaveUrl, selectedOptions);
 
       const applyUrlBase = swapUrlTo(uploadUrl, detectedForApply);
       const applyUrl = applyUrlBase.replace('/upload/', '/apply-relations/');
@@ -294,7 +288,7 @@ export function useUploadFile(onClose: (success: boolean) => void, endpoints: En
       const res = await fetch(applyUrl, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ relations: relacionesAplicadas }),
+        body: JSON.stringify({ token: stagingToken, apply: relacionesAplicadas }),
       });
 
       if (!res.ok) {
@@ -361,7 +355,7 @@ export function useUploadFile(onClose: (success: boolean) => void, endpoints: En
       setRelationModalOpen(false);
       setRelations([]);
       setRelationSelections([]);
-      setNewEntries([]);
+      setStagingToken(null);
       setMensaje('❌ Operation cancelled. No changes were saved.');
     },
 